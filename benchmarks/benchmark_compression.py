@@ -0,0 +1,80 @@
+"""
+Benchmark of compressed alignment I/O: write and read
+throughput and file size for each compression format.
+
+Usage: python benchmark_compression.py [alignment_file]
+
+If no alignment file is given, a random alignment is used.
+"""
+from io import BytesIO, TextIOWrapper
+import sys
+import time
+
+import numpy as np
+
+from evcouplings.align.alignment import (
+    Alignment, COMPRESSION_SUFFIX
+)
+
+
+def random_alignment(num_seqs=20000, length=300, seed=0):
+    """
+    Create random alignment of sequences derived from a
+    common ancestor (so it compresses like a real alignment)
+    """
+    rng = np.random.RandomState(seed)
+    alphabet = np.array(list("-ACDEFGHIKLMNPQRSTVWY"))
+
+    ancestor = rng.choice(alphabet, length)
+    matrix = np.tile(ancestor, (num_seqs, 1))
+    mutated = rng.rand(num_seqs, length) < rng.rand(num_seqs, 1) * 0.6
+    matrix[mutated] = rng.choice(alphabet, mutated.sum())
+
+    return Alignment(
+        matrix, ["seq{}/1-{}".format(i, length) for i in range(num_seqs)]
+    )
+
+
+def benchmark(ali):
+    print("{:<8} {:>10} {:>10} {:>10}".format(
+        "format", "size (MB)", "write (s)", "read (s)"
+    ))
+
+    for compression in [None] + list(COMPRESSION_SUFFIX):
+        out = BytesIO()
+
+        try:
+            start = time.time()
+            if compression is None:
+                text = TextIOWrapper(out, encoding="utf-8")
+                ali.write(text)
+                text.detach()
+            else:
+                ali.write(out, compression=compression)
+            write_time = time.time() - start
+        except ImportError:
+            print("{:<8} (not available)".format(compression))
+            continue
+
+        size = len(out.getvalue())
+        out.seek(0)
+
+        start = time.time()
+        ali_read = Alignment.from_file(out)
+        read_time = time.time() - start
+
+        assert (ali_read.matrix == ali.matrix).all()
+
+        print("{:<8} {:>10.1f} {:>10.3f} {:>10.3f}".format(
+            str(compression), size / 1e6, write_time, read_time
+        ))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            alignment = Alignment.from_file(f)
+    else:
+        alignment = random_alignment()
+
+    benchmark(alignment)
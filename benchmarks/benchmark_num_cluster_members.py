@@ -0,0 +1,88 @@
+"""
+Benchmark of multithreaded sequence weight calculation
+(num_cluster_members) against the single-threaded kernel,
+for 1, 2, 4 and 8 threads.
+
+Usage: python benchmark_num_cluster_members.py [num_seqs] [length]
+
+Thread counts above the number of threads available to numba
+(NUMBA_NUM_THREADS, by default the number of cores) are skipped.
+"""
+import sys
+import time
+
+import numba
+import numpy as np
+
+from evcouplings.align.alignment import (
+    num_cluster_members, _max_mismatches, _num_cluster_members_parallel,
+    NUM_CLUSTER_MEMBERS_BLOCK_SIZE
+)
+
+THREADS = [1, 2, 4, 8]
+IDENTITY_THRESHOLD = 0.8
+
+
+def random_matrix(num_seqs=20000, length=300, seed=0):
+    """
+    Create random mapped alignment matrix of sequences derived
+    from a common ancestor (so that sequences have realistic
+    numbers of cluster members)
+    """
+    rng = np.random.RandomState(seed)
+
+    ancestor = rng.randint(0, 21, length)
+    matrix = np.tile(ancestor, (num_seqs, 1))
+    mutated = rng.rand(num_seqs, length) < rng.rand(num_seqs, 1) * 0.6
+    matrix[mutated] = rng.randint(0, 21, mutated.sum())
+
+    return matrix
+
+
+def _parallel(matrix, num_threads):
+    return _num_cluster_members_parallel(
+        matrix, _max_mismatches(matrix.shape[1], IDENTITY_THRESHOLD),
+        NUM_CLUSTER_MEMBERS_BLOCK_SIZE, np.ones(matrix.shape[0]),
+        num_threads
+    )
+
+
+def benchmark(matrix):
+    # compile kernels before timing
+    num_cluster_members(matrix[:10], IDENTITY_THRESHOLD, num_threads=1)
+    _parallel(matrix[:10], 1)
+
+    start = time.time()
+    reference = num_cluster_members(
+        matrix, IDENTITY_THRESHOLD, num_threads=1
+    )
+    serial_time = time.time() - start
+
+    print("{:<10} {:>10} {:>10}".format("threads", "time (s)", "speedup"))
+    print("{:<10} {:>10.3f} {:>10.2f}".format("serial", serial_time, 1.0))
+
+    for num_threads in THREADS:
+        if num_threads > numba.config.NUMBA_NUM_THREADS:
+            print("{:<10} (not available)".format(num_threads))
+            continue
+
+        # call parallel kernel directly, so it is
+        # also used for a single thread
+        numba.set_num_threads(num_threads)
+
+        start = time.time()
+        result = _parallel(matrix, num_threads)
+        parallel_time = time.time() - start
+
+        assert np.array_equal(result, reference)
+
+        print("{:<10} {:>10.3f} {:>10.2f}".format(
+            num_threads, parallel_time, serial_time / parallel_time
+        ))
+
+
+if __name__ == "__main__":
+    num_seqs = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    length = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+
+    benchmark(random_matrix(num_seqs, length))
@@ -0,0 +1,109 @@
+"""
+Benchmark of A3M alignment expansion (read_a3m) against
+the previous character-by-character implementation.
+
+Usage: python benchmark_read_a3m.py [num_seqs] [num_match_states]
+"""
+from collections import OrderedDict
+from io import StringIO
+import sys
+import time
+
+import numpy as np
+
+from evcouplings.align.alignment import read_a3m, read_fasta
+
+
+def read_a3m_reference(fileobj, inserts="first"):
+    """
+    Previous implementation of read_a3m (expands A3M
+    sequence by sequence in Python), used as reference
+    for runtime and results (note that the "delete" strategy
+    did not return the modified sequences previously)
+    """
+    seqs = OrderedDict()
+
+    for i, (seq_id, seq) in enumerate(read_fasta(fileobj)):
+        seq = seq.replace(".", "")
+
+        if inserts == "first":
+            if i == 0:
+                uppercase_cols = [
+                    j for (j, c) in enumerate(seq)
+                    if (c == c.upper() or c == "-")
+                ]
+                gap_template = np.array(["."] * len(seq))
+                filled_seq = seq
+            else:
+                uppercase_chars = [
+                    c for c in seq if c == c.upper() or c == "-"
+                ]
+                filled = np.copy(gap_template)
+                filled[uppercase_cols] = uppercase_chars
+                filled_seq = "".join(filled)
+
+        elif inserts == "delete":
+            filled_seq = "".join(
+                [c for c in seq if c == c.upper() and c != "."]
+            )
+        else:
+            raise ValueError(
+                "Invalid option for inserts: {}".format(inserts)
+            )
+
+        seqs[seq_id] = filled_seq
+
+    return seqs
+
+
+def random_a3m(num_seqs, num_match_states, insert_prob=0.05, seed=0):
+    """
+    Create random A3M alignment with inserts of
+    1 to 5 residues before any match state
+    """
+    rng = np.random.RandomState(seed)
+    match = np.array(list("ACDEFGHIKLMNPQRSTVWY-"))
+    insert = np.array(list("acdefghiklmnpqrstvwy"))
+
+    lines = []
+    for i in range(num_seqs):
+        parts = []
+        for j in range(num_match_states + 1):
+            if rng.rand() < insert_prob:
+                parts.append(
+                    "".join(rng.choice(insert, rng.randint(1, 6)))
+                )
+            if j < num_match_states:
+                parts.append(rng.choice(match))
+
+        lines.append(">seq{}\n{}\n".format(i, "".join(parts)))
+
+    return "".join(lines)
+
+
+def benchmark(num_seqs=20000, num_match_states=300):
+    a3m = random_a3m(num_seqs, num_match_states)
+
+    # compile numba kernels before measuring
+    read_a3m(StringIO(random_a3m(2, 10)), inserts="all")
+
+    for inserts in ["first", "delete", "all"]:
+        start = time.time()
+        seqs = read_a3m(StringIO(a3m), inserts=inserts)
+        runtime = time.time() - start
+
+        if inserts != "all":
+            start = time.time()
+            reference = read_a3m_reference(StringIO(a3m), inserts=inserts)
+            ref_runtime = time.time() - start
+
+            assert seqs == reference
+            print("{:<8} {:8.3f}s (reference: {:8.3f}s)".format(
+                inserts, runtime, ref_runtime
+            ))
+        else:
+            print("{:<8} {:8.3f}s".format(inserts, runtime))
+
+
+if __name__ == "__main__":
+    benchmark(*map(int, sys.argv[1:]))
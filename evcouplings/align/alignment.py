@@ -6,14 +6,22 @@ Authors:
   Thomas A. Hopf
 """
 
+import bz2
+import gzip
+import hashlib
+import io
+import os
 import re
+import zipfile
 from collections import namedtuple, OrderedDict, defaultdict
-from copy import deepcopy
+from contextlib import contextmanager
+from copy import copy, deepcopy
 
 import numpy as np
-from numba import jit
+import numba
+from numba import jit, prange
 
-from evcouplings.utils.calculations import entropy
+from evcouplings.utils.calculations import entropies
 from evcouplings.utils.helpers import DefaultOrderedDict, wrap
 
 # constants
@@ -30,6 +38,305 @@ ALPHABET_DNA = GAP + ALPHABET_DNA_NOGAP
 ALPHABET_RNA_NOGAP = "ACGU"
 ALPHABET_RNA = GAP + ALPHABET_RNA_NOGAP
 
+# number of sequences per block in multithreaded
+# sequence weight calculation
+NUM_CLUSTER_MEMBERS_BLOCK_SIZE = 256
+
+# number of positions compared between two
+# sequences before checking for early exit
+MISMATCH_CHUNK_SIZE = 64
+
+# number of positions per block in BLAS-based
+# pair frequency calculation
+PAIR_FREQUENCIES_BLOCK_SIZE = 128
+
+# maximum number of elements of one-hot encoded sequence
+# matrix in BLAS-based pair frequency calculation
+PAIR_FREQUENCIES_CHUNK_ELEMENTS = 2 ** 24
+
+# target probability that a pair of sequences at the
+# identity threshold ends up in the same bucket of a
+# single hash table in approximate weight calculation
+LSH_COLLISION_PROBABILITY = 0.1
+
+# magic bytes identifying compressed files, and
+# file name suffixes for compression formats
+COMPRESSION_MAGIC = OrderedDict([
+    ("gzip", b"\x1f\x8b"),
+    ("bz2", b"BZh"),
+    ("zstd", b"\x28\xb5\x2f\xfd"),
+])
+
+COMPRESSION_SUFFIX = {
+    "gzip": ".gz",
+    "bz2": ".bz2",
+    "zstd": ".zst",
+}
+
+# suffixes of binary alignment cache files stored next
+# to alignment file (see read_alignment_cache), and version
+# of cache format (caches of other versions are ignored)
+ALIGNMENT_CACHE_SUFFIX = ".cache.npz"
+ALIGNMENT_CODES_SUFFIX = ".codes.npy"
+ALIGNMENT_CACHE_VERSION = 1
+
+# approximate number of bytes written at once
+# when writing alignment files
+WRITE_CHUNK_SIZE = 2 ** 24
+
+# bytes treated as whitespace when parsing sequence files
+_WHITESPACE = np.zeros(256, dtype=bool)
+_WHITESPACE[[ord(c) for c in " \t\n\r\x0b\x0c"]] = True
+
+
+def detect_compression(fileobj):
+    """
+    Detect if a file is compressed based on the magic
+    bytes at the current position, without consuming them.
+
+    Parameters
+    ----------
+    fileobj : file-like object
+        File opened in text or binary mode
+
+    Returns
+    -------
+    {"gzip", "bz2", "zstd", None}
+        Compression format, None if not compressed
+        (or if the file does not allow to peek at
+        the underlying bytes)
+    """
+    raw = getattr(fileobj, "buffer", fileobj)
+
+    if hasattr(raw, "peek"):
+        head = raw.peek(4)[:4]
+    elif isinstance(raw, io.BytesIO):
+        head = raw.getvalue()[raw.tell():raw.tell() + 4]
+    else:
+        return None
+
+    for compression, magic in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return compression
+
+    return None
+
+
+def decompress(fileobj):
+    """
+    Transparently decompress a file if it is
+    compressed (see detect_compression).
+
+    .. note::
+
+        zstd decompression requires the zstandard package.
+
+    Parameters
+    ----------
+    fileobj : file-like object
+        File opened in text or binary mode
+
+    Returns
+    -------
+    file-like object
+        Stream of decompressed file contents (in the same mode
+        as fileobj), or fileobj itself if not compressed
+    """
+    compression = detect_compression(fileobj)
+    if compression is None:
+        return fileobj
+
+    raw = getattr(fileobj, "buffer", fileobj)
+
+    if compression == "gzip":
+        stream = gzip.GzipFile(fileobj=raw, mode="rb")
+    elif compression == "bz2":
+        stream = bz2.BZ2File(raw, mode="rb")
+    else:
+        import zstandard
+        stream = zstandard.ZstdDecompressor().stream_reader(
+            raw, read_across_frames=True, closefd=False
+        )
+
+    if isinstance(fileobj, io.TextIOBase):
+        return io.TextIOWrapper(
+            io.BufferedReader(stream), encoding=fileobj.encoding
+        )
+    else:
+        return io.BufferedReader(stream)
+
+
+AlignmentCache = namedtuple(
+    "AlignmentCache",
+    ["ids", "codes", "symbols", "alphabet",
+     "focus_columns", "num_cluster_members"]
+)
+
+
+def _file_digest(filename, chunk_size=2 ** 20):
+    """
+    SHA1 hash of file content (hex string)
+    """
+    digest = hashlib.sha1()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def _file_fingerprint(filename, digest=True):
+    """
+    Size, modification time and (optionally) content
+    hash of file used to validate alignment cache
+    """
+    stat = os.stat(filename)
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "digest": _file_digest(filename) if digest else None,
+    }
+
+
+def read_alignment_cache(alignment_file):
+    """
+    Load binary alignment cache stored next to an
+    alignment file (see Alignment.write_cache).
+
+    The cache is only used if it matches the current
+    content of the alignment file. To avoid reading through
+    large alignments, the content hash is only compared if
+    size or modification time of the file changed.
+
+    Parameters
+    ----------
+    alignment_file : str
+        Path of alignment file
+
+    Returns
+    -------
+    AlignmentCache
+        Sequence identifiers, symbol code matrix (memory-mapped),
+        symbol table and alphabet of alignment, indices of focus
+        columns (or None), and dictionary from identity thresholds
+        to number of cluster members of each sequence computed on
+        focus columns. None if no valid cache exists.
+    """
+    cache_file = alignment_file + ALIGNMENT_CACHE_SUFFIX
+    codes_file = alignment_file + ALIGNMENT_CODES_SUFFIX
+
+    if not (os.path.isfile(cache_file) and os.path.isfile(codes_file)):
+        return None
+
+    try:
+        with np.load(cache_file) as data:
+            cache = {key: data[key] for key in data.files}
+    except (OSError, ValueError, zipfile.BadZipFile):
+        return None
+
+    if cache.get("version") != ALIGNMENT_CACHE_VERSION:
+        return None
+
+    # check size and modification time first, and only
+    # hash file content if these do not match
+    fingerprint = _file_fingerprint(alignment_file, digest=False)
+    if fingerprint["size"] != cache["size"]:
+        return None
+
+    if (fingerprint["mtime_ns"] != cache["mtime_ns"] and
+            _file_digest(alignment_file) != str(cache["digest"])):
+        return None
+
+    try:
+        codes = np.load(codes_file, mmap_mode="r")
+    except ValueError:
+        # empty arrays cannot be memory-mapped
+        codes = np.load(codes_file)
+
+    if codes.shape[0] != len(cache["ids"]):
+        return None
+
+    if cache["focus_columns"].ndim == 0:
+        focus_columns = None
+    else:
+        focus_columns = cache["focus_columns"]
+
+    return AlignmentCache(
+        cache["ids"], codes, cache["symbols"], str(cache["alphabet"]),
+        focus_columns,
+        {
+            float(theta): members for theta, members in zip(
+                cache["thetas"], cache["num_cluster_members"]
+            )
+        }
+    )
+
+
+@contextmanager
+def compress(fileobj, compression):
+    """
+    Context manager that compresses all text written to
+    it into a file. The underlying file is not closed
+    upon exit.
+
+    .. note::
+
+        zstd compression requires the zstandard package.
+
+    Parameters
+    ----------
+    fileobj : file-like object
+        File opened in text or binary mode to which
+        compressed data will be written
+    compression : {"gzip", "bz2", "zstd", None}
+        Compression format. If None, text will be
+        written to fileobj directly.
+
+    Returns
+    -------
+    file-like object
+        Text stream for writing
+
+    Raises
+    ------
+    ValueError
+        Upon invalid choice of compression format
+    """
+    if compression is None:
+        yield fileobj
+        return
+
+    if compression not in COMPRESSION_SUFFIX:
+        raise ValueError(
+            "Invalid compression format: {}, valid options are: {}".format(
+                compression, ", ".join(COMPRESSION_SUFFIX)
+            )
+        )
+
+    # make sure anything written in text mode before ends
+    # up in the file before compressed data
+    if isinstance(fileobj, io.TextIOBase):
+        fileobj.flush()
+
+    raw = getattr(fileobj, "buffer", fileobj)
+
+    if compression == "gzip":
+        stream = gzip.GzipFile(fileobj=raw, mode="wb")
+    elif compression == "bz2":
+        stream = bz2.BZ2File(raw, mode="wb")
+    else:
+        import zstandard
+        stream = zstandard.ZstdCompressor().stream_writer(
+            raw, closefd=False
+        )
+
+    # closing the text wrapper finishes the compressed stream,
+    # but leaves the underlying file open
+    with io.TextIOWrapper(stream, encoding="utf-8") as text:
+        yield text
+
+    raw.flush()
+
 
 def read_fasta(fileobj):
     """
@@ -39,7 +346,8 @@ def read_fasta(fileobj):
     Parameters
     ----------
     fileobj : file-like object
-        FASTA alignment file
+        FASTA alignment file (may be compressed,
+        see decompress)
 
     Returns
     -------
@@ -49,7 +357,7 @@ def read_fasta(fileobj):
     current_sequence = ""
     current_id = None
 
-    for line in fileobj:
+    for line in decompress(fileobj):
         # Start reading new entry. If we already have
         # seen an entry before, return it first.
         if line.startswith(">"):
@@ -66,6 +374,185 @@ def read_fasta(fileobj):
     yield current_id, current_sequence
 
 
+def _read_fasta_records(fileobj):
+    """
+    Read a FASTA-format file (includes aligned FASTA, A2M, A3M formats)
+    at the byte level without creating intermediate Python strings
+    for the sequences.
+
+    Parameters
+    ----------
+    fileobj : file-like object
+        FASTA alignment file (opened in text or binary mode,
+        may be compressed, see decompress)
+
+    Returns
+    -------
+    ids : list of str
+        Sequence identifiers (full header lines without ">")
+    buffer : np.array
+        Vector (dtype uint8) containing raw bytes of all sequences
+        concatenated in order of appearance (whitespace removed)
+    lengths : np.array
+        Vector of length len(ids) with the number of
+        bytes of each sequence in buffer
+    """
+    data = decompress(fileobj).read()
+    if isinstance(data, str):
+        data = data.encode()
+
+    buf = np.frombuffer(data, dtype=np.uint8)
+
+    # split into lines (every line segment includes its newline character)
+    line_ends = np.flatnonzero(buf == ord("\n")) + 1
+    if len(line_ends) == 0 or line_ends[-1] != len(buf):
+        line_ends = np.append(line_ends, len(buf))
+
+    line_starts = np.concatenate(([0], line_ends[:-1]))
+    line_starts, line_ends = (
+        line_starts[line_starts < len(buf)], line_ends[line_starts < len(buf)]
+    )
+
+    first_char = buf[line_starts]
+    is_header = first_char == ord(">")
+
+    # index of record each line belongs to (-1 for lines before first header)
+    record = np.cumsum(is_header) - 1
+    is_seq = ~is_header & (first_char != ord(";")) & (record >= 0)
+
+    ids = [
+        data[start + 1:end].rstrip().decode()
+        for start, end in zip(line_starts[is_header], line_ends[is_header])
+    ]
+
+    # select all non-whitespace bytes on sequence lines
+    keep = np.repeat(is_seq, line_ends - line_starts)
+    keep &= ~_WHITESPACE[buf]
+
+    line_lengths = np.add.reduceat(keep, line_starts, dtype=np.int64)
+    lengths = np.bincount(
+        record[is_seq], weights=line_lengths[is_seq], minlength=len(ids)
+    ).astype(np.int64)
+
+    return ids, buf[keep], lengths
+
+
+def _read_fasta_matrix(fileobj):
+    """
+    Read an aligned FASTA-format file (includes A2M format)
+    into a matrix of raw bytes.
+
+    .. note::
+
+        If the same sequence identifier occurs more than once,
+        only the last sequence will be kept at the position of the
+        first occurrence (same behaviour as building an OrderedDict
+        from read_fasta).
+
+    Parameters
+    ----------
+    fileobj : file-like object
+        FASTA alignment file (opened in text or binary mode,
+        may be compressed, see decompress)
+
+    Returns
+    -------
+    ids : list of str
+        Sequence identifiers
+    raw : np.array
+        N x L matrix (dtype uint8) of ASCII characters
+        in the alignment
+
+    Raises
+    ------
+    ValueError
+        If sequences do not have the same length
+    """
+    ids, buffer, lengths = _read_fasta_records(fileobj)
+
+    if len(ids) == 0:
+        raise ValueError("Need at least one sequence")
+
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+
+    if len(set(ids)) < len(ids):
+        # keep last sequence for duplicated IDs at position of first occurrence
+        last_index = {id_: i for i, id_ in enumerate(ids)}
+        records = OrderedDict((id_, last_index[id_]) for id_ in ids)
+        ids = list(records.keys())
+        records = np.array(list(records.values()))
+        lengths = lengths[records]
+    else:
+        records = None
+
+    L = lengths[0]
+    invalid = np.flatnonzero(lengths != L)
+    if len(invalid) > 0:
+        i = invalid[0]
+        raise ValueError(
+            "Sequences have differing lengths: i={} L_0={} L_i={}".format(
+                i, L, lengths[i]
+            )
+        )
+
+    if records is None:
+        raw = buffer.reshape((len(ids), L))
+    else:
+        raw = np.array([
+            buffer[offsets[r]:offsets[r + 1]] for r in records
+        ], dtype=np.uint8).reshape((len(ids), L))
+
+    return ids, raw
+
+
+def read_fasta_codes(fileobj, alphabet=ALPHABET_PROTEIN, default=GAP,
+                     return_chars=False):
+    """
+    Read an aligned FASTA-format file (includes A2M format) directly
+    into an integer-coded alignment matrix.
+
+    The file is processed at the byte level and translated into
+    symbol indices using a 256-entry lookup table, so no per-sequence
+    Python strings or per-character dictionary lookups are required.
+
+    Parameters
+    ----------
+    fileobj : file-like object
+        FASTA alignment file (opened in text or binary mode,
+        may be compressed, see decompress)
+    alphabet : str, optional (default: ALPHABET_PROTEIN)
+        Alphabet used to map symbols to indices
+    default : str, optional (default: GAP)
+        Symbols not contained in the alphabet will be
+        treated as this character
+    return_chars : bool, optional (default: False)
+        Also return character representation of alignment
+
+    Returns
+    -------
+    ids : list of str
+        Sequence identifiers
+    codes : np.array
+        N x L matrix (dtype uint8) of symbols mapped to
+        range(0, len(alphabet))
+    chars : np.array
+        N x L matrix of characters in the alignment
+        (only returned if return_chars is True)
+
+    Raises
+    ------
+    ValueError
+        If sequences do not have the same length
+    """
+    ids, raw = _read_fasta_matrix(fileobj)
+    codes = lookup_table(alphabet, default)[raw]
+
+    if return_chars:
+        return ids, codes, bytes_to_chars(raw)
+    else:
+        return ids, codes
+
+
 def write_fasta(sequences, fileobj, width=80):
     """
     Write a list of IDs/sequences to a FASTA-format file
@@ -80,8 +567,7 @@ def write_fasta(sequences, fileobj, width=80):
         File to which alignment will be written
     """
     for (seq_id, seq) in sequences:
-        fileobj.write(">{}\n".format(seq_id))
-        fileobj.write(wrap(seq, width=width) + "\n")
+        fileobj.write(">{}\n{}\n".format(seq_id, wrap(seq, width=width)))
 
 
 def write_aln(sequences, fileobj, width=80):
@@ -104,6 +590,136 @@ def write_aln(sequences, fileobj, width=80):
         fileobj.write(seq + "\n")
 
 
+def _wrap_matrix(raw, width):
+    """
+    Insert line breaks into each row of a byte matrix
+    (same result as applying helpers.wrap to each row)
+
+    Parameters
+    ----------
+    raw : np.array
+        N x L matrix (dtype uint8) of ASCII characters
+    width : int
+        Line width
+
+    Returns
+    -------
+    np.array
+        N x (L + number of lines) matrix of ASCII characters,
+        with each row ending in a line break
+    """
+    N, L = raw.shape
+    num_lines = max(-(-L // width), 1)
+
+    # pad rows to full lines and append line break
+    # to each line, then drop the padding again
+    # (which is in the same place in every row)
+    chars = np.zeros((N, num_lines * width), dtype=np.uint8)
+    chars[:, :L] = raw
+
+    padded = np.empty((N, num_lines, width + 1), dtype=np.uint8)
+    padded[:, :, :width] = chars.reshape(N, num_lines, width)
+    padded[:, :, width] = ord("\n")
+
+    positions = np.arange(num_lines)[:, np.newaxis] * width + np.arange(width + 1)
+    valid = positions < L
+    valid[:, width] = True
+
+    return padded.reshape(N, -1)[:, valid.ravel()]
+
+
+def write_matrix(ids, raw, fileobj, format="fasta", width=80,
+                 insert_gap=INSERT_GAP, chunk_size=WRITE_CHUNK_SIZE):
+    """
+    Write an alignment given as a matrix of bytes to a file.
+    Rather than formatting each sequence separately, blocks
+    of sequences are assembled into a single buffer, which
+    gives the same output as write_fasta, write_a3m and
+    write_aln.
+
+    Parameters
+    ----------
+    ids : list of str
+        Sequence identifiers
+    raw : np.array
+        N x L matrix (dtype uint8) of ASCII characters
+    fileobj : file-like obj
+        File (opened in text mode) to which
+        alignment will be written
+    format : {"fasta", "aln", "a3m"}
+        Output format for alignment
+    width : int
+        Column width for fasta alignment
+    insert_gap : str
+        Insert gap character removed from
+        sequences in a3m format
+    chunk_size : int, optional (default: WRITE_CHUNK_SIZE)
+        Approximate number of bytes written at once
+
+    Raises
+    ------
+    ValueError
+        Upon invalid file format specification
+    """
+    if format not in ("fasta", "a3m", "aln"):
+        raise ValueError(
+            "Invalid alignment format: {}".format(format)
+        )
+
+    N, L = raw.shape
+    block_size = max(chunk_size // (L + 1), 1)
+
+    for start in range(0, N, block_size):
+        block = raw[start:start + block_size]
+
+        # sequence lines of each record
+        if format == "fasta":
+            body = _wrap_matrix(block, width)
+            body_lengths = np.full(len(block), body.shape[1])
+        elif format == "aln":
+            body = np.empty((len(block), L + 1), dtype=np.uint8)
+            body[:, :L] = block
+            body[:, L] = ord("\n")
+            body_lengths = np.full(len(block), L + 1)
+        else:
+            body = np.empty((len(block), L + 1), dtype=np.uint8)
+            body[:, :L] = block
+            body[:, L] = ord("\n")
+            keep = body != ord(insert_gap)
+            body = body[keep]
+            body_lengths = keep.sum(axis=1)
+
+        # header line of each record
+        if format == "aln":
+            headers = np.zeros(len(block), dtype=np.int64)
+            header_bytes = b""
+        else:
+            header_list = [
+                ">{}\n".format(id_).encode()
+                for id_ in ids[start:start + block_size]
+            ]
+            headers = np.array([len(h) for h in header_list], dtype=np.int64)
+            header_bytes = b"".join(header_list)
+
+        # place headers and sequences of all records
+        # in one buffer
+        record_lengths = headers + body_lengths
+        record_starts = np.cumsum(record_lengths) - record_lengths
+        buffer = np.empty(record_lengths.sum(), dtype=np.uint8)
+
+        for lengths, offsets, data in [
+            (headers, record_starts, np.frombuffer(header_bytes, np.uint8)),
+            (body_lengths, record_starts + headers, body.ravel()),
+        ]:
+            part_starts = np.cumsum(lengths) - lengths
+            index = np.arange(len(data)) + np.repeat(
+                offsets - part_starts, lengths
+            )
+            buffer[index] = data
+
+        fileobj.write(buffer.tobytes().decode())
+
+
 # Holds information of a parsed Stockholm alignment file
 StockholmAlignment = namedtuple(
     "StockholmAlignment",
@@ -126,7 +742,8 @@ def read_stockholm(fileobj, read_annotation=False):
     Parameters
     ----------
     fileobj : file-like object
-        Stockholm alignment file
+        Stockholm alignment file (may be compressed,
+        see decompress)
     read_annotation : bool, optional (default=False)
         Read annotation columns from alignment
 
@@ -158,7 +775,7 @@ def read_stockholm(fileobj, read_annotation=False):
     i = 0
 
     # read alignment
-    for line in fileobj:
+    for line in decompress(fileobj):
         if i == 0 and not line.startswith("# STOCKHOLM 1.0"):
             raise ValueError(
                 "Not a valid Stockholm alignment: "
@@ -210,116 +827,500 @@ def read_stockholm(fileobj, read_annotation=False):
     # Do NOT yield at the end without // to avoid returning truncated alignments
 
 
-def read_a3m(fileobj, inserts="first"):
+def read_stockholm_gs(fileobj, feature="DE"):
     """
-    Read an alignment in compressed a3m format and expand
-    into a2m format.
-
-    .. note::
-
-        this function is currently not able to keep inserts in all the sequences
-
-    ..todo::
-
-        implement this
+    Read per-sequence annotation of one feature from the
+    first alignment in a Stockholm file, without reading
+    the alignment itself.
 
     Parameters
     ----------
     fileobj : file-like object
-        A3M alignment file
-    inserts : {"first", "delete"}
-        Keep inserts in first sequence, or delete
-        any insert column and keep only match state
-        columns.
+        Stockholm alignment file (may be compressed,
+        see decompress)
+    feature : str, optional (default: "DE")
+        Feature in #=GS lines that will be read
 
     Returns
     -------
-    OrderedDict
-        Sequences in alignment (key: ID, value: sequence),
-        in order they appeared in input file
+    ids : list of str
+        Identifiers of all sequences in alignment
+        (in order of occurrence)
+    values : list of str
+        Annotation of each sequence (last #=GS line
+        for feature), or None if sequence has no
+        annotation for feature
 
     Raises
     ------
     ValueError
-        Upon invalid choice of insert strategy
+        If file is not a valid or complete Stockholm alignment
     """
-    seqs = OrderedDict()
-
-    for i, (seq_id, seq) in enumerate(read_fasta(fileobj)):
-        # remove any insert gaps that may still be in alignment
-        # (just to be sure)
-        seq = seq.replace(".", "")
-
-        if inserts == "first":
-            # define "spacing" of uppercase columns in
-            # final alignment based on target sequence;
-            # remaining columns will be filled with insert
-            # gaps in the other sequences
-            if i == 0:
-                uppercase_cols = [
-                    j for (j, c) in enumerate(seq)
-                    if (c == c.upper() or c == "-")
-                ]
-                gap_template = np.array(["."] * len(seq))
-                filled_seq = seq
-            else:
-                uppercase_chars = [
-                    c for c in seq if c == c.upper() or c == "-"
-                ]
-                filled = np.copy(gap_template)
-                filled[uppercase_cols] = uppercase_chars
-                filled_seq = "".join(filled)
-
-        elif inserts == "delete":
-            # remove all lowercase letters and insert gaps .;
-            # since each sequence must have same number of
-            # uppercase letters or match gaps -, this gives
-            # the final sequence in alignment
-            seq = "".join([c for c in seq if c == c.upper() and c != "."])
-        else:
+    ids = OrderedDict()
+    gs = {}
+
+    for i, line in enumerate(decompress(fileobj)):
+        if i == 0 and not line.startswith("# STOCKHOLM 1.0"):
             raise ValueError(
-                "Invalid option for inserts: {}".format(inserts)
+                "Not a valid Stockholm alignment: "
+                "Header missing. {}".format(line.rstrip())
             )
 
-        seqs[seq_id] = filled_seq
+        if line.startswith("#=GS"):
+            splitted = line.rstrip().split(maxsplit=3)
+            if len(splitted) == 4 and splitted[2] == feature:
+                gs[splitted[1]] = splitted[3]
+        elif line.startswith("//"):
+            return list(ids), [gs.get(id_) for id_ in ids]
+        elif not line.startswith("#"):
+            splitted = line.split(maxsplit=2)
+            if len(splitted) == 2:
+                ids[splitted[0]] = None
 
-    return seqs
+    raise ValueError(
+        "Not a valid Stockholm alignment: terminator // missing"
+    )
 
 
-def write_a3m(sequences, fileobj, insert_gap=INSERT_GAP, width=80):
-    """
-    Write a list of IDs/sequences to a FASTA-format file
+# Holds focus columns of a Stockholm alignment file
+# read in streaming mode (see read_stockholm_focus)
+StockholmFocusAlignment = namedtuple(
+    "StockholmFocusAlignment",
+    ["ids", "matrix", "gs", "focus_index"]
+)
 
-    Parameters
-    ----------
-    sequences : Iterable
-        Iterator returning tuples(str, str), where
-        first value is header/ID and second the
-        sequence
-    fileobj : file-like obj
-        File to which alignment will be written
+
+def read_stockholm_focus(fileobj, focus_id=None, read_annotation=False,
+                         prefix=False):
     """
-    for (seq_id, seq) in sequences:
-        fileobj.write(">{}\n".format(seq_id))
-        fileobj.write(seq.replace(insert_gap, "") + "\n")
+    Read the focus columns of a Stockholm format alignment
+    file (e.g. from jackhmmer) in a single streaming pass.
 
+    In contrast to read_stockholm, sequences are not accumulated
+    as full strings. Instead, every sequence line is reduced to the
+    columns where the focus sequence is not a gap as soon as it is
+    read, so only the focus alignment is kept in memory (one byte
+    per residue), and insert columns are dropped on the fly.
 
-def detect_format(fileobj):
-    """
-    Detect if an alignment file is in FASTA or
+    .. note::
+
+        Only reads the first alignment contained in the file.
+        Per-residue and per-column annotation (GR/GC lines)
+        is skipped.
+
+    Parameters
+    ----------
+    fileobj : file-like object
+        Stockholm alignment file (may be compressed,
+        see decompress)
+    focus_id : str, optional (default: None)
+        Identifier of focus sequence. If None, use first
+        sequence in alignment.
+    read_annotation : bool, optional (default: False)
+        Read per-sequence annotation (GS lines)
+    prefix : bool, optional (default: False)
+        Use first sequence whose identifier starts with
+        focus_id as focus sequence
+
+    Returns
+    -------
+    StockholmFocusAlignment
+        namedtuple with the following fields:
+        ids (list of sequence identifiers in order of
+        occurrence), matrix (N x L_focus matrix (dtype uint8)
+        of ASCII characters in focus columns), gs (per-sequence
+        annotation, DefaultOrderedDict like in read_stockholm),
+        focus_index (index of focus sequence)
+
+    Raises
+    ------
+    ValueError
+        For invalid or truncated alignments, or if focus
+        sequence is not contained in the alignment
+    """
+    gs = DefaultOrderedDict(lambda: DefaultOrderedDict(list))
+
+    ids = []
+    id_to_index = {}
+    focus_parts = []
+    offsets = []
+
+    # focus column mask over all alignment columns
+    # read so far (grown by focus sequence lines)
+    focus_index = None
+    mask = np.zeros(1024, dtype=bool)
+    mask_length = 0
+
+    # sequence segments that are read before the
+    # corresponding segment of the focus sequence
+    pending = []
+    gap_bytes = [ord(MATCH_GAP), ord(INSERT_GAP)]
+
+    def _add_segment(index, offset, segment):
+        if offset + len(segment) > mask_length:
+            pending.append((index, offset, segment))
+        else:
+            focus_parts[index].extend(
+                segment[mask[offset:offset + len(segment)]].tobytes()
+            )
+
+    first_line = True
+    complete = False
+
+    for line in decompress(fileobj):
+        if first_line:
+            if not line.startswith("# STOCKHOLM 1.0"):
+                raise ValueError(
+                    "Not a valid Stockholm alignment: "
+                    "Header missing. {}".format(line.rstrip())
+                )
+            first_line = False
+
+        if line.startswith("#"):
+            if read_annotation and line.startswith("#=GS"):
+                _, seq_id, feat, val = line.rstrip().split(maxsplit=3)
+                gs[seq_id][feat] = val
+            continue
+
+        if line.startswith("//"):
+            complete = True
+            break
+
+        splitted = line.rstrip().split(maxsplit=2)
+        # there might be empty lines, so check for valid split
+        if len(splitted) != 2:
+            continue
+
+        seq_id, seq = splitted
+        segment = np.frombuffer(seq.encode("ascii"), dtype=np.uint8)
+
+        if seq_id not in id_to_index:
+            id_to_index[seq_id] = len(ids)
+            ids.append(seq_id)
+            focus_parts.append(bytearray())
+            offsets.append(0)
+
+            if focus_index is None and (
+                focus_id is None or seq_id == focus_id or
+                (prefix and seq_id.startswith(focus_id))
+            ):
+                focus_index = id_to_index[seq_id]
+
+        index = id_to_index[seq_id]
+        offset = offsets[index]
+        offsets[index] += len(segment)
+
+        if index == focus_index:
+            # extend focus column mask, and process any
+            # segments that were waiting for it
+            if mask_length + len(segment) > len(mask):
+                mask = np.resize(
+                    mask, max(2 * len(mask), mask_length + len(segment))
+                )
+            mask[mask_length:mask_length + len(segment)] = ~np.isin(
+                segment, gap_bytes
+            )
+            mask_length += len(segment)
+
+            waiting, pending = pending, []
+            for args in waiting:
+                _add_segment(*args)
+
+        _add_segment(index, offset, segment)
+
+    if not complete:
+        # do not return truncated alignments
+        raise ValueError(
+            "Not a valid Stockholm alignment: terminator // missing"
+        )
+
+    if focus_index is None:
+        raise ValueError(
+            "Focus sequence not contained in alignment: {}".format(
+                focus_id
+            )
+        )
+
+    invalid = [i for i, o in enumerate(offsets) if o != mask_length]
+    if len(invalid) > 0:
+        i = invalid[0]
+        raise ValueError(
+            "Sequences have differing lengths: i={} L_0={} L_i={}".format(
+                i, mask_length, offsets[i]
+            )
+        )
+
+    L = len(focus_parts[focus_index])
+    matrix = np.frombuffer(
+        b"".join(focus_parts), dtype=np.uint8
+    ).reshape((len(ids), L))
+
+    return StockholmFocusAlignment(ids, matrix, gs, focus_index)
+
+
+def read_a3m(fileobj, inserts="first"):
+    """
+    Read an alignment in compressed a3m format and expand
+    into a2m format.
+
+    Parameters
+    ----------
+    fileobj : file-like object
+        A3M alignment file
+    inserts : {"first", "delete", "all"}
+        Keep inserts in first sequence, delete
+        any insert column and keep only match state
+        columns, or keep inserts of all sequences
+        (see _read_a3m_matrix for details)
+
+    Returns
+    -------
+    OrderedDict
+        Sequences in alignment (key: ID, value: sequence),
+        in order they appeared in input file
+
+    Raises
+    ------
+    ValueError
+        Upon invalid choice of insert strategy
+    """
+    ids, raw = _read_a3m_matrix(fileobj, inserts)
+
+    return OrderedDict(
+        (seq_id, row.tobytes().decode())
+        for seq_id, row in zip(ids, raw)
+    )
+
+
+def _read_a3m_matrix(fileobj, inserts="first"):
+    """
+    Read an alignment in compressed a3m format and expand
+    into a matrix of raw bytes in a2m format.
+
+    Insert column widths are determined for all sequences in
+    a single pass over the concatenated sequence bytes, and
+    sequences are then expanded directly into the final matrix.
+
+    .. note::
+
+        If the same sequence identifier occurs more than once,
+        only the last sequence will be kept at the position of the
+        first occurrence (same behaviour as building an OrderedDict
+        from read_fasta).
+
+    Parameters
+    ----------
+    fileobj : file-like object
+        A3M alignment file (opened in text or binary mode)
+    inserts : {"first", "delete", "all"}
+        Strategy to deal with inserts (lowercase characters).
+        "first": keep inserts of first sequence, and
+        delete inserts of all other sequences. "delete":
+        delete any insert column and keep only match state
+        columns. "all": keep inserts of all sequences; each
+        insert column block is as wide as the longest insert
+        at that position, and inserts are left-aligned within
+        the block.
+
+    Returns
+    -------
+    ids : list of str
+        Sequence identifiers
+    raw : np.array
+        N x L matrix (dtype uint8) of ASCII characters
+        in the expanded alignment
+
+    Raises
+    ------
+    ValueError
+        Upon invalid choice of insert strategy, or if
+        sequences have different numbers of match states
+    """
+    if inserts not in ("first", "delete", "all"):
+        raise ValueError(
+            "Invalid option for inserts: {}".format(inserts)
+        )
+
+    ids, buffer, lengths = _read_fasta_records(fileobj)
+
+    if len(ids) == 0:
+        raise ValueError("Need at least one sequence")
+
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+
+    num_matches, insert_counts = _a3m_insert_counts(buffer, offsets)
+
+    invalid = np.flatnonzero(num_matches != num_matches[0])
+    if len(invalid) > 0:
+        i = invalid[0]
+        raise ValueError(
+            "Sequences have differing numbers of match states: "
+            "i={} M_0={} M_i={}".format(i, num_matches[0], num_matches[i])
+        )
+
+    if inserts == "first":
+        widths = insert_counts[0]
+        keep_inserts = np.zeros(len(ids), dtype=bool)
+        keep_inserts[0] = True
+    elif inserts == "all":
+        widths = insert_counts.max(axis=0)
+        keep_inserts = np.ones(len(ids), dtype=bool)
+    else:
+        widths = np.zeros_like(insert_counts[0])
+        keep_inserts = np.zeros(len(ids), dtype=bool)
+
+    raw = np.full(
+        (len(ids), num_matches[0] + widths.sum()),
+        ord(INSERT_GAP), dtype=np.uint8
+    )
+    _expand_a3m(buffer, offsets, widths, keep_inserts, raw)
+
+    if len(set(ids)) < len(ids):
+        # keep last sequence for duplicated IDs at position of first occurrence
+        last_index = {id_: i for i, id_ in enumerate(ids)}
+        records = OrderedDict((id_, last_index[id_]) for id_ in ids)
+        ids = list(records.keys())
+        raw = raw[list(records.values())]
+
+    return ids, raw
+
+
+@jit(nopython=True)
+def _a3m_insert_counts(buffer, offsets):
+    """
+    Count match states and inserts between match states
+    for all sequences in an A3M alignment
+
+    Parameters
+    ----------
+    buffer : np.array
+        Vector (dtype uint8) containing raw bytes of all
+        sequences concatenated (see _read_fasta_records)
+    offsets : np.array
+        Start of each sequence in buffer, followed by
+        the length of buffer
+
+    Returns
+    -------
+    num_matches : np.array
+        Number of match states in each sequence
+    insert_counts : np.array
+        N x (M + 1) matrix with number of inserted residues
+        in each sequence before match state 0, ..., M - 1 and
+        after the last match state (M: number of match states
+        in first sequence)
+    """
+    N = len(offsets) - 1
+    num_matches = np.zeros(N, dtype=np.int64)
+
+    # number of match states in first sequence
+    M = 0
+    for k in range(offsets[0], offsets[1]):
+        b = buffer[k]
+        if b != 46 and not (97 <= b <= 122):
+            M += 1
+
+    insert_counts = np.zeros((N, M + 1), dtype=np.int64)
+
+    for i in range(N):
+        m = 0
+        for k in range(offsets[i], offsets[i + 1]):
+            b = buffer[k]
+            # skip insert gaps
+            if b == 46:
+                continue
+            if 97 <= b <= 122:
+                if m <= M:
+                    insert_counts[i, m] += 1
+            else:
+                m += 1
+
+        num_matches[i] = m
+
+    return num_matches, insert_counts
+
+
+@jit(nopython=True)
+def _expand_a3m(buffer, offsets, widths, keep_inserts, raw):
+    """
+    Expand sequences in an A3M alignment into A2M
+    format (see _read_a3m_matrix)
+
+    Parameters
+    ----------
+    buffer : np.array
+        Vector (dtype uint8) containing raw bytes of all
+        sequences concatenated (see _read_fasta_records)
+    offsets : np.array
+        Start of each sequence in buffer, followed by
+        the length of buffer
+    widths : np.array
+        Width of insert column block before each match
+        state and after the last match state
+    keep_inserts : np.array(bool)
+        Keep inserts of each sequence
+    raw : np.array
+        N x L output matrix (dtype uint8), must be
+        filled with insert gaps. Will be modified in place.
+    """
+    N = len(offsets) - 1
+
+    for i in range(N):
+        m = 0
+        # first column of current insert block
+        col = 0
+        # number of residues placed in current insert block
+        r = 0
+        for k in range(offsets[i], offsets[i + 1]):
+            b = buffer[k]
+            if b == 46:
+                continue
+            if 97 <= b <= 122:
+                if keep_inserts[i] and r < widths[m]:
+                    raw[i, col + r] = b
+                    r += 1
+            else:
+                raw[i, col + widths[m]] = b
+                col += widths[m] + 1
+                m += 1
+                r = 0
+
+
+def write_a3m(sequences, fileobj, insert_gap=INSERT_GAP, width=80):
+    """
+    Write a list of IDs/sequences to a FASTA-format file
+
+    Parameters
+    ----------
+    sequences : Iterable
+        Iterator returning tuples(str, str), where
+        first value is header/ID and second the
+        sequence
+    fileobj : file-like obj
+        File to which alignment will be written
+    """
+    for (seq_id, seq) in sequences:
+        fileobj.write(">{}\n".format(seq_id))
+        fileobj.write(seq.replace(insert_gap, "") + "\n")
+
+
+def detect_format(fileobj):
+    """
+    Detect if an alignment file is in FASTA or
     Stockholm format.
 
     Parameters
     ----------
     fileobj : file-like obj
         Alignment file for which to detect format
+        (may be compressed, see decompress)
 
     Returns
     -------
     format : {"fasta", "stockholm", None}
         Format of alignment, None if not detectable
     """
-    for i, line in enumerate(fileobj):
+    for i, line in enumerate(decompress(fileobj)):
         # must be first line of Stockholm file by definition
         if i == 0 and line.startswith("# STOCKHOLM 1.0"):
             return "stockholm"
@@ -448,100 +1449,422 @@ def map_from_alphabet(alphabet=ALPHABET_PROTEIN, default=GAP):
     return defaultdict(lambda: default, map_)
 
 
-def map_matrix(matrix, map_):
+def lookup_table(alphabet=ALPHABET_PROTEIN, default=GAP):
     """
-    Map elements in a numpy array using alphabet
+    Creates a lookup table that maps raw byte values
+    (i.e. ASCII characters) to their index in a given alphabet.
 
     Parameters
     ----------
-    matrix : np.array
-        Matrix that should be remapped
-    map_ : defaultdict
-        Map that will be applied to matrix elements
+    alphabet : str
+        Alphabet for remapping. Elements will
+        be remapped according to alphabet starting
+        from 0
+    default : Elements in matrix that are not
+        contained in alphabet will be treated as
+        this character
 
     Returns
     -------
     np.array
-        Remapped matrix
+        Vector of length 256 (dtype uint8), where entry
+        k is the index of character chr(k) in the alphabet
+
+    Raises
+    ------
+    ValueError
+        For invalid default character
     """
-    return np.vectorize(map_.__getitem__)(matrix)
+    map_ = map_from_alphabet(alphabet, default)
 
+    table = np.full(256, map_[default], dtype=np.uint8)
+    for c, i in map_.items():
+        table[ord(c)] = i
 
-class Alignment:
+    return table
+
+
+def bytes_to_chars(raw):
     """
-    Container to store and manipulate multiple sequence alignments.
+    Transform a matrix of raw (ASCII) bytes into
+    a matrix of characters.
 
-    .. note::
+    Parameters
+    ----------
+    raw : np.array
+        Matrix (dtype uint8) of ASCII characters
 
-        Important:
+    Returns
+    -------
+    np.array
+        Matrix of characters (dtype U1) with same shape as raw
+    """
+    return raw.astype(np.uint32).view("U1")
 
-        1. Sequence annotation currently is not transformed when
-           selecting subsets of columns or positions (e.g. affects GR and GC
-           lines in Stockholm alignments)
-        2. Sequence ranges in IDs are not adjusted when selecting
-           subsets of positions
+
+def chars_to_bytes(matrix):
     """
-    def __init__(self, sequence_matrix, sequence_ids=None, annotation=None,
-                 alphabet=ALPHABET_PROTEIN):
-        """
-        Create new alignment object from ready-made components.
+    Transform a matrix of characters into a matrix of
+    raw (ASCII) bytes, if possible.
 
-        .. note::
+    Parameters
+    ----------
+    matrix : np.array
+        Matrix of characters
 
-            Use factory method Alignment.from_file to create alignment from file,
-            or Alignment.from_dict from dictionary of sequences.
+    Returns
+    -------
+    np.array
+        Matrix (dtype uint8) of ASCII characters with
+        same shape as matrix, or None if matrix does not
+        exclusively contain single ASCII characters
+    """
+    if matrix.dtype == np.dtype("S1"):
+        return matrix.view(np.uint8)
 
-        Parameters
-        ----------
-        sequence_matrix : np.array
-            N x L array of characters in the alignment
-            (N=number of sequences, L=width of alignment)
-        sequence_ids : list-like, optional (default=None)
-            Sequence names of alignment members (must have N elements).
-            If None, defaults sequence IDs to "0", "1", ...
-        annotation : dict-like
-            Annotation for sequence alignment
+    if matrix.dtype != np.dtype("U1"):
+        return None
 
-        Raises
-        ------
-        ValueError
-            If dimensions of sequence_matrix and sequence_ids
-            are inconsistent
-        """
-        self.matrix = np.array(sequence_matrix)
-        self.N, self.L = self.matrix.shape
+    # reinterpret UCS4 code points rather than encoding
+    # each character, which is much faster
+    codepoints = np.ascontiguousarray(matrix).view(np.uint32)
+    if codepoints.size > 0 and codepoints.max() >= 128:
+        return None
 
-        # characters coding for gaps in match-state and insert
-        # columns of the alignment
-        self._match_gap = MATCH_GAP
-        self._insert_gap = INSERT_GAP
+    return codepoints.astype(np.uint8)
 
-        # defined alphabet of alignment
-        self.alphabet = alphabet
-        self.alphabet_default = self._match_gap
 
-        self.alphabet_map = map_from_alphabet(
-            self.alphabet, default=self.alphabet_default
-        )
-        self.num_symbols = len(self.alphabet_map)
+def encode_matrix(matrix, alphabet=ALPHABET_PROTEIN):
+    """
+    Encode a matrix of characters as a compact matrix of
+    symbol codes (one byte per element).
 
-        # Alignment matrix remapped into in integers
-        # Will only be calculated if necessary for downstream
-        # calculations
-        self.matrix_mapped = None
-        self.num_cluster_members = None
-        self.weights = None
-        self._frequencies = None
-        self._pair_frequencies = None
+    In contrast to mapping the matrix to an alphabet (which
+    collapses all non-alphabet characters onto the default
+    character), this encoding is lossless: characters that are
+    not part of the alphabet (e.g. lowercase or insert gap characters)
+    are appended to the symbol table after the alphabet symbols.
+    Codes of alphabet characters are therefore identical to their
+    index in the alphabet.
 
-        if sequence_ids is None:
-            # default to numbering sequences if not given
-            self.ids = [str(i) for i in range(self.N)]
-        else:
-            if len(sequence_ids) != self.N:
-                raise ValueError(
-                    "Number of sequence IDs and length of "
-                    "alignment do not match".format(
+    Parameters
+    ----------
+    matrix : np.array
+        Matrix of characters (dtype U1), or matrix of
+        ASCII bytes (dtype uint8)
+    alphabet : str, optional (default: ALPHABET_PROTEIN)
+        Alphabet symbols that will be placed at the
+        beginning of the symbol table
+
+    Returns
+    -------
+    codes : np.array
+        Matrix (dtype uint8) with same shape as matrix,
+        so that symbols[codes] reproduces the character matrix
+    symbols : np.array
+        Vector of characters (dtype U1) in symbol table
+
+    Raises
+    ------
+    ValueError
+        If matrix contains more than 256 different symbols
+    """
+    if matrix.dtype == np.uint8:
+        raw = matrix
+    else:
+        raw = chars_to_bytes(matrix)
+
+    if raw is not None:
+        alphabet_bytes = [ord(c) for c in alphabet]
+        present = np.flatnonzero(np.bincount(raw.ravel(), minlength=256))
+        symbol_bytes = alphabet_bytes + [
+            b for b in present if b not in alphabet_bytes
+        ]
+
+        table = np.zeros(256, dtype=np.uint8)
+        table[symbol_bytes] = np.arange(len(symbol_bytes))
+
+        return table[raw], bytes_to_chars(
+            np.array(symbol_bytes, dtype=np.uint8)
+        )
+
+    # slow path for matrices with non-ASCII content
+    symbols = list(alphabet) + sorted(set(np.unique(matrix)) - set(alphabet))
+    if len(symbols) > 256:
+        raise ValueError(
+            "Too many different symbols for compact encoding: {}".format(
+                len(symbols)
+            )
+        )
+
+    map_ = {s: i for i, s in enumerate(symbols)}
+    codes = np.vectorize(map_.__getitem__, otypes=[np.uint8])(matrix)
+    return codes, np.array(symbols)
+
+
+def _lowercase_table(match_gap=MATCH_GAP, insert_gap=INSERT_GAP):
+    """
+    Lookup table that turns raw bytes (i.e. ASCII characters)
+    into lowercase, and match gaps into insert gaps
+
+    Parameters
+    ----------
+    match_gap : str, optional (default: MATCH_GAP)
+        Gap character in match columns
+    insert_gap : str, optional (default: INSERT_GAP)
+        Gap character in insert columns
+
+    Returns
+    -------
+    np.array
+        Vector of length 256 (dtype uint8)
+    """
+    table = np.arange(256, dtype=np.uint8)
+    upper = np.arange(ord("A"), ord("Z") + 1)
+    table[upper] = upper + (ord("a") - ord("A"))
+    table[ord(match_gap)] = ord(insert_gap)
+
+    return table
+
+
+def _uppercase_table(match_gap=MATCH_GAP, insert_gap=INSERT_GAP):
+    """
+    Lookup table that turns raw bytes (i.e. ASCII characters)
+    into uppercase, and insert gaps into match gaps
+
+    Parameters
+    ----------
+    match_gap : str, optional (default: MATCH_GAP)
+        Gap character in match columns
+    insert_gap : str, optional (default: INSERT_GAP)
+        Gap character in insert columns
+
+    Returns
+    -------
+    np.array
+        Vector of length 256 (dtype uint8)
+    """
+    table = np.arange(256, dtype=np.uint8)
+    lower = np.arange(ord("a"), ord("z") + 1)
+    table[lower] = lower - (ord("a") - ord("A"))
+    table[ord(insert_gap)] = ord(match_gap)
+
+    return table
+
+
+def map_matrix(matrix, map_):
+    """
+    Map elements in a numpy array using alphabet
+
+    Parameters
+    ----------
+    matrix : np.array
+        Matrix that should be remapped
+    map_ : defaultdict
+        Map that will be applied to matrix elements
+
+    Returns
+    -------
+    np.array
+        Remapped matrix
+    """
+    return np.vectorize(map_.__getitem__)(matrix)
+
+
+# Statistics of alignment computed in a single pass
+# (see Alignment.profile)
+AlignmentProfile = namedtuple(
+    "AlignmentProfile",
+    ["sequences", "coverage", "identities", "frequencies", "gaps",
+     "num_unique"]
+)
+
+
+# Index of unique rows in a matrix
+UniqueRows = namedtuple(
+    "UniqueRows",
+    ["matrix", "index", "inverse", "counts"]
+)
+
+
+def unique_rows(matrix):
+    """
+    Find identical rows (sequences) in a matrix using a
+    hash table of row contents
+
+    Parameters
+    ----------
+    matrix : np.array
+        N x L matrix
+
+    Returns
+    -------
+    UniqueRows
+        namedtuple with the following fields:
+        matrix (U x L matrix of unique rows, in order of
+        first occurrence), index (index of first occurrence
+        of each unique row in matrix), inverse (index of
+        unique row for each row in matrix, i.e.
+        matrix == unique.matrix[unique.inverse]), counts
+        (number of occurrences of each unique row)
+    """
+    matrix = np.ascontiguousarray(matrix)
+    N = matrix.shape[0]
+
+    row_index = {}
+    inverse = np.fromiter(
+        (row_index.setdefault(row.tobytes(), len(row_index)) for row in matrix),
+        dtype=np.int64, count=N
+    )
+
+    num_unique = len(row_index)
+    counts = np.bincount(inverse, minlength=num_unique)
+
+    # first occurrence of each unique row (assign in reverse
+    # so that the earliest index is written last)
+    index = np.empty(num_unique, dtype=np.int64)
+    index[inverse[::-1]] = np.arange(N - 1, -1, -1)
+
+    # avoid copy if all rows are unique
+    if num_unique < N:
+        unique_matrix = matrix[index]
+    else:
+        unique_matrix = matrix
+
+    return UniqueRows(unique_matrix, index, inverse, counts)
+
+
+class Alignment:
+    """
+    Container to store and manipulate multiple sequence alignments.
+
+    .. note::
+
+        Important:
+
+        1. Sequence annotation currently is not transformed when
+           selecting subsets of columns or positions (e.g. affects GR and GC
+           lines in Stockholm alignments)
+        2. Sequence ranges in IDs are not adjusted when selecting
+           subsets of positions
+    """
+    def __init__(self, sequence_matrix, sequence_ids=None, annotation=None,
+                 alphabet=ALPHABET_PROTEIN, compact=False, symbols=None):
+        """
+        Create new alignment object from ready-made components.
+
+        .. note::
+
+            Use factory method Alignment.from_file to create alignment from file,
+            or Alignment.from_dict from dictionary of sequences.
+
+        .. note::
+
+            In compact mode, the alignment is stored as a matrix of
+            one-byte symbol codes (see encode_matrix) rather than as a
+            character matrix (4 bytes per character). The character
+            matrix (self.matrix) will then only be materialized when
+            accessed, and is not kept in memory. Functions passed to
+            self.apply are applied to the symbol table instead of the
+            matrix in this mode, and therefore must act element-wise.
+
+        Parameters
+        ----------
+        sequence_matrix : np.array
+            N x L array of characters in the alignment
+            (N=number of sequences, L=width of alignment)
+        sequence_ids : list-like, optional (default=None)
+            Sequence names of alignment members (must have N elements).
+            If None, defaults sequence IDs to "0", "1", ...
+        annotation : dict-like
+            Annotation for sequence alignment
+        alphabet : str, optional (default: ALPHABET_PROTEIN)
+            Alphabet of alignment
+        compact : bool, optional (default: False)
+            Store alignment in compact mode
+        symbols : np.array, optional (default: None)
+            If given, sequence_matrix is interpreted as N x L
+            matrix of symbol codes (indices into symbols, as
+            created by encode_matrix), and the alignment will
+            be stored in compact mode. Alphabet symbols must
+            be at the beginning of symbols in alphabet order.
+
+        Raises
+        ------
+        ValueError
+            If dimensions of sequence_matrix and sequence_ids
+            are inconsistent
+        """
+        if symbols is not None:
+            self._matrix = None
+            self._codes = np.asarray(sequence_matrix, dtype=np.uint8)
+            self._symbols = np.asarray(symbols)
+        elif compact:
+            self._matrix = None
+            self._codes, self._symbols = encode_matrix(
+                np.asarray(sequence_matrix), alphabet
+            )
+        else:
+            self._matrix = np.array(sequence_matrix)
+            self._codes = None
+            self._symbols = None
+
+        if self.compact:
+            self.N, self.L = self._codes.shape
+        else:
+            self.N, self.L = self._matrix.shape
+
+        # characters coding for gaps in match-state and insert
+        # columns of the alignment
+        self._match_gap = MATCH_GAP
+        self._insert_gap = INSERT_GAP
+
+        # defined alphabet of alignment
+        self.alphabet = alphabet
+        self.alphabet_default = self._match_gap
+
+        self.alphabet_map = map_from_alphabet(
+            self.alphabet, default=self.alphabet_default
+        )
+        self.num_symbols = len(self.alphabet_map)
+
+        # method for computing pair frequencies ("loop": dense
+        # L x L x num_symbols x num_symbols matrix, "blas":
+        # triangular PairFrequencies using matrix products),
+        # floating point type of the latter, and optional file
+        # for storing them out of core
+        self.pair_frequency_engine = "loop"
+        self.pair_frequency_dtype = np.float64
+        self.pair_frequency_file = None
+
+        # Alignment matrix remapped into in integers
+        # Will only be calculated if necessary for downstream
+        # calculations
+        self.matrix_mapped = None
+        self._unique_sequences = None
+        self._identity_histogram = None
+        self.num_cluster_members = None
+        self.weights = None
+        self.weights_error = None
+        self._frequencies = None
+        self._pair_frequencies = None
+
+        # precomputed numbers of cluster members for identity
+        # thresholds (e.g. from alignment cache), used by
+        # set_weights for this alignment, or for the alignment
+        # of focus columns selected as view
+        self._cluster_members_cache = {}
+        self._focus_columns = None
+        self._focus_cluster_members = {}
+
+        if sequence_ids is None:
+            # default to numbering sequences if not given
+            self.ids = [str(i) for i in range(self.N)]
+        else:
+            if len(sequence_ids) != self.N:
+                raise ValueError(
+                    "Number of sequence IDs and length of "
+                    "alignment do not match".format(
                         len(sequence_ids), self.L
                     )
                 )
@@ -549,15 +1872,97 @@ class Alignment:
             # make sure we get rid of iterators etc.
             self.ids = np.array(list(sequence_ids))
 
-        self.id_to_index = {
-            id_: i for i, id_ in enumerate(self.ids)
-        }
+        # mapping from sequence IDs to indices, will
+        # only be created when first accessed
+        self._id_to_index = None
 
         if annotation is not None:
             self.annotation = annotation
         else:
             self.annotation = {}
 
+    @property
+    def compact(self):
+        """
+        True if alignment is stored as compact
+        symbol code matrix
+        """
+        return self._codes is not None
+
+    @property
+    def id_to_index(self):
+        """
+        Dictionary mapping from sequence IDs to sequence
+        indices in alignment
+        """
+        if self._id_to_index is None:
+            self._id_to_index = {
+                id_: i for i, id_ in enumerate(self.ids)
+            }
+
+        return self._id_to_index
+
+    @id_to_index.setter
+    def id_to_index(self, id_to_index):
+        self._id_to_index = id_to_index
+
+    @property
+    def matrix(self):
+        """
+        N x L matrix of characters in alignment.
+
+        .. note::
+
+            In compact mode, this matrix is created
+            from the symbol codes upon every access.
+        """
+        if self.compact:
+            return self._symbols[self._codes]
+        else:
+            return self._matrix
+
+    @matrix.setter
+    def matrix(self, matrix):
+        """
+        Replace alignment matrix (this will reset any
+        calculations based on previous matrix)
+
+        Parameters
+        ----------
+        matrix : np.array
+            N x L array of characters in the alignment
+        """
+        matrix = np.array(matrix)
+        if matrix.shape != (self.N, self.L):
+            raise ValueError(
+                "Shape of new matrix does not agree with alignment: "
+                "{} {}".format(matrix.shape, (self.N, self.L))
+            )
+
+        if self.compact:
+            self._codes, self._symbols = encode_matrix(matrix, self.alphabet)
+        else:
+            self._matrix = matrix
+
+        self.__reset_calculations()
+
+    def __reset_calculations(self):
+        """
+        Reset any calculations based on the
+        alignment matrix
+        """
+        self.matrix_mapped = None
+        self._unique_sequences = None
+        self._identity_histogram = None
+        self.num_cluster_members = None
+        self.weights = None
+        self.weights_error = None
+        self._frequencies = None
+        self._pair_frequencies = None
+        self._cluster_members_cache = {}
+        self._focus_columns = None
+        self._focus_cluster_members = {}
+
     @classmethod
     def from_dict(cls, sequences, **kwargs):
         """
@@ -584,7 +1989,7 @@ class Alignment:
 
     @classmethod
     def from_file(cls, fileobj, format="fasta",
-                  a3m_inserts="first", **kwargs):
+                  a3m_inserts="first", use_cache=False, **kwargs):
         """
         Construct an alignment object by reading in an
         alignment file.
@@ -592,12 +1997,17 @@ class Alignment:
         Parameters
         ----------
         fileobj : file-like obj
-            Alignment to be read in
+            Alignment to be read in (may be compressed,
+            see decompress)
         format : {"fasta", "stockholm", "a3m"}
             Format of input alignment
-        a3m_inserts : {"first", "delete"}, optional (default: "first")
+        a3m_inserts : {"first", "delete", "all"}, optional (default: "first")
             Strategy to deal with inserts in a3m alignment files
             (see read_a3m documentation for details)
+        use_cache : bool, optional (default: False)
+            For FASTA files, load alignment from binary cache
+            stored next to the file instead of parsing it, if
+            the cache is valid (see read_alignment_cache)
 
         Returns
         -------
@@ -613,9 +2023,15 @@ class Alignment:
         # read in sequence alignment from file
 
         if format == "fasta":
-            seqs = OrderedDict()
-            for seq_id, seq in read_fasta(fileobj):
-                seqs[seq_id] = seq
+            if use_cache:
+                ali = cls.__from_cache(fileobj, **kwargs)
+                if ali is not None:
+                    return ali
+
+            # parse at byte level, which directly gives us the
+            # mapped alignment matrix
+            ids, raw = _read_fasta_matrix(fileobj)
+            return cls.__from_raw(ids, raw, **kwargs)
         elif format == "stockholm":
             # only reads first Stockholm alignment contained in file
             ali = next(read_stockholm(fileobj, read_annotation=True))
@@ -626,12 +2042,103 @@ class Alignment:
             annotation["GR"] = ali.gr
             kwargs["annotation"] = annotation
         elif format == "a3m":
-            seqs = read_a3m(fileobj, inserts=a3m_inserts)
+            # expand at byte level, and map right away
+            # like for FASTA input
+            ids, raw = _read_a3m_matrix(fileobj, inserts=a3m_inserts)
+            return cls.__from_raw(ids, raw, **kwargs)
         else:
             raise ValueError("Invalid alignment format: {}".format(format))
 
         return cls.from_dict(seqs, **kwargs)
 
+    @classmethod
+    def __from_raw(cls, ids, raw, **kwargs):
+        """
+        Construct an alignment object from a matrix of
+        raw bytes, and directly create the mapped
+        alignment matrix.
+
+        Parameters
+        ----------
+        ids : list of str
+            Sequence identifiers
+        raw : np.array
+            N x L matrix (dtype uint8) of ASCII characters
+
+        Returns
+        -------
+        Alignment
+            initialized alignment
+        """
+        alphabet = kwargs.get("alphabet", ALPHABET_PROTEIN)
+
+        if kwargs.get("compact", False):
+            codes, symbols = encode_matrix(raw, alphabet)
+            ali = cls(codes, ids, symbols=symbols, **kwargs)
+            ali.__ensure_mapped_matrix()
+        else:
+            ali = cls(bytes_to_chars(raw), ids, **kwargs)
+            ali.matrix_mapped = lookup_table(
+                ali.alphabet, ali.alphabet_default
+            )[raw]
+
+        return ali
+
+    @classmethod
+    def __from_cache(cls, fileobj, **kwargs):
+        """
+        Construct an alignment object from the binary
+        cache of the file underlying fileobj.
+
+        Parameters
+        ----------
+        fileobj : file-like obj
+            Alignment file opened for reading
+            (cache is only used if nothing was
+            read from the file yet)
+
+        Returns
+        -------
+        Alignment
+            initialized alignment, or None if file
+            has no valid cache
+        """
+        filename = getattr(fileobj, "name", None)
+        if not isinstance(filename, str):
+            return None
+
+        try:
+            if fileobj.tell() != 0:
+                return None
+        except (OSError, io.UnsupportedOperation):
+            return None
+
+        cache = read_alignment_cache(filename)
+        if cache is None:
+            return None
+
+        alphabet = kwargs.get("alphabet", ALPHABET_PROTEIN)
+        symbol_bytes = chars_to_bytes(cache.symbols)
+
+        if kwargs.get("compact", False) and alphabet == cache.alphabet:
+            # use memory-mapped codes right away
+            ali = cls(cache.codes, cache.ids, symbols=cache.symbols, **kwargs)
+            ali.__ensure_mapped_matrix()
+        elif symbol_bytes is not None:
+            ali = cls.__from_raw(cache.ids, symbol_bytes[cache.codes], **kwargs)
+        else:
+            ali = cls(cache.symbols[cache.codes], cache.ids, **kwargs)
+
+        # sequence weights depend on mapping to alphabet
+        if alphabet == cache.alphabet:
+            if cache.focus_columns is None:
+                ali._cluster_members_cache = cache.num_cluster_members
+            else:
+                ali._focus_columns = cache.focus_columns
+                ali._focus_cluster_members = cache.num_cluster_members
+
+        return ali
+
     def __getitem__(self, index):
         """
         .. todo::
@@ -639,14 +2146,17 @@ class Alignment:
             eventually this should allow fancy indexing and offer the functionality of select()
         """
         if index in self.id_to_index:
-            return self.matrix[self.id_to_index[index], :]
-        elif index in range(self.N):
-            return self.matrix[index, :]
-        else:
+            index = self.id_to_index[index]
+        elif index not in range(self.N):
             raise KeyError(
                 "Not a valid index for sequence alignment: {}".format(index)
             )
 
+        if self.compact:
+            return self._symbols[self._codes[index, :]]
+        else:
+            return self._matrix[index, :]
+
     def __len__(self):
         return self.N
 
@@ -686,13 +2196,22 @@ class Alignment:
         else:
             raise ValueError("Invalid axis: {}".format(axis))
 
-        c = np.sum(self.matrix == char, axis=naxis)
+        if self.compact:
+            # compare codes rather than characters
+            code = np.flatnonzero(self._symbols == char)
+            if len(code) > 0:
+                c = np.sum(self._codes == code[0], axis=naxis)
+            else:
+                c = np.zeros(self._codes.shape[1 - naxis], dtype=int)
+        else:
+            c = np.sum(self._matrix == char, axis=naxis)
+
         if normalize:
-            c = c / self.matrix.shape[naxis]
+            c = c / (self.N, self.L)[naxis]
 
         return c
 
-    def select(self, columns=None, sequences=None):
+    def select(self, columns=None, sequences=None, view=False):
         """
         Create a sub-alignment that contains a subset of
         sequences and/or columns.
@@ -703,6 +2222,16 @@ class Alignment:
             of the sequences. Annotation in the original alignment
             will be lost and not passed on to the new object.
 
+        .. note::
+
+            If view is True, the sub-alignment shares the alignment
+            matrix (and the mapped matrix, if already computed) with
+            this alignment wherever the selection can be expressed
+            as a slice, rather than copying it, and the shared arrays
+            are marked as read-only. Sequence weights and frequencies
+            depend on the selected subset and will be recomputed
+            for the sub-alignment.
+
         Parameters
         ----------
         columns : np.array(bool) or np.array(int), optional
@@ -713,6 +2242,9 @@ class Alignment:
             Vector containing True for each sequence that
             should be retained, False otherwise; or the
             indices of sequences that should be selected
+        view : bool, optional (default: False)
+            Avoid copying data from this alignment, and carry
+            over the mapped alignment matrix
 
         Returns
         -------
@@ -723,7 +2255,14 @@ class Alignment:
         if columns is None and sequences is None:
             return self
 
-        sel_matrix = self.matrix
+        if view:
+            return self.__select_view(columns, sequences)
+
+        if self.compact:
+            sel_matrix = self._codes
+        else:
+            sel_matrix = self._matrix
+
         ids = self.ids
 
         if columns is not None:
@@ -735,12 +2274,65 @@ class Alignment:
 
         # do not copy annotation since it may become
         # inconsistent
-        return Alignment(
-            np.copy(sel_matrix), np.copy(ids),
-            alphabet=self.alphabet
-        )
+        if self.compact:
+            return Alignment(
+                np.copy(sel_matrix), np.copy(ids),
+                alphabet=self.alphabet, symbols=self._symbols
+            )
+        else:
+            return Alignment(
+                np.copy(sel_matrix), np.copy(ids),
+                alphabet=self.alphabet
+            )
 
-    def apply(self, columns=None, sequences=None, func=np.char.lower):
+    def __select_view(self, columns, sequences):
+        """
+        Implementation of self.select for view mode:
+        create a shallow copy of the alignment that
+        shares all data not affected by the selection.
+        """
+        sequences = _index_to_slice(sequences, self.N)
+        columns = _index_to_slice(columns, self.L)
+
+        ali = copy(self)
+        ali.__reset_calculations()
+        ali.annotation = {}
+
+        if self.compact:
+            ali._codes = _select_matrix(self._codes, sequences, columns)
+            ali.N, ali.L = ali._codes.shape
+        else:
+            ali._matrix = _select_matrix(self._matrix, sequences, columns)
+            ali.N, ali.L = ali._matrix.shape
+
+        # mapped matrix remains valid for subset
+        if self.matrix_mapped is not None:
+            if self.compact and self.matrix_mapped is self._codes:
+                ali.matrix_mapped = ali._codes
+            else:
+                ali.matrix_mapped = _select_matrix(
+                    self.matrix_mapped, sequences, columns
+                )
+
+        # precomputed cluster members remain valid if all
+        # sequences are kept (and for focus columns)
+        if _is_identity(sequences, self.N):
+            if _is_identity(columns, self.L):
+                ali._cluster_members_cache = self._cluster_members_cache
+                ali._focus_columns = self._focus_columns
+                ali._focus_cluster_members = self._focus_cluster_members
+            elif (self._focus_columns is not None and np.array_equal(
+                    np.arange(self.L)[columns], self._focus_columns)):
+                ali._cluster_members_cache = self._focus_cluster_members
+
+        # IDs are cheap to copy, and may be modified by caller
+        ali.ids = np.array(self.ids)[sequences]
+        if not isinstance(sequences, slice) or sequences != slice(None):
+            ali._id_to_index = None
+
+        return ali
+
+    def apply(self, columns=None, sequences=None, func=np.char.lower):
         """
         Apply a function along columns and/or rows of alignment matrix,
         or to entire matrix.
@@ -765,22 +2357,70 @@ class Alignment:
             Alignment with modified columns and sequences
             (this alignment maintains annotation)
         """
-        mod_matrix = np.copy(self.matrix)
-
         if columns is None and sequences is None:
             return self
-        else:
-            if columns is not None:
-                mod_matrix[:, columns] = func(mod_matrix[:, columns])
 
-            if sequences is not None:
-                mod_matrix[sequences, :] = func(mod_matrix[sequences, :])
+        if self.compact:
+            return self.__apply_compact(columns, sequences, func)
+
+        mod_matrix = np.copy(self._matrix)
+
+        if columns is not None:
+            mod_matrix[:, columns] = func(mod_matrix[:, columns])
+
+        if sequences is not None:
+            mod_matrix[sequences, :] = func(mod_matrix[sequences, :])
 
         return Alignment(
             mod_matrix, np.copy(self.ids), deepcopy(self.annotation),
             alphabet=self.alphabet
         )
 
+    def __apply_compact(self, columns, sequences, func):
+        """
+        Implementation of self.apply for alignments in
+        compact mode: func is applied to the symbol table,
+        and codes of the selected subset of the alignment
+        are translated to the codes of the transformed symbols.
+        """
+        mod_codes = np.copy(self._codes)
+        symbols = self._symbols
+
+        for axis, index in [(1, columns), (0, sequences)]:
+            if index is None:
+                continue
+
+            # transform symbol table and add any new symbols at the end
+            # (truncating to single characters like assignment into matrix)
+            transformed = np.asarray(func(symbols)).astype("U1")
+            new_symbols = [
+                c for c in OrderedDict.fromkeys(transformed)
+                if c not in symbols
+            ]
+
+            if len(symbols) + len(new_symbols) > 256:
+                raise ValueError(
+                    "Too many different symbols for compact encoding"
+                )
+
+            symbols = np.concatenate(
+                (symbols, np.array(new_symbols, dtype="U1"))
+            )
+            symbol_to_code = {c: i for i, c in enumerate(symbols)}
+            remap = np.array(
+                [symbol_to_code[c] for c in transformed], dtype=np.uint8
+            )
+
+            if axis == 1:
+                mod_codes[:, index] = remap[mod_codes[:, index]]
+            else:
+                mod_codes[index, :] = remap[mod_codes[index, :]]
+
+        return Alignment(
+            mod_codes, np.copy(self.ids), deepcopy(self.annotation),
+            alphabet=self.alphabet, symbols=symbols
+        )
+
     def replace(self, original, replacement, columns=None, sequences=None):
         """
         Replace character with another in full matrix or
@@ -826,22 +2466,296 @@ class Alignment:
         Alignment
             Alignment with lowercase columns
         """
-        return self.apply(
-            columns=columns, func=np.char.lower
-        ).replace(
-            self._match_gap, self._insert_gap, columns=columns
+        if columns is None:
+            return self
+
+        if self.compact:
+            return self.apply(
+                columns=columns, func=lambda x: np.char.replace(
+                    np.char.lower(x), self._match_gap, self._insert_gap
+                )
+            )
+
+        raw = chars_to_bytes(self._matrix)
+        if raw is None:
+            return self.apply(
+                columns=columns, func=np.char.lower
+            ).replace(
+                self._match_gap, self._insert_gap, columns=columns
+            )
+
+        # transform selected columns in a single pass over
+        # raw bytes, and only remap the modified columns
+        table = _lowercase_table(self._match_gap, self._insert_gap)
+
+        mod_raw = np.copy(raw)
+        mod_raw[:, columns] = table[raw[:, columns]]
+
+        ali = Alignment(
+            bytes_to_chars(mod_raw), np.copy(self.ids),
+            deepcopy(self.annotation), alphabet=self.alphabet
+        )
+
+        if self.matrix_mapped is not None:
+            ali.matrix_mapped = np.copy(self.matrix_mapped)
+            ali.matrix_mapped[:, columns] = lookup_table(
+                ali.alphabet, ali.alphabet_default
+            )[mod_raw[:, columns]]
+
+        return ali
+
+    def filter_identity(self, identity_threshold, columns="first",
+                        num_threads=None):
+        """
+        Reduce redundancy of alignment by removing sequences
+        that are more than identity_threshold identical to
+        any other sequence retained in the alignment (in-process
+        equivalent of hhfilter -id, see identity_filter).
+
+        Parameters
+        ----------
+        identity_threshold : float
+            Maximum pairwise sequence identity (between 0 and 1)
+        columns : {"first", "all"}, optional (default: "first")
+            Columns used to compute identities. "first": only
+            columns with a residue in the first sequence (match
+            columns, like hhfilter -M first); other columns are
+            removed, and residues and gaps in match columns are
+            turned into uppercase and match gaps. "all": use all
+            columns and leave alignment unchanged otherwise.
+        num_threads : int, optional (default: None)
+            Number of threads used for comparing sequences
+            (if None, use all threads available to numba)
+
+        Returns
+        -------
+        Alignment
+            Alignment of retained sequences in original order
+            (note this alignment looses annotation)
+
+        Raises
+        ------
+        ValueError
+            Upon invalid value of columns parameter
+        """
+        if columns not in ["first", "all"]:
+            raise ValueError(
+                "Invalid column selection: {}".format(columns)
+            )
+
+        if self.N == 0:
+            return self
+
+        if columns == "first":
+            first = self[0]
+            match_cols = (
+                (first != self._match_gap) & (first != self._insert_gap)
+            )
+            ali = self.select(columns=match_cols).__match_states()
+        else:
+            ali = self
+
+        ali.__ensure_mapped_matrix()
+        keep = identity_filter(
+            ali.matrix_mapped, identity_threshold,
+            gap=ali.alphabet_map[ali.alphabet_default],
+            num_threads=num_threads
+        )
+
+        return ali.select(sequences=keep)
+
+    def __match_states(self):
+        """
+        Turn all characters into uppercase and insert
+        gaps into match gaps
+
+        Returns
+        -------
+        Alignment
+            Alignment of match states (without annotation)
+        """
+        raw = chars_to_bytes(self.matrix)
+        if raw is None:
+            matrix = np.char.upper(self.matrix)
+            matrix[matrix == self._insert_gap] = self._match_gap
+            return Alignment(
+                matrix, np.copy(self.ids),
+                alphabet=self.alphabet, compact=self.compact
+            )
+
+        table = _uppercase_table(self._match_gap, self._insert_gap)
+
+        return self.__from_raw(
+            np.copy(self.ids), table[raw],
+            alphabet=self.alphabet, compact=self.compact
         )
 
     def __ensure_mapped_matrix(self):
         """
         Ensure self.matrix_mapped exists
         """
+        if self.matrix_mapped is None and self.compact:
+            # alphabet symbols are at the beginning of symbol table,
+            # so if there are no other symbols, codes are identical to
+            # mapped matrix and do not need to be copied
+            if self._codes.size == 0 or self._codes.max() < self.num_symbols:
+                self.matrix_mapped = self._codes
+            else:
+                symbol_map = np.array(
+                    [self.alphabet_map[c] for c in self._symbols],
+                    dtype=np.uint8
+                )
+                self.matrix_mapped = symbol_map[self._codes]
+
         if self.matrix_mapped is None:
-            self.matrix_mapped = map_matrix(
-                self.matrix, self.alphabet_map
+            # use byte lookup table if possible, which is much
+            # faster than mapping each element through dictionary
+            raw = chars_to_bytes(self._matrix)
+
+            if raw is not None:
+                self.matrix_mapped = lookup_table(
+                    self.alphabet, self.alphabet_default
+                )[raw]
+            else:
+                self.matrix_mapped = map_matrix(
+                    self.matrix, self.alphabet_map
+                )
+
+    def unique_sequences(self):
+        """
+        Index of distinct sequences in the alignment
+        (based on the mapped alignment matrix, i.e. all symbols
+        outside of the alphabet are treated as identical).
+        Also sets self._unique_sequences member variable
+        for later reuse.
+
+        Returns
+        -------
+        UniqueRows
+            Unique rows of mapped alignment matrix
+            (see unique_rows)
+        """
+        if self._unique_sequences is None:
+            self.__ensure_mapped_matrix()
+            self._unique_sequences = unique_rows(self.matrix_mapped)
+
+        return self._unique_sequences
+
+    def _unique_weights(self):
+        """
+        Sequence weights aggregated over identical sequences
+
+        Returns
+        -------
+        unique : UniqueRows
+            Index of distinct sequences (see unique_sequences)
+        weights : np.array
+            Summed weight of all copies of each distinct
+            sequence (each sequence has weight 1 if
+            self.set_weights() was not called before)
+        """
+        unique = self.unique_sequences()
+
+        # use precalculated sequence weights, but only
+        # if we have explicitly calculated them before
+        # (expensive calculation)
+        if self.weights is None:
+            weights = unique.counts.astype(np.float64)
+        else:
+            weights = np.bincount(
+                unique.inverse, weights=self.weights,
+                minlength=len(unique.counts)
+            )
+
+        return unique, weights
+
+    def compute_identity_histogram(self, min_identity_threshold,
+                                   num_threads=None):
+        """
+        Compare all pairs of sequences once and store a histogram of
+        the number of mismatches for each sequence (see
+        identity_histogram). Subsequent calls to self.set_weights()
+        with method "exact" and self.num_effective_sequences() for
+        identity thresholds >= min_identity_threshold will be computed
+        from the histogram rather than by comparing sequences again.
+
+        Parameters
+        ----------
+        min_identity_threshold : float
+            Lowest identity threshold for which weights
+            will be computed from the histogram
+        num_threads : int, optional (default: None)
+            Number of threads used for calculation
+            (if None, use all threads available to numba)
+        """
+        unique = self.unique_sequences()
+
+        self._identity_histogram = identity_histogram(
+            unique.matrix, min_identity_threshold,
+            num_threads=num_threads, multiplicity=unique.counts
+        )
+
+    def _covered_by_histogram(self, identity_threshold):
+        """
+        Check if weights for identity_threshold can be
+        computed from stored identity histogram
+        """
+        return (
+            self._identity_histogram is not None and
+            _max_mismatches(self.L, identity_threshold) <
+            self._identity_histogram.shape[1]
+        )
+
+    def num_effective_sequences(self, identity_thresholds, num_threads=None):
+        """
+        Calculate number of effective sequences (sum of sequence
+        weights) for multiple identity thresholds at once. All
+        pairs of sequences are only compared once (unless an
+        identity histogram covering all thresholds was computed
+        before, in which case no sequences are compared).
+
+        .. note::
+
+            This method does not modify self.weights.
+
+        Parameters
+        ----------
+        identity_thresholds : list-like of float
+            Sequence identity thresholds
+        num_threads : int, optional (default: None)
+            Number of threads used for calculation
+            (if None, use all threads available to numba)
+
+        Returns
+        -------
+        np.array
+            Number of effective sequences for
+            each identity threshold
+        """
+        identity_thresholds = list(identity_thresholds)
+
+        if not all(self._covered_by_histogram(t) for t in identity_thresholds):
+            self.compute_identity_histogram(
+                min(identity_thresholds), num_threads=num_threads
             )
 
-    def set_weights(self, identity_threshold=0.8):
+        unique = self.unique_sequences()
+
+        # weight of each distinct sequence times
+        # number of copies of that sequence
+        return np.array([
+            (
+                unique.counts / num_cluster_members_from_histogram(
+                    self._identity_histogram, self.L,
+                    threshold, multiplicity=unique.counts
+                )
+            ).sum()
+            for threshold in identity_thresholds
+        ])
+
+    def set_weights(self, identity_threshold=0.8, num_threads=None,
+                    method="exact", recall=0.95, error_sample_size=500,
+                    random_state=None):
         """
         Calculate weights for sequences in alignment by
         clustering all sequences with sequence identity
@@ -861,12 +2775,79 @@ class Alignment:
         ----------
         identity_threshold : float, optional (default: 0.8)
             Sequence identity threshold
+        num_threads : int, optional (default: None)
+            Number of threads used for weight calculation
+            (if None, use all threads available to numba)
+        method : {"exact", "lsh"}, optional (default: "exact")
+            Compare all pairs of sequences ("exact"), or only
+            pairs found by locality-sensitive hashing ("lsh",
+            see num_cluster_members_lsh). For "lsh", the error
+            relative to exact weights is estimated on a subsample
+            of sequences and stored in self.weights_error. For
+            "exact", weights are derived from the identity histogram
+            if it was computed before for a low enough threshold
+            (see self.compute_identity_histogram()), or loaded
+            from an alignment cache for the same threshold
+            (see Alignment.from_file).
+        recall : float, optional (default: 0.95)
+            Minimum probability of finding a pair of sequences at
+            the identity threshold (only used for method "lsh")
+        error_sample_size : int, optional (default: 500)
+            Number of sequences used to estimate the error of
+            approximate weights (only used for method "lsh")
+        random_state : int, optional (default: None)
+            Random seed (only used for method "lsh")
         """
-        self.__ensure_mapped_matrix()
+        if (method == "exact" and
+                identity_threshold in self._cluster_members_cache):
+            # reuse precomputed exact weights (e.g. from alignment cache)
+            self.num_cluster_members = np.asarray(
+                self._cluster_members_cache[identity_threshold]
+            )
+            self.weights = 1.0 / self.num_cluster_members
+            self.weights_error = None
+            self._frequencies = None
+            self._pair_frequencies = None
+            return
+
+        # only compare distinct sequences, identical copies
+        # are accounted for by their multiplicity
+        unique = self.unique_sequences()
+
+        if method == "exact" and self._covered_by_histogram(identity_threshold):
+            # reuse pairwise comparisons from identity histogram
+            num_members = num_cluster_members_from_histogram(
+                self._identity_histogram, self.L,
+                identity_threshold, multiplicity=unique.counts
+            )
+            self.weights_error = None
+        elif method == "exact":
+            num_members = num_cluster_members(
+                unique.matrix, identity_threshold,
+                num_threads=num_threads, multiplicity=unique.counts
+            )
+            self.weights_error = None
+        elif method == "lsh":
+            num_members = num_cluster_members_lsh(
+                unique.matrix, identity_threshold,
+                recall=recall, random_state=random_state,
+                multiplicity=unique.counts
+            )
+            self.weights_error = estimate_weights_error(
+                unique.matrix, identity_threshold, num_members,
+                sample_size=error_sample_size,
+                random_state=random_state,
+                num_threads=num_threads,
+                multiplicity=unique.counts
+            )
+        else:
+            raise ValueError(
+                "Invalid weighting method: {}, valid options "
+                "are: exact, lsh".format(method)
+            )
 
-        self.num_cluster_members = num_cluster_members(
-            self.matrix_mapped, identity_threshold
-        )
+        # expand back to all sequences
+        self.num_cluster_members = num_members[unique.inverse]
         self.weights = 1.0 / self.num_cluster_members
 
         # reset frequencies, since these were based on
@@ -890,18 +2871,10 @@ class Alignment:
             Reference to self._frequencies
         """
         if self._frequencies is None:
-            self.__ensure_mapped_matrix()
-
-            # use precalculated sequence weights, but only
-            # if we have explicitly calculated them before
-            # (expensive calculation)
-            if self.weights is None:
-                weights = np.ones((self.N))
-            else:
-                weights = self.weights
+            unique, weights = self._unique_weights()
 
             self._frequencies = frequencies(
-                self.matrix_mapped, weights, self.num_symbols
+                unique.matrix, weights, self.num_symbols
             )
 
         return self._frequencies
@@ -916,27 +2889,46 @@ class Alignment:
         will be used to adjust frequency counts; otherwise, each sequence
         will contribute with equal weight.
 
+        The frequencies are computed as specified by
+        self.pair_frequency_engine: "loop" creates a dense
+        L x L x num_symbols x num_symbols matrix (function
+        pair_frequencies), "blas" a PairFrequencies object of type
+        self.pair_frequency_dtype that only stores pairs i < j
+        (function pair_frequencies_blas), but can be indexed the
+        same way. If self.pair_frequency_file is set, the latter
+        will be stored in a memory-mapped file at this path.
+
         Returns
         -------
-        np.array
+        np.array or PairFrequencies
             Reference to self._pair_frequencies
         """
         if self._pair_frequencies is None:
-            self.__ensure_mapped_matrix()
+            unique, weights = self._unique_weights()
 
-            if self.weights is None:
-                weights = np.ones((self.N))
+            if self.pair_frequency_engine == "loop":
+                self._pair_frequencies = pair_frequencies(
+                    unique.matrix, weights,
+                    self.num_symbols, self.frequencies
+                )
+            elif self.pair_frequency_engine == "blas":
+                self._pair_frequencies = pair_frequencies_blas(
+                    unique.matrix, weights,
+                    self.num_symbols, self.frequencies,
+                    dtype=self.pair_frequency_dtype,
+                    filename=self.pair_frequency_file
+                )
             else:
-                weights = self.weights
-
-            self._pair_frequencies = pair_frequencies(
-                self.matrix_mapped, weights,
-                self.num_symbols, self.frequencies
-            )
+                raise ValueError(
+                    "Invalid pair frequency engine: {}, valid "
+                    "options are: loop, blas".format(
+                        self.pair_frequency_engine
+                    )
+                )
 
         return self._pair_frequencies
 
-    def identities_to(self, seq, normalize=True):
+    def identities_to(self, seq, normalize=True, ignore_gaps=False):
         """
         Calculate sequence identity between sequence
         and all sequences in the alignment.
@@ -946,20 +2938,102 @@ class Alignment:
         normalize : bool, optional (default: True)
             Calculate relative identity between 0 and 1
             by normalizing with length of alignment
+        ignore_gaps : bool, optional (default: False)
+            Do not count gap positions of seq as identities
+            (see identities_to_many)
+        """
+        return self.identities_to_many(
+            [seq], normalize=normalize, ignore_gaps=ignore_gaps
+        )[:, 0]
+
+    def identities_to_many(self, queries, normalize=True,
+                           ignore_gaps=False, num_threads=None):
+        """
+        Calculate sequence identity between multiple query
+        sequences and all sequences in the alignment
+        in a single pass over the alignment matrix.
+
+        Parameters
+        ----------
+        queries : list-like or np.array
+            List of K sequences for comparison (each given as
+            np.array, list-like, or str of length L), or
+            K x L matrix of characters
+        normalize : bool, optional (default: True)
+            Calculate relative identity between 0 and 1
+            by normalizing with length of alignment (or with
+            the number of non-gap positions in the query
+            if ignore_gaps is True)
+        ignore_gaps : bool, optional (default: False)
+            Do not count positions where the query sequence
+            has a gap as identities
+        num_threads : int, optional (default: None)
+            Number of threads used for calculation
+            (if None, use all threads available to numba)
+
+        Returns
+        -------
+        np.array
+            N x K matrix, where entry i, k is the identity
+            of sequence i in the alignment to query k
+
+        Raises
+        ------
+        ValueError
+            If query sequences do not have the same
+            length as the alignment
         """
         self.__ensure_mapped_matrix()
 
+        if len(queries) == 0:
+            return np.zeros((self.N, 0))
+
         # make sure this doesnt break with strings
-        seq = np.array(list(seq))
+        queries = np.array(
+            [list(seq) for seq in queries]
+        ).reshape(len(queries), -1)
 
-        seq_mapped = map_matrix(seq, self.alphabet_map)
-        ids = identities_to_seq(seq_mapped, self.matrix_mapped)
+        if queries.shape[1] != self.L:
+            raise ValueError(
+                "Query sequences must have length {}, but have "
+                "length {}".format(self.L, queries.shape[1])
+            )
 
-        if normalize:
-            return ids / self.L
+        raw = chars_to_bytes(queries)
+        if raw is not None:
+            queries_mapped = lookup_table(
+                self.alphabet, self.alphabet_default
+            )[raw]
         else:
+            queries_mapped = map_matrix(queries, self.alphabet_map)
+
+        if ignore_gaps:
+            gap = self.alphabet_map[self._match_gap]
+        else:
+            gap = -1
+
+        prev_num_threads = numba.get_num_threads()
+        numba.set_num_threads(_num_threads(num_threads))
+        try:
+            ids = identities_to_seqs(
+                np.ascontiguousarray(queries_mapped, dtype=np.uint8),
+                np.ascontiguousarray(self.matrix_mapped, dtype=np.uint8),
+                gap
+            )
+        finally:
+            numba.set_num_threads(prev_num_threads)
+
+        if not normalize:
             return ids
 
+        if ignore_gaps:
+            lengths = (queries_mapped != gap).sum(axis=1)
+        else:
+            lengths = np.full(len(queries_mapped), self.L)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return ids / lengths
+
     def conservation(self, normalize=True):
         """
         Calculate per-column conservation of sequence alignment
@@ -980,12 +3054,165 @@ class Alignment:
         np.array
             Vector of length L with conservation scores
         """
-        return np.apply_along_axis(
-            lambda x: entropy(x, normalize=normalize),
-            axis=1, arr=self.frequencies
+        return entropies(self.frequencies, normalize=normalize)
+
+    def profile(self, target_seq_index=0, minimum_sequence_coverage=None):
+        """
+        Calculate descriptive statistics of the alignment in
+        a single pass over the alignment matrix: coverage of each
+        sequence, and identities to target sequence, frequencies
+        and gaps of sequences that pass a coverage filter.
+
+        .. note::
+
+            Statistics are not adjusted for sequence
+            redundancy (i.e. sequence weights are ignored).
+
+        Parameters
+        ----------
+        target_seq_index : int, optional (default: 0)
+            Index of target sequence in alignment
+        minimum_sequence_coverage : float, optional (default: None)
+            Only include sequences with at least this fraction
+            of non-gap characters in identities, frequencies and
+            gaps (if None, include all sequences)
+
+        Returns
+        -------
+        AlignmentProfile
+            namedtuple with the following fields:
+            sequences: Vector of length N containing True for
+            each sequence that passes coverage filter;
+            coverage: fraction of positions in each sequence that
+            are not a match gap (vector of length N); identities:
+            relative identity of each included sequence to target
+            sequence (same as self.identities_to); frequencies:
+            L x num_symbols matrix of symbol frequencies in included
+            sequences (same as self.frequencies without weights);
+            gaps: relative number of match gap characters in
+            each column of included sequences; num_unique: number
+            of distinct included sequences (same as
+            self.unique_sequences(), see unique_rows)
+        """
+        if self.compact:
+            matrix, symbols = self._codes, self._symbols
+        else:
+            matrix = chars_to_bytes(self._matrix)
+            symbols = None
+            if matrix is None:
+                matrix, symbols = encode_matrix(self._matrix, self.alphabet)
+
+        # lookup tables from codes or bytes to mapped
+        # symbols and match gaps
+        if symbols is None:
+            mapping = lookup_table(self.alphabet, self.alphabet_default)
+            is_gap = np.arange(256) == ord(self._match_gap)
+        else:
+            mapping = np.array(
+                [self.alphabet_map[c] for c in symbols], dtype=np.int64
+            )
+            is_gap = symbols == self._match_gap
+
+        if minimum_sequence_coverage is None:
+            minimum_sequence_coverage = -np.inf
+
+        if self.L > 0:
+            sequences, coverage, identities, counts, gap_counts = _alignment_profile(
+                matrix, mapping, is_gap, self.num_symbols,
+                target_seq_index, float(minimum_sequence_coverage)
+            )
+        else:
+            coverage = np.full(self.N, np.nan)
+            sequences = np.ones(self.N, dtype=bool)
+            identities = np.full(self.N, np.nan)
+            counts = np.zeros((0, self.num_symbols))
+            gap_counts = np.zeros(0)
+
+        num_included = sequences.sum()
+        identities = identities[sequences]
+
+        # distinct sequences after mapping to alphabet
+        num_unique = len(unique_rows(
+            mapping.astype(np.uint8)[matrix[sequences]]
+        ).index)
+
+        return AlignmentProfile(
+            sequences, coverage, identities / self.L,
+            counts / num_included, gap_counts / num_included,
+            num_unique
         )
 
-    def write(self, fileobj, format="fasta", width=80):
+    def write_cache(self, alignment_file, focus_columns=None,
+                    num_cluster_members=None):
+        """
+        Store binary cache of alignment next to the alignment
+        file it was written to, so that Alignment.from_file
+        can load it without parsing the file again. The cache
+        consists of the symbol code matrix (alignment file name
+        plus ALIGNMENT_CODES_SUFFIX, memory-mappable .npy file),
+        and identifiers, symbol table, focus columns and sequence
+        weights (ALIGNMENT_CACHE_SUFFIX, .npz file).
+
+        .. note::
+
+            The alignment file must be written completely
+            before calling this method, since the cache is
+            only valid for the current content of the file.
+
+        Parameters
+        ----------
+        alignment_file : str
+            Path of FASTA file this alignment was written to
+        focus_columns : np.array(bool) or np.array(int), optional
+            Columns used for model inference (e.g. uppercase
+            columns). Weights are valid for the alignment of
+            these columns (all columns if None).
+        num_cluster_members : dict, optional (default: None)
+            Mapping from identity threshold to number of cluster
+            members of each sequence (see set_weights), computed
+            on alignment of focus columns
+        """
+        if self.compact:
+            codes, symbols = self._codes, self._symbols
+        else:
+            codes, symbols = encode_matrix(self._matrix, self.alphabet)
+
+        if focus_columns is None:
+            focus_columns = np.array(-1)
+        else:
+            focus_columns = np.arange(self.L)[focus_columns]
+
+        if num_cluster_members is None:
+            num_cluster_members = {}
+
+        thetas = np.array(list(num_cluster_members), dtype=np.float64)
+        members = np.array(
+            [num_cluster_members[theta] for theta in num_cluster_members],
+            dtype=np.float64
+        ).reshape(len(thetas), self.N)
+
+        fingerprint = _file_fingerprint(alignment_file)
+
+        np.save(alignment_file + ALIGNMENT_CODES_SUFFIX, codes)
+
+        # write metadata last, so cache is only
+        # valid once all files are complete
+        with open(alignment_file + ALIGNMENT_CACHE_SUFFIX, "wb") as f:
+            np.savez(
+                f,
+                version=ALIGNMENT_CACHE_VERSION,
+                size=fingerprint["size"],
+                mtime_ns=fingerprint["mtime_ns"],
+                digest=fingerprint["digest"],
+                ids=np.array(self.ids, dtype=str),
+                symbols=symbols,
+                alphabet=self.alphabet,
+                focus_columns=focus_columns,
+                thetas=thetas,
+                num_cluster_members=members,
+            )
+
+    def write(self, fileobj, format="fasta", width=80, compression=None):
         """
         Write an alignment to a file.
 
@@ -997,14 +3224,39 @@ class Alignment:
             Output format for alignment
         width : int
             Column width for fasta alignment
+        compression : {"gzip", "bz2", "zstd"}, optional (default: None)
+            Compress alignment when writing (see compress).
+            File must be opened in binary mode, or in text
+            mode with an underlying binary buffer.
 
         Raises
         ------
         ValueError
             Upon invalid file format specification
         """
+        if compression is not None:
+            with compress(fileobj, compression) as f:
+                self.write(f, format, width)
+            return
+
+        if self.compact:
+            symbol_bytes = chars_to_bytes(self._symbols)
+            if symbol_bytes is not None:
+                raw = symbol_bytes[self._codes]
+            else:
+                raw = None
+        else:
+            raw = chars_to_bytes(self._matrix)
+
+        # format all sequences at once if alignment is ASCII
+        if raw is not None:
+            write_matrix(
+                self.ids, raw, fileobj, format, width, self._insert_gap
+            )
+            return
+
         seqs = (
-            (id_, "".join(self.matrix[i]))
+            (id_, "".join(self[i]))
             for (i, id_) in enumerate(self.ids)
         )
 
@@ -1051,6 +3303,79 @@ def frequencies(matrix, seq_weights, num_symbols):
     return fi / seq_weights.sum()
 
 
+@jit(nopython=True)
+def _alignment_profile(matrix, mapping, is_gap, num_symbols,
+                       target_seq_index, minimum_sequence_coverage):
+    """
+    Implementation of Alignment.profile (single pass
+    over alignment matrix)
+
+    Parameters
+    ----------
+    matrix : np.array
+        N x L matrix of symbol codes or ASCII bytes
+    mapping : np.array
+        Index of each code in alphabet
+    is_gap : np.array
+        True for each code that is a match gap
+    num_symbols : int
+        Number of symbols in alphabet
+    target_seq_index : int
+        Index of target sequence
+    minimum_sequence_coverage : float
+        Minimum fraction of non-gap characters in sequence
+
+    Returns
+    -------
+    sequences : np.array
+        Sequences passing the coverage filter
+    coverage : np.array
+        Fraction of non-gap characters in each sequence
+    identities : np.array
+        Number of identities to target sequence
+    counts : np.array
+        L x num_symbols matrix of symbol counts
+    gap_counts : np.array
+        Number of match gaps in each column
+    """
+    N, L = matrix.shape
+    sequences = np.zeros(N, dtype=np.bool_)
+    coverage = np.zeros(N)
+    identities = np.zeros(N)
+    counts = np.zeros((L, num_symbols))
+    gap_counts = np.zeros(L)
+
+    target = np.empty(L, dtype=np.int64)
+    for i in range(L):
+        target[i] = mapping[matrix[target_seq_index, i]]
+
+    for s in range(N):
+        num_gaps = 0
+        for i in range(L):
+            if is_gap[matrix[s, i]]:
+                num_gaps += 1
+
+        coverage[s] = 1 - num_gaps / L
+        if coverage[s] < minimum_sequence_coverage:
+            continue
+
+        sequences[s] = True
+
+        num_identities = 0
+        for i in range(L):
+            code = matrix[s, i]
+            symbol = mapping[code]
+            counts[i, symbol] += 1
+            if is_gap[code]:
+                gap_counts[i] += 1
+            if symbol == target[i]:
+                num_identities += 1
+
+        identities[s] = num_identities
+
+    return sequences, coverage, identities, counts, gap_counts
+
+
 @jit(nopython=True)
 def pair_frequencies(matrix, seq_weights, num_symbols, fi):
     """
@@ -1098,22 +3423,566 @@ def pair_frequencies(matrix, seq_weights, num_symbols, fi):
     return fij
 
 
-@jit(nopython=True)
-def identities_to_seq(seq, matrix):
+def pair_frequencies_blas(matrix, seq_weights, num_symbols, fi,
+                          dtype=np.float64,
+                          block_size=PAIR_FREQUENCIES_BLOCK_SIZE,
+                          filename=None):
     """
-    Calculate number of identities to given target sequence
-    for all sequences in the matrix
+    Calculate pairwise frequencies of symbols in alignment
+    as matrix products of a weighted one-hot encoding of the
+    alignment (so that the work is done by BLAS). Only pairs
+    of positions i < j are computed and stored.
+
+    The frequencies are computed independently for each tile
+    (pair of position blocks) of the grid given by block_size,
+    so that only the one-hot encoding of the two position blocks
+    of the current tile needs to be held in memory. If filename
+    is given, the frequencies are written to a memory-mapped
+    file tile by tile rather than kept in memory (out-of-core
+    mode for very long alignments).
 
     Parameters
     ----------
-    seq : np.array
-        Vector of length L containing mapped sequence
-        (using map_matrix function)
     matrix : np.array
         N x L matrix containing N sequences of length L.
-        Matrix must be mapped to range(0, num_symbols)
-        using map_matrix function
-
+        Matrix must be mapped to range(0, num_symbols) using
+        map_matrix function
+    seq_weights : np.array
+        Vector of length N containing weight for each sequence
+    num_symbols : int
+        Number of different symbols contained in alignment
+    fi : np.array
+        Matrix of size L x num_symbols containing relative
+        column frequencies of all characters.
+    dtype : np.dtype, optional (default: np.float64)
+        Floating point type used for computation and storage
+        (e.g. np.float32 to halve memory consumption)
+    block_size : int, optional (default: PAIR_FREQUENCIES_BLOCK_SIZE)
+        Number of positions per block of the tile grid
+    filename : str, optional (default: None)
+        Store frequencies in memory-mapped .npy file at this
+        path (will be overwritten if it exists)
+
+    Returns
+    -------
+    PairFrequencies
+        Pairwise frequencies of all character combinations,
+        indexable like the L x L x num_symbols x num_symbols
+        matrix returned by pair_frequencies
+    """
+    N, L = matrix.shape
+    q = num_symbols
+    weights = np.asarray(seq_weights, dtype=dtype)
+    total_weight = weights.sum()
+
+    shape = (L * (L - 1) // 2, q, q)
+    if filename is None:
+        blocks = np.zeros(shape, dtype=dtype)
+    else:
+        blocks = np.lib.format.open_memmap(
+            filename, mode="w+", dtype=dtype, shape=shape
+        )
+
+    # number of sequences encoded at a time, to keep
+    # size of one-hot matrices bounded for large alignments
+    chunk_size = max(
+        1, PAIR_FREQUENCIES_CHUNK_ELEMENTS // max(1, block_size * q)
+    )
+
+    for start_i, end_i, start_j, end_j in pair_tiles(L, block_size):
+        ii, jj = np.meshgrid(
+            np.arange(start_i, end_i), np.arange(start_j, end_j),
+            indexing="ij"
+        )
+        upper = ii < jj
+
+        counts = np.zeros(
+            (end_i - start_i, q, end_j - start_j, q), dtype=dtype
+        )
+
+        for start_s in range(0, N, chunk_size):
+            seqs = matrix[start_s:start_s + chunk_size]
+            one_hot_i = _one_hot(seqs[:, start_i:end_i], q, dtype)
+            one_hot_j = _one_hot(seqs[:, start_j:end_j], q, dtype)
+
+            counts += np.dot(
+                (one_hot_i * weights[start_s:start_s + len(seqs), np.newaxis]).T,
+                one_hot_j
+            ).reshape(counts.shape)
+
+        # normalize frequencies by the number
+        # of effective sequences
+        blocks[triangle_index(ii[upper], jj[upper], L)] = (
+            counts.transpose((0, 2, 1, 3))[upper] / total_weight
+        )
+
+    if filename is not None:
+        blocks.flush()
+
+    return PairFrequencies(blocks, fi, block_size=block_size)
+
+
+def _one_hot(matrix, num_symbols, dtype):
+    """
+    One-hot encoding of mapped sequences
+
+    Parameters
+    ----------
+    matrix : np.array
+        N x L matrix of mapped sequences
+    num_symbols : int
+        Number of different symbols
+    dtype : np.dtype
+        Type of encoding matrix
+
+    Returns
+    -------
+    np.array
+        N x (L * num_symbols) matrix, where column
+        i * num_symbols + a is 1 for sequences with
+        symbol a at position i
+    """
+    N, L = matrix.shape
+    one_hot = np.zeros((N, L, num_symbols), dtype=dtype)
+    one_hot[
+        np.arange(N)[:, np.newaxis], np.arange(L)[np.newaxis, :], matrix
+    ] = 1
+
+    return one_hot.reshape((N, L * num_symbols))
+
+
+def pair_tiles(L, block_size):
+    """
+    Grid of tiles (pairs of position blocks) covering
+    all position pairs i <= j
+
+    Parameters
+    ----------
+    L : int
+        Number of positions
+    block_size : int
+        Number of positions per block
+
+    Returns
+    -------
+    list of tuple(int, int, int, int)
+        Start and end (exclusive) of first and second
+        position block of each tile, with
+        start_i <= start_j
+    """
+    blocks = [
+        (start, min(start + block_size, L))
+        for start in range(0, L, block_size)
+    ]
+
+    return [
+        (start_i, end_i, start_j, end_j)
+        for k, (start_i, end_i) in enumerate(blocks)
+        for (start_j, end_j) in blocks[k:]
+    ]
+
+
+def triangle_index(i, j, L):
+    """
+    Index of position pair (i, j) with i < j in
+    row-major storage of the upper triangle of
+    an L x L matrix (excluding the diagonal)
+
+    Parameters
+    ----------
+    i : int or np.array
+        First position(s)
+    j : int or np.array
+        Second position(s), must be larger than i
+    L : int
+        Number of positions
+
+    Returns
+    -------
+    int or np.array
+        Index of pair(s) in triangular storage
+    """
+    return i * (2 * L - i - 1) // 2 + (j - i - 1)
+
+
+class PairFrequencies:
+    """
+    Pairwise frequencies of symbols in an alignment, stored
+    only for pairs of positions i < j. The frequencies of a pair
+    (j, i) are the transpose of those of (i, j), and for identical
+    positions (i, i) are given by the single-site frequencies
+    on the diagonal.
+
+    Objects of this class can be indexed like the dense
+    L x L x num_symbols x num_symbols matrix returned by
+    pair_frequencies (only the requested part of the dense
+    matrix is created), and np.asarray() returns the full
+    dense matrix.
+
+    The stored frequencies may be transformed linearly on
+    access (scale * f_ij + offset, e.g. to add a pseudo-count)
+    without creating a modified copy of the (possibly
+    memory-mapped) storage.
+    """
+    def __init__(self, blocks, fi, block_size=PAIR_FREQUENCIES_BLOCK_SIZE,
+                 scale=1.0, offset=0.0):
+        """
+        Create new pair frequency object
+
+        Parameters
+        ----------
+        blocks : np.array
+            Matrix of size L * (L - 1) / 2 x num_symbols x num_symbols
+            containing pair frequencies of position pairs i < j
+            (in the order given by triangle_index)
+        fi : np.array
+            Matrix of size L x num_symbols containing
+            single-site frequencies
+        block_size : int, optional (default: PAIR_FREQUENCIES_BLOCK_SIZE)
+            Number of positions per block of the tile grid
+            used to process the frequencies (see pair_tiles)
+        scale : float, optional (default: 1.0)
+            Factor applied to stored frequencies on access
+        offset : float, optional (default: 0.0)
+            Value added to stored frequencies on access
+            (after multiplication with scale)
+        """
+        self.blocks = blocks
+        self.fi = fi
+        self.L, self.num_symbols = fi.shape
+        self.block_size = block_size
+        self.scale = scale
+        self.offset = offset
+
+        if len(blocks) != self.L * (self.L - 1) // 2:
+            raise ValueError(
+                "Number of pair frequency blocks does not match "
+                "length of alignment"
+            )
+
+    @property
+    def shape(self):
+        return self.L, self.L, self.num_symbols, self.num_symbols
+
+    @property
+    def ndim(self):
+        return 4
+
+    @property
+    def dtype(self):
+        return self.blocks.dtype
+
+    def __len__(self):
+        return self.L
+
+    def transform(self, scale, offset, fi):
+        """
+        Linearly transformed pair frequencies, sharing
+        the storage of this object
+
+        Parameters
+        ----------
+        scale : float
+            Factor applied to frequencies
+        offset : float
+            Value added to frequencies after
+            multiplication with scale
+        fi : np.array
+            Single-site frequencies of transformed
+            frequencies (used for pairs (i, i))
+
+        Returns
+        -------
+        PairFrequencies
+            Frequencies scale * f_ij + offset for i != j
+        """
+        return PairFrequencies(
+            self.blocks, fi, block_size=self.block_size,
+            scale=self.scale * scale,
+            offset=self.offset * scale + offset
+        )
+
+    def tiles(self):
+        """
+        Tile grid used to process the frequencies
+
+        Returns
+        -------
+        list of tuple(int, int, int, int)
+            Position ranges of each tile (see pair_tiles)
+        """
+        return pair_tiles(self.L, self.block_size)
+
+    def tile(self, start_i, end_i, start_j, end_j):
+        """
+        Dense pair frequencies of one tile
+
+        Parameters
+        ----------
+        start_i, end_i : int
+            Range of first positions (end exclusive)
+        start_j, end_j : int
+            Range of second positions (end exclusive)
+
+        Returns
+        -------
+        np.array
+            Matrix of size (end_i - start_i) x (end_j - start_j)
+            x num_symbols x num_symbols
+        """
+        return self._dense(
+            np.arange(start_i, end_i), np.arange(start_j, end_j)
+        )
+
+    def _stored(self, index):
+        """
+        Stored frequencies of pairs at given index
+        of triangular storage, with transformation applied
+        """
+        blocks = self.blocks[index]
+        if self.scale != 1.0 or self.offset != 0.0:
+            blocks = blocks * self.scale + self.offset
+
+        return blocks
+
+    def __array__(self, dtype=None, copy=None):
+        dense = self[:, :]
+        if dtype is not None:
+            dense = dense.astype(dtype)
+
+        return dense
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+
+        if len(key) > 4:
+            raise IndexError("too many indices for pair frequencies")
+
+        i, j, A_i, A_j = key + (slice(None),) * (4 - len(key))
+
+        # fast path for single pair of positions
+        if (_is_integer(i) and _is_integer(j) and
+                not _is_array(A_i) and not _is_array(A_j)):
+            return self._pair(
+                self._check_position(i), self._check_position(j)
+            )[A_i, A_j]
+
+        # otherwise create dense matrix for all positions
+        # contained in i and j, and index that matrix
+        pos_i, local_i = self._positions(i)
+        pos_j, local_j = self._positions(j)
+
+        return self._dense(pos_i, pos_j)[local_i, local_j, A_i, A_j]
+
+    def _check_position(self, i):
+        """
+        Check position index and map negative indices
+        """
+        i = int(i)
+        if i < 0:
+            i += self.L
+
+        if not 0 <= i < self.L:
+            raise IndexError(
+                "index {} is out of bounds for pair frequencies "
+                "of length {}".format(i, self.L)
+            )
+
+        return i
+
+    def _positions(self, index):
+        """
+        Positions selected by index, and corresponding
+        index into matrix containing only these positions
+        """
+        if isinstance(index, slice):
+            return np.arange(self.L)[index], slice(None)
+
+        if _is_integer(index):
+            return np.array([self._check_position(index)]), 0
+
+        index = np.asarray(index)
+        if index.dtype == bool:
+            index = np.nonzero(index)[0]
+
+        index = np.where(index < 0, index + self.L, index)
+        if index.size > 0 and (index.min() < 0 or index.max() >= self.L):
+            raise IndexError(
+                "index out of bounds for pair frequencies "
+                "of length {}".format(self.L)
+            )
+
+        positions, local = np.unique(index, return_inverse=True)
+        return positions, local.reshape(index.shape)
+
+    def _pair(self, i, j):
+        """
+        num_symbols x num_symbols frequency matrix
+        of a single pair of positions
+        """
+        if i < j:
+            return self._stored(triangle_index(i, j, self.L))
+        elif i > j:
+            return self._stored(triangle_index(j, i, self.L)).T
+        else:
+            return np.diag(self.fi[i]).astype(self.dtype)
+
+    def _dense(self, pos_i, pos_j):
+        """
+        Dense pair frequency matrix for all combinations
+        of positions in pos_i and pos_j
+        """
+        q = self.num_symbols
+        ii, jj = np.meshgrid(pos_i, pos_j, indexing="ij")
+        dense = np.zeros((len(pos_i), len(pos_j), q, q), dtype=self.dtype)
+
+        upper = ii < jj
+        dense[upper] = self._stored(
+            triangle_index(ii[upper], jj[upper], self.L)
+        )
+
+        lower = ii > jj
+        dense[lower] = self._stored(
+            triangle_index(jj[lower], ii[lower], self.L)
+        ).transpose((0, 2, 1))
+
+        diag = ii == jj
+        diag_blocks = np.zeros((diag.sum(), q, q), dtype=self.dtype)
+        diag_blocks[:, np.arange(q), np.arange(q)] = self.fi[ii[diag]]
+        dense[diag] = diag_blocks
+
+        return dense
+
+
+def _is_integer(index):
+    """
+    Check if index is a single integer
+    """
+    return isinstance(index, (int, np.integer))
+
+
+def _is_array(index):
+    """
+    Check if index is an array-like (advanced) index
+    """
+    return not isinstance(index, (int, np.integer, slice))
+
+
+def _index_to_slice(index, n):
+    """
+    Express a selection of elements along one axis
+    as a slice if possible, so that the selection
+    can be made without copying
+
+    Parameters
+    ----------
+    index : np.array(bool) or np.array(int) or slice
+        Vector containing True for each selected element,
+        or indices of selected elements. If None,
+        all elements are selected.
+    n : int
+        Length of axis
+
+    Returns
+    -------
+    slice or np.array(int)
+        Slice equivalent to index, or vector
+        of indices if not expressible as slice
+
+    Raises
+    ------
+    IndexError
+        If a boolean index does not match length of axis
+    """
+    if index is None:
+        return slice(None)
+
+    if isinstance(index, slice):
+        return index
+
+    index = np.asarray(index)
+    if index.dtype == bool:
+        if len(index) != n:
+            raise IndexError(
+                "Boolean index of length {} does not match "
+                "axis of length {}".format(len(index), n)
+            )
+        index = np.flatnonzero(index)
+
+    if len(index) == 0:
+        return slice(0, 0)
+
+    # only forward selections with constant step become slices
+    if index[0] >= 0:
+        steps = np.diff(index)
+        if len(steps) == 0:
+            return slice(index[0], index[0] + 1)
+        elif steps[0] > 0 and (steps == steps[0]).all():
+            return slice(index[0], index[-1] + 1, steps[0])
+
+    return index
+
+
+def _is_identity(index, n):
+    """
+    Check if selection of elements along one axis
+    (see _index_to_slice) keeps all elements in order
+    """
+    if isinstance(index, slice):
+        return index.indices(n) == (0, n, 1)
+
+    return len(index) == n and np.array_equal(index, np.arange(n))
+
+
+def _select_matrix(matrix, rows, columns):
+    """
+    Select subset of rows and columns from a matrix
+    in a single indexing operation (this will return a
+    read-only view of the matrix if rows and columns
+    are both slices, and a new matrix otherwise)
+
+    Parameters
+    ----------
+    matrix : np.array
+        Matrix to select from
+    rows : slice or np.array(int)
+        Rows to select (see _index_to_slice)
+    columns : slice or np.array(int)
+        Columns to select (see _index_to_slice)
+
+    Returns
+    -------
+    np.array
+        Selected submatrix
+    """
+    if isinstance(rows, slice) and isinstance(columns, slice):
+        sel = matrix[rows, columns]
+        sel.flags.writeable = False
+    elif isinstance(rows, slice) or isinstance(columns, slice):
+        sel = matrix[rows, columns]
+    else:
+        sel = matrix[np.ix_(rows, columns)]
+
+    return sel
+
+
+@jit(nopython=True)
+def identities_to_seq(seq, matrix):
+    """
+    Calculate number of identities to given target sequence
+    for all sequences in the matrix
+
+    Parameters
+    ----------
+    seq : np.array
+        Vector of length L containing mapped sequence
+        (using map_matrix function)
+    matrix : np.array
+        N x L matrix containing N sequences of length L.
+        Matrix must be mapped to range(0, num_symbols)
+        using map_matrix function
+
     Returns
     -------
     np.array
@@ -1134,8 +4003,51 @@ def identities_to_seq(seq, matrix):
     return identities
 
 
-@jit(nopython=True)
-def num_cluster_members(matrix, identity_threshold):
+@jit(nopython=True, parallel=True)
+def identities_to_seqs(seqs, matrix, gap=-1):
+    """
+    Calculate number of identities to multiple target
+    sequences for all sequences in the matrix
+
+    Parameters
+    ----------
+    seqs : np.array
+        K x L matrix containing K mapped sequences
+        (using map_matrix function)
+    matrix : np.array
+        N x L matrix containing N sequences of length L.
+        Matrix must be mapped to range(0, num_symbols)
+        using map_matrix function
+    gap : int, optional (default: -1)
+        Mapped gap symbol. Positions where a target
+        sequence contains this symbol are not counted as
+        identities (use -1 to count all positions)
+
+    Returns
+    -------
+    np.array
+        N x K matrix containing number of identities of
+        each sequence in matrix to each target sequence
+    """
+    N, L = matrix.shape
+    K = seqs.shape[0]
+    identities = np.zeros((N, K))
+
+    for i in prange(N):
+        for k in range(K):
+            id_ik = 0
+            for j in range(L):
+                if matrix[i, j] == seqs[k, j] and seqs[k, j] != gap:
+                    id_ik += 1
+
+            identities[i, k] = id_ik
+
+    return identities
+
+
+def num_cluster_members(matrix, identity_threshold, num_threads=None,
+                        block_size=NUM_CLUSTER_MEMBERS_BLOCK_SIZE,
+                        multiplicity=None):
     """
     Calculate number of sequences in alignment
     within given identity_threshold of each other
@@ -1149,6 +4061,18 @@ def num_cluster_members(matrix, identity_threshold):
     identity_threshold : float
         Sequences with at least this pairwise identity will be
         grouped in the same cluster.
+    num_threads : int, optional (default: None)
+        Number of threads used for the calculation. If None,
+        all threads available to numba will be used; if 1,
+        a single-threaded implementation is used.
+    block_size : int, optional (default: NUM_CLUSTER_MEMBERS_BLOCK_SIZE)
+        Number of sequences per block of sequence pairs
+        processed together by the multithreaded implementation
+    multiplicity : np.array, optional (default: None)
+        Number of identical copies of each sequence (e.g. if
+        matrix only contains unique sequences, see unique_rows).
+        Each copy counts as a separate cluster member. If None,
+        each sequence occurs once.
 
     Returns
     -------
@@ -1158,21 +4082,1083 @@ def num_cluster_members(matrix, identity_threshold):
         weight)
     """
     N, L = matrix.shape
-    L = 1.0 * L
+    max_mismatches = _max_mismatches(L, identity_threshold)
 
-    # minimal cluster size is 1 (self)
-    num_neighbors = np.ones((N))
+    # if not even identical sequences reach the threshold,
+    # every sequence is in its own cluster
+    if max_mismatches < 0:
+        return np.ones((N))
 
-    # compare all pairs of sequences
-    for i in range(N - 1):
-        for j in range(i + 1, N):
-            pair_id = 0
-            for k in range(L):
-                if matrix[i, k] == matrix[j, k]:
-                    pair_id += 1
+    multiplicity = _multiplicity(N, multiplicity)
 
-            if pair_id / L >= identity_threshold:
-                num_neighbors[i] += 1
-                num_neighbors[j] += 1
+    num_threads = _num_threads(num_threads)
 
-    return num_neighbors
+    if num_threads == 1:
+        return _num_cluster_members_serial(
+            matrix, max_mismatches, multiplicity
+        )
+
+    prev_num_threads = numba.get_num_threads()
+    numba.set_num_threads(num_threads)
+    try:
+        return _num_cluster_members_parallel(
+            matrix, max_mismatches, block_size, multiplicity, num_threads
+        )
+    finally:
+        numba.set_num_threads(prev_num_threads)
+
+
+def _num_threads(num_threads):
+    """
+    Number of threads to use for numba kernels
+
+    Parameters
+    ----------
+    num_threads : int or None
+        Requested number of threads (if None,
+        use all threads available to numba)
+
+    Returns
+    -------
+    int
+        Number of threads, limited to the number
+        of threads available to numba
+    """
+    if num_threads is None:
+        num_threads = numba.config.NUMBA_NUM_THREADS
+
+    return max(1, min(num_threads, numba.config.NUMBA_NUM_THREADS))
+
+
+def _multiplicity(N, multiplicity):
+    """
+    Default multiplicity of sequences for cluster
+    member calculation (one copy each)
+
+    Parameters
+    ----------
+    N : int
+        Number of sequences
+    multiplicity : np.array or None
+        Number of copies of each sequence
+
+    Returns
+    -------
+    np.array
+        Number of copies of each sequence as float vector
+    """
+    if multiplicity is None:
+        return np.ones((N))
+
+    return np.asarray(multiplicity, dtype=np.float64)
+
+
+def _max_mismatches(L, identity_threshold):
+    """
+    Maximum number of mismatching positions for two sequences
+    of length L to be considered within identity_threshold
+    of each other (i.e. num_identities / L >= identity_threshold)
+
+    Parameters
+    ----------
+    L : int
+        Length of sequences
+    identity_threshold : float
+        Sequence identity threshold
+
+    Returns
+    -------
+    int
+        Maximum number of mismatches (-1 if no pair of
+        sequences can reach the threshold)
+    """
+    # determine exactly like the division in the original
+    # criterion to avoid rounding differences at the threshold
+    L = int(L)
+    if L == 0:
+        return -1
+
+    min_identities = 0
+    while min_identities <= L and min_identities / (1.0 * L) < identity_threshold:
+        min_identities += 1
+
+    return L - min_identities
+
+
+@jit(nopython=True)
+def _count_mismatches(matrix, i, j, max_mismatches):
+    """
+    Count mismatching positions between two sequences,
+    stopping early once max_mismatches is exceeded
+
+    Parameters
+    ----------
+    matrix : np.array
+        N x L matrix containing N mapped sequences of length L.
+    i : int
+        Index of first sequence
+    j : int
+        Index of second sequence
+    max_mismatches : int
+        Stop counting after this number of mismatches
+        has been exceeded
+
+    Returns
+    -------
+    int
+        Number of mismatches (only exact up to
+        max_mismatches + 1)
+    """
+    L = matrix.shape[1]
+    num_chunks = L // MISMATCH_CHUNK_SIZE
+    mismatches = 0
+
+    # compare in fixed-size chunks (allows the compiler to
+    # vectorize the inner loop) and only check for early exit
+    # in between chunks
+    for chunk in range(num_chunks):
+        start = chunk * MISMATCH_CHUNK_SIZE
+        chunk_mismatches = 0
+        for k in range(MISMATCH_CHUNK_SIZE):
+            if matrix[i, start + k] != matrix[j, start + k]:
+                chunk_mismatches += 1
+
+        mismatches += chunk_mismatches
+
+        # stop once pair cannot reach threshold anymore
+        if mismatches > max_mismatches:
+            return mismatches
+
+    # remaining positions after last full chunk
+    for k in range(num_chunks * MISMATCH_CHUNK_SIZE, L):
+        if matrix[i, k] != matrix[j, k]:
+            mismatches += 1
+
+    return mismatches
+
+
+@jit(nopython=True)
+def _count_residue_mismatches(matrix, i, j, max_mismatches, gap):
+    """
+    Count positions between two sequences that are not
+    identical residues (i.e. mismatches and positions where
+    both sequences have a gap), stopping early once
+    max_mismatches is exceeded (variant of _count_mismatches
+    used by identity_filter)
+
+    Parameters
+    ----------
+    matrix : np.array
+        N x L matrix containing N mapped sequences of length L.
+    i : int
+        Index of first sequence
+    j : int
+        Index of second sequence
+    max_mismatches : int
+        Stop counting after this number of mismatches
+        has been exceeded
+    gap : int
+        Mapped gap symbol
+
+    Returns
+    -------
+    int
+        Number of mismatches (only exact up to
+        max_mismatches + 1)
+    """
+    L = matrix.shape[1]
+    num_chunks = L // MISMATCH_CHUNK_SIZE
+    mismatches = 0
+
+    for chunk in range(num_chunks):
+        start = chunk * MISMATCH_CHUNK_SIZE
+        chunk_mismatches = 0
+        for k in range(MISMATCH_CHUNK_SIZE):
+            a = matrix[i, start + k]
+            if a != matrix[j, start + k] or a == gap:
+                chunk_mismatches += 1
+
+        mismatches += chunk_mismatches
+
+        if mismatches > max_mismatches:
+            return mismatches
+
+    for k in range(num_chunks * MISMATCH_CHUNK_SIZE, L):
+        a = matrix[i, k]
+        if a != matrix[j, k] or a == gap:
+            mismatches += 1
+
+    return mismatches
+
+
+@jit(nopython=True)
+def _num_cluster_members_serial(matrix, max_mismatches, multiplicity):
+    """
+    Single-threaded implementation of num_cluster_members
+
+    Parameters
+    ----------
+    matrix : np.array
+        N x L matrix containing N mapped sequences of length L.
+    max_mismatches : int
+        Maximum number of mismatches for a pair of sequences
+        to be grouped in the same cluster (see _max_mismatches)
+    multiplicity : np.array
+        Number of identical copies of each sequence
+
+    Returns
+    -------
+    np.array
+        Vector of length N containing number of cluster
+        members for each sequence
+    """
+    N, L = matrix.shape
+
+    # minimal cluster size is number of copies of self
+    num_neighbors = multiplicity.copy()
+
+    # compare all pairs of sequences
+    for i in range(N - 1):
+        for j in range(i + 1, N):
+            mismatches = _count_mismatches(matrix, i, j, max_mismatches)
+            if mismatches <= max_mismatches:
+                num_neighbors[i] += multiplicity[j]
+                num_neighbors[j] += multiplicity[i]
+
+    return num_neighbors
+
+
+@jit(nopython=True, parallel=True)
+def _num_cluster_members_parallel(matrix, max_mismatches, block_size,
+                                  multiplicity, num_chunks):
+    """
+    Multithreaded implementation of num_cluster_members.
+
+    Sequences are split into blocks, and the upper triangle of pairs
+    of blocks (tiles) is distributed round-robin over num_chunks chunks
+    that are processed in parallel. Each pair of sequences is only
+    compared once, and both sequences of a matching pair are counted in
+    a separate buffer for each chunk (so no synchronization between
+    threads is necessary). Buffers are summed up at the end.
+
+    Parameters
+    ----------
+    matrix : np.array
+        N x L matrix containing N mapped sequences of length L.
+    max_mismatches : int
+        Maximum number of mismatches for a pair of sequences
+        to be grouped in the same cluster (see _max_mismatches)
+    block_size : int
+        Number of sequences per block
+    multiplicity : np.array
+        Number of identical copies of each sequence
+    num_chunks : int
+        Number of chunks of tiles processed in parallel
+        (typically the number of threads)
+
+    Returns
+    -------
+    np.array
+        Vector of length N containing number of cluster
+        members for each sequence
+    """
+    N, L = matrix.shape
+    num_blocks = (N + block_size - 1) // block_size
+
+    # enumerate tiles (block_i <= block_j) in row-major order
+    num_tiles = num_blocks * (num_blocks + 1) // 2
+    tile_i = np.empty(num_tiles, dtype=np.int64)
+    tile_j = np.empty(num_tiles, dtype=np.int64)
+    t = 0
+    for block_i in range(num_blocks):
+        for block_j in range(block_i, num_blocks):
+            tile_i[t] = block_i
+            tile_j[t] = block_j
+            t += 1
+
+    # separate counts for each chunk of tiles
+    counts = np.zeros((num_chunks, N))
+
+    for chunk in prange(num_chunks):
+        for t in range(chunk, num_tiles, num_chunks):
+            start_i = tile_i[t] * block_size
+            end_i = min(start_i + block_size, N)
+            start_j = tile_j[t] * block_size
+            end_j = min(start_j + block_size, N)
+
+            for i in range(start_i, end_i):
+                # on diagonal tiles, only compare pairs i < j
+                if tile_i[t] == tile_j[t]:
+                    first_j = i + 1
+                else:
+                    first_j = start_j
+
+                count_i = 0.0
+                for j in range(first_j, end_j):
+                    mismatches = _count_mismatches(
+                        matrix, i, j, max_mismatches
+                    )
+                    if mismatches <= max_mismatches:
+                        count_i += multiplicity[j]
+                        counts[chunk, j] += multiplicity[i]
+
+                counts[chunk, i] += count_i
+
+    # minimal cluster size is number of copies of self
+    num_neighbors = multiplicity.copy()
+    for chunk in range(num_chunks):
+        num_neighbors += counts[chunk]
+
+    return num_neighbors
+
+
+def identity_histogram(matrix, min_identity_threshold, num_threads=None,
+                       block_size=NUM_CLUSTER_MEMBERS_BLOCK_SIZE,
+                       multiplicity=None):
+    """
+    Count, for each sequence in alignment, the number of other
+    sequences with a given number of mismatches, for all numbers
+    of mismatches that are within min_identity_threshold.
+
+    From this histogram, the number of cluster members (and thus
+    sequence weights) for any identity threshold larger or equal
+    to min_identity_threshold can be obtained without comparing
+    sequences again (see num_cluster_members_from_histogram).
+
+    Parameters
+    ----------
+    matrix : np.array
+        N x L matrix containing N sequences of length L.
+        Matrix must be mapped to range(0, num_symbols) using
+        map_matrix function
+    min_identity_threshold : float
+        Lowest sequence identity threshold for which
+        cluster members will be derived from histogram
+    num_threads : int, optional (default: None)
+        Number of threads used for the calculation. If None,
+        all threads available to numba will be used; if 1,
+        a single-threaded implementation is used.
+    block_size : int, optional (default: NUM_CLUSTER_MEMBERS_BLOCK_SIZE)
+        Number of sequences per block of sequence pairs
+        processed together by the multithreaded implementation
+    multiplicity : np.array, optional (default: None)
+        Number of identical copies of each sequence (e.g. if
+        matrix only contains unique sequences, see unique_rows).
+        If None, each sequence occurs once.
+
+    Returns
+    -------
+    np.array
+        Matrix of size N x (max_mismatches + 1), where entry (i, m)
+        is the number of other sequences with exactly m mismatches
+        to sequence i (max_mismatches is the highest number of
+        mismatches within min_identity_threshold)
+    """
+    N, L = matrix.shape
+    max_mismatches = _max_mismatches(L, min_identity_threshold)
+
+    if max_mismatches < 0:
+        return np.zeros((N, 0), dtype=np.int32)
+
+    if multiplicity is None:
+        multiplicity = np.ones(N, dtype=np.int32)
+    else:
+        multiplicity = np.asarray(multiplicity, dtype=np.int32)
+
+    num_threads = _num_threads(num_threads)
+
+    if num_threads == 1:
+        return _identity_histogram_serial(
+            matrix, max_mismatches, multiplicity
+        )
+
+    prev_num_threads = numba.get_num_threads()
+    numba.set_num_threads(num_threads)
+    try:
+        return _identity_histogram_parallel(
+            matrix, max_mismatches, block_size, multiplicity
+        )
+    finally:
+        numba.set_num_threads(prev_num_threads)
+
+
+def num_cluster_members_from_histogram(histogram, L, identity_threshold,
+                                       multiplicity=None):
+    """
+    Calculate number of sequences in alignment within given
+    identity_threshold of each other from identity histogram
+
+    Parameters
+    ----------
+    histogram : np.array
+        Identity histogram as computed by identity_histogram
+    L : int
+        Length of sequences in alignment
+    identity_threshold : float
+        Sequences with at least this pairwise identity will be
+        grouped in the same cluster.
+    multiplicity : np.array, optional (default: None)
+        Number of identical copies of each sequence, as
+        used to compute the histogram
+
+    Returns
+    -------
+    np.array
+        Vector of length N containing number of cluster
+        members for each sequence (identical to result
+        of num_cluster_members)
+
+    Raises
+    ------
+    ValueError
+        If identity_threshold is lower than the minimum
+        identity threshold of the histogram
+    """
+    N = histogram.shape[0]
+    max_mismatches = _max_mismatches(L, identity_threshold)
+
+    if max_mismatches < 0:
+        return np.ones((N))
+
+    if max_mismatches >= histogram.shape[1]:
+        raise ValueError(
+            "Identity threshold {} is lower than minimum threshold "
+            "of identity histogram".format(identity_threshold)
+        )
+
+    return _multiplicity(N, multiplicity) + histogram[
+        :, :max_mismatches + 1
+    ].sum(axis=1)
+
+
+@jit(nopython=True)
+def _identity_histogram_serial(matrix, max_mismatches, multiplicity):
+    """
+    Single-threaded implementation of identity_histogram
+
+    Parameters
+    ----------
+    matrix : np.array
+        N x L matrix containing N mapped sequences of length L.
+    max_mismatches : int
+        Maximum number of mismatches counted in histogram
+    multiplicity : np.array
+        Number of identical copies of each sequence
+
+    Returns
+    -------
+    np.array
+        N x (max_mismatches + 1) identity histogram
+    """
+    N, L = matrix.shape
+    histogram = np.zeros((N, max_mismatches + 1), dtype=np.int32)
+
+    for i in range(N - 1):
+        for j in range(i + 1, N):
+            mismatches = _count_mismatches(matrix, i, j, max_mismatches)
+            if mismatches <= max_mismatches:
+                histogram[i, mismatches] += multiplicity[j]
+                histogram[j, mismatches] += multiplicity[i]
+
+    return histogram
+
+
+@jit(nopython=True, parallel=True)
+def _identity_histogram_parallel(matrix, max_mismatches, block_size,
+                                 multiplicity):
+    """
+    Multithreaded implementation of identity_histogram.
+
+    Sequences are split into blocks, and each thread compares all
+    sequences of one block against all other sequences in the
+    alignment and only updates the histogram rows of its own block.
+    Unlike _num_cluster_members_parallel, this compares every pair
+    of sequences twice, but avoids a separate copy of the (much
+    larger) histogram for each thread.
+
+    Parameters
+    ----------
+    matrix : np.array
+        N x L matrix containing N mapped sequences of length L.
+    max_mismatches : int
+        Maximum number of mismatches counted in histogram
+    block_size : int
+        Number of sequences per block
+    multiplicity : np.array
+        Number of identical copies of each sequence
+
+    Returns
+    -------
+    np.array
+        N x (max_mismatches + 1) identity histogram
+    """
+    N, L = matrix.shape
+    num_blocks = (N + block_size - 1) // block_size
+    histogram = np.zeros((N, max_mismatches + 1), dtype=np.int32)
+
+    for block_i in prange(num_blocks):
+        start_i = block_i * block_size
+        end_i = min(start_i + block_size, N)
+
+        for start_j in range(0, N, block_size):
+            end_j = min(start_j + block_size, N)
+
+            for i in range(start_i, end_i):
+                for j in range(start_j, end_j):
+                    if i == j:
+                        continue
+
+                    mismatches = _count_mismatches(
+                        matrix, i, j, max_mismatches
+                    )
+                    if mismatches <= max_mismatches:
+                        histogram[i, mismatches] += multiplicity[j]
+
+    return histogram
+
+
+def num_cluster_members_lsh(matrix, identity_threshold, recall=0.95,
+                            num_positions=None, random_state=None,
+                            multiplicity=None):
+    """
+    Approximate number of sequences in alignment within given
+    identity_threshold of each other using locality-sensitive
+    hashing (bit sampling for Hamming distance).
+
+    Each hash table groups sequences by their symbols at a random
+    subset of alignment positions, and only pairs of sequences
+    that share a group in at least one table are compared exactly.
+    Since every candidate pair is verified, cluster sizes are
+    never overestimated (i.e. weights are never underestimated).
+
+    Parameters
+    ----------
+    matrix : np.array
+        N x L matrix containing N sequences of length L.
+        Matrix must be mapped to range(0, num_symbols) using
+        map_matrix function
+    identity_threshold : float
+        Sequences with at least this pairwise identity will be
+        grouped in the same cluster.
+    recall : float, optional (default: 0.95)
+        Minimum probability of finding a pair of sequences
+        with exactly identity_threshold identity (pairs with
+        higher identity are found with higher probability).
+        Higher values give more accurate weights at the
+        cost of more hash tables (runtime and memory).
+    num_positions : int, optional (default: None)
+        Number of positions sampled per hash table. If None,
+        choose such that a pair at identity_threshold collides
+        in a single table with probability of about
+        LSH_COLLISION_PROBABILITY.
+    random_state : int, optional (default: None)
+        Seed for random selection of positions
+    multiplicity : np.array, optional (default: None)
+        Number of identical copies of each sequence (e.g. if
+        matrix only contains unique sequences, see unique_rows).
+        Each copy counts as a separate cluster member. If None,
+        each sequence occurs once.
+
+    Returns
+    -------
+    np.array
+        Vector of length N containing approximate number
+        of cluster members for each sequence
+    """
+    if not 0 < recall < 1:
+        raise ValueError(
+            "recall must be in the interval (0, 1)"
+        )
+
+    N, L = matrix.shape
+    max_mismatches = _max_mismatches(L, identity_threshold)
+    multiplicity = _multiplicity(N, multiplicity)
+
+    # trivial cases: all sequences or no sequences
+    # within threshold of each other
+    if max_mismatches >= L:
+        return np.full(N, multiplicity.sum())
+
+    if max_mismatches < 0:
+        return np.ones(N)
+
+    min_identities = L - max_mismatches
+
+    if min_identities == L:
+        # only identical sequences are within threshold,
+        # so a single table over all positions finds all pairs
+        num_positions = L
+    elif num_positions is None:
+        # cannot sample more positions than a pair at the
+        # threshold has in common (short alignments)
+        num_positions = min(min_identities, int(round(
+            np.log(LSH_COLLISION_PROBABILITY) /
+            np.log(min_identities / L)
+        )))
+
+    num_positions = max(1, min(num_positions, L))
+
+    # probability that a pair at the identity threshold collides
+    # in one table (positions are sampled without replacement)
+    p_collision = np.prod(
+        (min_identities - np.arange(num_positions)) /
+        (L - np.arange(num_positions))
+    )
+
+    if p_collision >= 1:
+        num_tables = 1
+    elif p_collision <= 0:
+        # pairs at threshold cannot be found when sampling
+        # more positions than they have identical positions
+        raise ValueError(
+            "num_positions too large for identity_threshold"
+        )
+    else:
+        num_tables = int(np.ceil(
+            np.log(1 - recall) / np.log(1 - p_collision)
+        ))
+
+    rng = np.random.RandomState(random_state)
+    matrix = np.ascontiguousarray(matrix)
+
+    # assign each sequence to a group in each table, based on
+    # symbols at the sampled positions
+    groups = np.empty((num_tables, N), dtype=np.int32)
+    for t in range(num_tables):
+        positions = np.sort(
+            rng.choice(L, num_positions, replace=False)
+        )
+        keys = np.ascontiguousarray(matrix[:, positions])
+        keys = keys.view(
+            np.dtype((np.void, keys.dtype.itemsize * num_positions))
+        ).ravel()
+        _, groups[t] = np.unique(keys, return_inverse=True)
+
+    return _num_cluster_members_candidates(
+        matrix, max_mismatches, groups, multiplicity
+    )
+
+
+@jit(nopython=True)
+def _num_cluster_members_candidates(matrix, max_mismatches, groups,
+                                    multiplicity):
+    """
+    Count cluster members by comparing all pairs of sequences
+    that share a group in at least one hash table
+    (see num_cluster_members_lsh)
+
+    Parameters
+    ----------
+    matrix : np.array
+        N x L matrix containing N mapped sequences of length L.
+    max_mismatches : int
+        Maximum number of mismatches for a pair of sequences
+        to be grouped in the same cluster (see _max_mismatches)
+    groups : np.array
+        T x N matrix with group index of each sequence in
+        each of the T hash tables
+    multiplicity : np.array
+        Number of identical copies of each sequence
+
+    Returns
+    -------
+    np.array
+        Vector of length N containing number of cluster
+        members for each sequence
+    """
+    num_tables, N = groups.shape
+
+    # minimal cluster size is number of copies of self
+    num_neighbors = multiplicity.copy()
+
+    for t in range(num_tables):
+        order = np.argsort(groups[t], kind="mergesort")
+
+        start = 0
+        while start < N:
+            # find end of current group
+            end = start + 1
+            while end < N and groups[t, order[end]] == groups[t, order[start]]:
+                end += 1
+
+            for a in range(start, end - 1):
+                i = order[a]
+                for b in range(a + 1, end):
+                    j = order[b]
+
+                    # only compare each pair in the first
+                    # table where it shares a group
+                    seen = False
+                    for u in range(t):
+                        if groups[u, i] == groups[u, j]:
+                            seen = True
+                            break
+
+                    if seen:
+                        continue
+
+                    mismatches = _count_mismatches(
+                        matrix, i, j, max_mismatches
+                    )
+                    if mismatches <= max_mismatches:
+                        num_neighbors[i] += multiplicity[j]
+                        num_neighbors[j] += multiplicity[i]
+
+            start = end
+
+    return num_neighbors
+
+
+# Estimated error of approximate sequence weights
+WeightsError = namedtuple(
+    "WeightsError",
+    ["sample_size", "mean_relative_error",
+     "max_relative_error", "neff_relative_error"]
+)
+
+
+def estimate_weights_error(matrix, identity_threshold, num_cluster_members,
+                           sample_size=500, random_state=None,
+                           num_threads=None, multiplicity=None):
+    """
+    Estimate error of approximate sequence weights by
+    computing exact weights for a random subsample
+    of sequences
+
+    Parameters
+    ----------
+    matrix : np.array
+        N x L matrix containing N sequences of length L.
+        Matrix must be mapped to range(0, num_symbols) using
+        map_matrix function
+    identity_threshold : float
+        Sequence identity threshold used for clustering
+    num_cluster_members : np.array
+        Approximate number of cluster members for each sequence
+        (e.g. computed by num_cluster_members_lsh)
+    sample_size : int, optional (default: 500)
+        Number of sequences for which exact weights
+        will be computed
+    random_state : int, optional (default: None)
+        Seed for random selection of sequences
+    num_threads : int, optional (default: None)
+        Number of threads used for calculation
+        (if None, use all threads available to numba)
+    multiplicity : np.array, optional (default: None)
+        Number of identical copies of each sequence (e.g. if
+        matrix only contains unique sequences, see unique_rows).
+        Each copy counts as a separate cluster member. If None,
+        each sequence occurs once.
+
+    Returns
+    -------
+    WeightsError
+        namedtuple with the following fields:
+        sample_size (number of sequences compared),
+        mean_relative_error and max_relative_error
+        (relative error of individual sequence weights),
+        neff_relative_error (estimated relative
+        overestimation of the number of effective
+        sequences)
+    """
+    N, L = matrix.shape
+    sample_size = min(sample_size, N)
+    max_mismatches = _max_mismatches(L, identity_threshold)
+    multiplicity = _multiplicity(N, multiplicity)
+
+    rng = np.random.RandomState(random_state)
+    rows = np.sort(rng.choice(N, sample_size, replace=False))
+
+    prev_num_threads = numba.get_num_threads()
+    numba.set_num_threads(_num_threads(num_threads))
+    try:
+        exact = _num_cluster_members_rows(
+            np.ascontiguousarray(matrix), max_mismatches,
+            rows, multiplicity
+        )
+    finally:
+        numba.set_num_threads(prev_num_threads)
+
+    if max_mismatches < 0:
+        exact = np.ones(sample_size)
+
+    approx_weights = 1.0 / np.asarray(num_cluster_members)[rows]
+    exact_weights = 1.0 / exact
+    rel_error = np.abs(approx_weights - exact_weights) / exact_weights
+
+    if sample_size > 0:
+        return WeightsError(
+            sample_size,
+            float(rel_error.mean()),
+            float(rel_error.max()),
+            float(
+                (approx_weights - exact_weights).sum() /
+                exact_weights.sum()
+            )
+        )
+    else:
+        return WeightsError(0, 0.0, 0.0, 0.0)
+
+
+@jit(nopython=True, parallel=True)
+def _num_cluster_members_rows(matrix, max_mismatches, rows, multiplicity):
+    """
+    Exact number of cluster members for a subset
+    of sequences in the alignment
+
+    Parameters
+    ----------
+    matrix : np.array
+        N x L matrix containing N mapped sequences of length L.
+    max_mismatches : int
+        Maximum number of mismatches for a pair of sequences
+        to be grouped in the same cluster (see _max_mismatches)
+    rows : np.array
+        Indices of sequences for which number of cluster
+        members will be computed
+    multiplicity : np.array
+        Number of identical copies of each sequence
+
+    Returns
+    -------
+    np.array
+        Vector with number of cluster members for each
+        sequence in rows
+    """
+    N, L = matrix.shape
+    num_neighbors = np.empty((len(rows)))
+
+    for r in prange(len(rows)):
+        i = rows[r]
+        count = multiplicity[i]
+        for j in range(N):
+            if i == j:
+                continue
+
+            mismatches = _count_mismatches(matrix, i, j, max_mismatches)
+            if mismatches <= max_mismatches:
+                count += multiplicity[j]
+
+        num_neighbors[r] = count
+
+    return num_neighbors
+
+
+def identity_filter(matrix, identity_threshold, gap=-1, num_threads=None,
+                    block_size=NUM_CLUSTER_MEMBERS_BLOCK_SIZE):
+    """
+    Greedy selection of a subset of sequences with
+    maximum pairwise sequence identity (like hhfilter -id).
+
+    The first sequence is always retained, the remaining
+    sequences are considered in order of decreasing number
+    of residues and retained if their identity to all previously
+    retained sequences does not exceed identity_threshold.
+    Identity between two sequences is the number of identical
+    residues relative to the number of residues in the shorter
+    sequence (so that fragments of a sequence are redundant).
+
+    Parameters
+    ----------
+    matrix : np.array
+        N x L matrix containing N sequences of length L.
+        Matrix must be mapped to range(0, num_symbols)
+        using map_matrix function
+    identity_threshold : float
+        Maximum pairwise sequence identity (between 0 and 1)
+    gap : int, optional (default: -1)
+        Mapped gap symbol (use -1 to treat all
+        positions as residues)
+    num_threads : int, optional (default: None)
+        Number of threads (if None, use all
+        threads available to numba)
+    block_size : int, optional (default: NUM_CLUSTER_MEMBERS_BLOCK_SIZE)
+        Number of sequences compared to retained sequences
+        in parallel (only used for multiple threads)
+
+    Returns
+    -------
+    np.array
+        Vector of length N (dtype bool) containing True
+        for each sequence that is retained
+    """
+    N = matrix.shape[0]
+    if N == 0:
+        return np.zeros(0, dtype=bool)
+
+    num_residues = (matrix != gap).sum(axis=1).astype(np.int64)
+    order = np.concatenate([
+        [0], 1 + np.argsort(-num_residues[1:], kind="stable")
+    ]).astype(np.int64)
+
+    num_threads = _num_threads(num_threads)
+
+    if num_threads == 1:
+        return _identity_filter_serial(
+            matrix, order, num_residues, float(identity_threshold), gap
+        )
+
+    prev_num_threads = numba.get_num_threads()
+    numba.set_num_threads(num_threads)
+    try:
+        return _identity_filter_parallel(
+            matrix, order, num_residues, float(identity_threshold),
+            gap, block_size
+        )
+    finally:
+        numba.set_num_threads(prev_num_threads)
+
+
+@jit(nopython=True)
+def _is_redundant(matrix, i, j, num_residues, identity_threshold, gap):
+    """
+    Check if identity of two sequences exceeds threshold
+    (see identity_filter)
+
+    Parameters
+    ----------
+    matrix : np.array
+        N x L matrix containing N mapped sequences of length L.
+    i : int
+        Index of first sequence
+    j : int
+        Index of second sequence
+    num_residues : np.array
+        Number of non-gap positions in each sequence
+    identity_threshold : float
+        Maximum pairwise sequence identity
+    gap : int
+        Mapped gap symbol
+
+    Returns
+    -------
+    bool
+        True if identity exceeds threshold
+    """
+    L = matrix.shape[1]
+    min_residues = min(num_residues[i], num_residues[j])
+    if min_residues == 0:
+        return False
+
+    # pairs with more positions that are not identical
+    # residues than this cannot exceed the threshold
+    max_mismatches = L - int(identity_threshold * min_residues)
+    mismatches = _count_residue_mismatches(
+        matrix, i, j, max_mismatches, gap
+    )
+
+    return L - mismatches > identity_threshold * min_residues
+
+
+@jit(nopython=True)
+def _identity_filter_serial(matrix, order, num_residues,
+                            identity_threshold, gap):
+    """
+    Single-threaded implementation of identity_filter
+
+    Parameters
+    ----------
+    matrix : np.array
+        N x L matrix containing N mapped sequences of length L.
+    order : np.array
+        Order in which sequences are considered
+    num_residues : np.array
+        Number of non-gap positions in each sequence
+    identity_threshold : float
+        Maximum pairwise sequence identity
+    gap : int
+        Mapped gap symbol
+
+    Returns
+    -------
+    np.array
+        Vector of length N containing True for
+        each sequence that is retained
+    """
+    N = matrix.shape[0]
+    keep = np.zeros(N, dtype=np.bool_)
+    retained = np.empty(N, dtype=np.int64)
+    num_retained = 0
+
+    for k in order:
+        redundant = False
+        for r in range(num_retained):
+            if _is_redundant(matrix, k, retained[r], num_residues,
+                             identity_threshold, gap):
+                redundant = True
+                break
+
+        if not redundant:
+            keep[k] = True
+            retained[num_retained] = k
+            num_retained += 1
+
+    return keep
+
+
+@jit(nopython=True, parallel=True)
+def _identity_filter_parallel(matrix, order, num_residues,
+                              identity_threshold, gap, block_size):
+    """
+    Multi-threaded implementation of identity_filter.
+
+    Sequences are considered in blocks; each sequence in a
+    block is compared to sequences retained before the block
+    in parallel, and the remaining sequences are then compared
+    to sequences retained within the block in order. This gives
+    the same result as the greedy single-threaded selection.
+
+    Parameters
+    ----------
+    matrix : np.array
+        N x L matrix containing N mapped sequences of length L.
+    order : np.array
+        Order in which sequences are considered
+    num_residues : np.array
+        Number of non-gap positions in each sequence
+    identity_threshold : float
+        Maximum pairwise sequence identity
+    gap : int
+        Mapped gap symbol
+    block_size : int
+        Number of sequences per block
+
+    Returns
+    -------
+    np.array
+        Vector of length N containing True for
+        each sequence that is retained
+    """
+    N = matrix.shape[0]
+    keep = np.zeros(N, dtype=np.bool_)
+    retained = np.empty(N, dtype=np.int64)
+    num_retained = 0
+
+    for start in range(0, N, block_size):
+        block = order[start:start + block_size]
+        redundant = np.zeros(len(block), dtype=np.bool_)
+        num_retained_before = num_retained
+
+        for b in prange(len(block)):
+            for r in range(num_retained_before):
+                if _is_redundant(matrix, block[b], retained[r], num_residues,
+                                 identity_threshold, gap):
+                    redundant[b] = True
+                    break
+
+        for b in range(len(block)):
+            if redundant[b]:
+                continue
+
+            for r in range(num_retained_before, num_retained):
+                if _is_redundant(matrix, block[b], retained[r], num_residues,
+                                 identity_threshold, gap):
+                    redundant[b] = True
+                    break
+
+            if not redundant[b]:
+                keep[block[b]] = True
+                retained[num_retained] = block[b]
+                num_retained += 1
+
+    return keep
@@ -0,0 +1,443 @@
+"""
+Persistent offset index for random access to sequences
+in large FASTA sequence databases (similar to samtools
+faidx), keyed by sequence identifiers.
+"""
+import os
+import re
+
+import numpy as np
+
+from evcouplings.align.alignment import detect_compression
+
+# suffix of index file stored next to sequence database
+INDEX_SUFFIX = ".idx.npy"
+
+# version of index file format, index files with
+# a different version will be rebuilt
+INDEX_VERSION = 1
+
+# identifier types stored in index for each sequence:
+# first token of header ("id"), UniProt accession
+# ("accession", e.g. P12345) and UniProt entry name
+# ("name", e.g. NQO8_THET8)
+INDEX_FIELDS = ("id", "accession", "name")
+
+# UniRef cluster identifiers, e.g. UniRef100_P12345
+UNIREF_ID_REGEX = re.compile(r"^Uni\w+?_(\w+)$")
+
+# number of index entries collected before they are
+# converted into a compact numpy buffer while building
+# the index (limits number of Python objects in memory)
+INDEX_CHUNK_SIZE = 2 ** 16
+
+
+def header_keys(header):
+    """
+    Extract identifiers under which a sequence will
+    be stored in the index from its FASTA header
+
+    Parameters
+    ----------
+    header : str
+        FASTA header (without leading ">")
+
+    Returns
+    -------
+    list of (str, str)
+        Pairs of (field, identifier), with field
+        from INDEX_FIELDS
+    """
+    split = header.split(maxsplit=1)
+    if len(split) == 0:
+        return []
+
+    token = split[0]
+    keys = [("id", token)]
+
+    # UniProt format, e.g. sp|P12345|NAME_HUMAN
+    parts = token.split("|")
+    if len(parts) >= 3:
+        keys.append(("accession", parts[1]))
+        keys.append(("name", parts[2]))
+
+    # UniRef format, e.g. UniRef100_P12345
+    m = re.match(UNIREF_ID_REGEX, token)
+    if m:
+        keys.append(("accession", m.group(1)))
+
+    return keys
+
+
+def _index_dtype(key_length):
+    """
+    Type of index table entries
+
+    Parameters
+    ----------
+    key_length : int
+        Maximum length of identifiers (in bytes)
+
+    Returns
+    -------
+    list of tuple
+        Structured array type with fields key,
+        field, offset, length
+    """
+    return [
+        ("key", "S{}".format(key_length)),
+        ("field", np.uint8),
+        ("offset", np.int64),
+        ("length", np.int64),
+    ]
+
+
+def _index_table(keys, fields, offsets):
+    """
+    Create (unsorted) index table from list of entries
+
+    Parameters
+    ----------
+    keys : list of bytes
+        Identifiers
+    fields : list of int
+        Index of identifier type in INDEX_FIELDS
+    offsets : list of int
+        Offset of sequence record in database
+
+    Returns
+    -------
+    np.array
+        Index table (see _index_dtype), with length
+        of records not yet set
+    """
+    max_key_length = max([len(k) for k in keys] + [1])
+    table = np.zeros(len(keys), dtype=_index_dtype(max_key_length))
+    table["key"] = keys
+    table["field"] = fields
+    table["offset"] = offsets
+
+    return table
+
+
+class SequenceIndex:
+    """
+    Offset index of a FASTA sequence database for retrieving
+    sequences or headers by identifier with a single seek.
+
+    The index is stored next to the database (database file name
+    plus INDEX_SUFFIX) when first built, and is rebuilt automatically
+    if the size or modification time of the database changes. Index
+    entries are sorted by identifier and memory-mapped, so lookups
+    do not require loading the full index.
+    """
+    def __init__(self, database_file, index_file=None, rebuild=False):
+        """
+        Open index of sequence database, and create
+        index if it does not exist or is outdated.
+
+        Parameters
+        ----------
+        database_file : str
+            Path to FASTA sequence database (uncompressed)
+        index_file : str, optional (default: None)
+            Path of index file. If None, store index
+            next to database file.
+        rebuild : bool, optional (default: False)
+            Rebuild index even if valid index exists
+
+        Raises
+        ------
+        ValueError
+            If sequence database is compressed
+        """
+        self.database_file = database_file
+
+        if index_file is None:
+            self.index_file = database_file + INDEX_SUFFIX
+        else:
+            self.index_file = index_file
+
+        with open(database_file, "rb") as f:
+            if detect_compression(f) is not None:
+                raise ValueError(
+                    "Cannot index compressed sequence database: {}".format(
+                        database_file
+                    )
+                )
+
+        self.table = None
+        if not rebuild:
+            self.table = self._load()
+
+        if self.table is None:
+            self.table = self._build()
+            self._save()
+
+    def _metadata(self):
+        """
+        Properties of database file used to check
+        if index is still valid
+        """
+        stat = os.stat(self.database_file)
+        return np.array(
+            [INDEX_VERSION, stat.st_size, stat.st_mtime_ns],
+            dtype=np.int64
+        )
+
+    def _load(self):
+        """
+        Memory-map index table from index file, if
+        it exists and matches current database file
+
+        Returns
+        -------
+        np.array
+            Index table, or None if no valid index exists
+        """
+        if not os.path.isfile(self.index_file):
+            return None
+
+        with open(self.index_file, "rb") as f:
+            try:
+                metadata = np.load(f)
+                if np.lib.format.read_magic(f) == (1, 0):
+                    read_header = np.lib.format.read_array_header_1_0
+                else:
+                    read_header = np.lib.format.read_array_header_2_0
+
+                shape, _, dtype = read_header(f)
+                offset = f.tell()
+            except ValueError:
+                return None
+
+        if not np.array_equal(metadata, self._metadata()):
+            return None
+
+        if shape[0] == 0:
+            return np.zeros(shape, dtype=dtype)
+
+        return np.memmap(
+            self.index_file, dtype=dtype, mode="r",
+            offset=offset, shape=shape
+        )
+
+    def _build(self):
+        """
+        Create index table by reading through database
+
+        Returns
+        -------
+        np.array
+            Index table (structured array sorted by key,
+            with fields key, field, offset, length)
+        """
+        field_codes = {f: i for i, f in enumerate(INDEX_FIELDS)}
+
+        # entries are collected in chunks of numpy buffers,
+        # only the current chunk is kept as Python lists
+        chunks = []
+        record_chunks = []
+        keys, fields, offsets, record_offsets = [], [], [], []
+
+        offset = 0
+        with open(self.database_file, "rb") as f:
+            for line in f:
+                if line.startswith(b">"):
+                    header = line[1:].rstrip().decode()
+                    for field, key in header_keys(header):
+                        keys.append(key.encode())
+                        fields.append(field_codes[field])
+                        offsets.append(offset)
+
+                    record_offsets.append(offset)
+
+                    if len(keys) >= INDEX_CHUNK_SIZE:
+                        chunks.append(_index_table(keys, fields, offsets))
+                        record_chunks.append(
+                            np.array(record_offsets, dtype=np.int64)
+                        )
+                        keys, fields, offsets, record_offsets = [], [], [], []
+
+                offset += len(line)
+
+        chunks.append(_index_table(keys, fields, offsets))
+        record_chunks.append(
+            np.array(record_offsets + [offset], dtype=np.int64)
+        )
+
+        # merge chunks (using longest key of all chunks)
+        key_length = max(chunk.dtype["key"].itemsize for chunk in chunks)
+        table = np.concatenate([
+            chunk.astype(_index_dtype(key_length)) for chunk in chunks
+        ])
+
+        # each record extends up to start of next record
+        record_offsets = np.concatenate(record_chunks)
+        record_lengths = np.diff(record_offsets)
+        table["length"] = record_lengths[
+            np.searchsorted(record_offsets, table["offset"])
+        ]
+
+        return np.sort(table, order=["key", "offset"], kind="stable")
+
+    def _save(self):
+        """
+        Store index table next to database. If index
+        cannot be written (e.g. read-only file system),
+        index will only be kept in memory.
+        """
+        try:
+            with open(self.index_file, "wb") as f:
+                np.save(f, self._metadata())
+                np.save(f, self.table)
+        except OSError:
+            pass
+
+    def _rows(self, key):
+        """
+        Index table entries for an identifier
+        """
+        keys = self.table["key"]
+        key = key.encode()
+        start = np.searchsorted(keys, key, side="left")
+        end = np.searchsorted(keys, key, side="right")
+
+        return self.table[start:end]
+
+    def _record(self, key):
+        """
+        Offset and length of first record in
+        database with a given identifier
+
+        Raises
+        ------
+        KeyError
+            If identifier is not in index
+        """
+        rows = self._rows(key)
+        if len(rows) == 0:
+            raise KeyError(
+                "Identifier not in sequence database: {}".format(key)
+            )
+
+        first = np.argmin(rows["offset"])
+        return int(rows["offset"][first]), int(rows["length"][first])
+
+    def __contains__(self, key):
+        return len(self._rows(key)) > 0
+
+    def __len__(self):
+        return len(np.unique(self.table["offset"]))
+
+    def fetch(self, key):
+        """
+        Retrieve sequence from database
+
+        Parameters
+        ----------
+        key : str
+            Identifier of sequence (first token of header,
+            UniProt accession or UniProt entry name). If multiple
+            sequences have this identifier, the first sequence in
+            the database is returned.
+
+        Returns
+        -------
+        tuple (str, str)
+            Full header (without ">") and sequence
+
+        Raises
+        ------
+        KeyError
+            If identifier is not in index
+        """
+        offset, length = self._record(key)
+
+        with open(self.database_file, "rb") as f:
+            f.seek(offset)
+            record = f.read(length).decode()
+
+        header, _, seq = record.partition("\n")
+        seq = "".join(
+            line.strip() for line in seq.splitlines()
+            if not line.startswith(";")
+        )
+
+        return header[1:].rstrip(), seq
+
+    def header(self, key):
+        """
+        Retrieve full header of sequence from database
+
+        Parameters
+        ----------
+        key : str
+            Identifier of sequence (see fetch)
+
+        Returns
+        -------
+        str
+            Full header (without ">")
+
+        Raises
+        ------
+        KeyError
+            If identifier is not in index
+        """
+        offset, _ = self._record(key)
+
+        with open(self.database_file, "rb") as f:
+            f.seek(offset)
+            return f.readline().decode()[1:].rstrip()
+
+    def mapping(self, from_field="accession", to_field="name"):
+        """
+        Mapping between identifier types for all sequences
+        in database (e.g. from UniProt accession to entry
+        name), without reading the database itself
+
+        Parameters
+        ----------
+        from_field : str, optional (default: "accession")
+            Identifier type used as key (see INDEX_FIELDS)
+        to_field : str, optional (default: "name")
+            Identifier type used as value (see INDEX_FIELDS)
+
+        Returns
+        -------
+        dict
+            Mapping from identifiers of type from_field
+            to identifier of type to_field of the same
+            sequence (last sequence in database if an
+            identifier occurs multiple times)
+
+        Raises
+        ------
+        ValueError
+            For invalid identifier types
+        """
+        for field in (from_field, to_field):
+            if field not in INDEX_FIELDS:
+                raise ValueError(
+                    "Invalid identifier type: {}, valid options "
+                    "are: {}".format(field, ", ".join(INDEX_FIELDS))
+                )
+
+        source = self.table[
+            self.table["field"] == INDEX_FIELDS.index(from_field)
+        ]
+        target = self.table[
+            self.table["field"] == INDEX_FIELDS.index(to_field)
+        ]
+
+        # join on sequence records, and apply in order of
+        # occurrence in database
+        source = source[np.argsort(source["offset"], kind="stable")]
+        offset_to_target = dict(zip(target["offset"], target["key"]))
+
+        return {
+            key.decode(): offset_to_target[offset].decode()
+            for key, offset in zip(source["key"], source["offset"])
+            if offset in offset_to_target
+        }
@@ -12,9 +12,9 @@ Authors:
 
 """
 import gzip
+import numpy as np
 import pandas as pd
 from evcouplings.align.tools import run_hmmscan, read_hmmer_domtbl
-from evcouplings.utils.helpers import range_overlap
 
 
 def create_family_size_table(full_pfam_file, outfile=None):
@@ -90,35 +90,31 @@ def remove_clan_overlaps(pfam_table):
     # and sign of comparison further below.
     score = "domain_score"
 
-    # group by sequence ID and clan to resolve overlaps
-    grouped = pfam_table.sort_values(
-        by=score, ascending=False
-    ).groupby(
-        by=["query_name", "clan_id"], as_index=False, sort=False
+    # compare all pairs of hits of the same sequence and
+    # clan (hits without clan have missing clan_id and are
+    # dropped by merge, same as groupby)
+    keys = ["query_name", "clan_id"]
+    hits = pfam_table.loc[:, keys + ["ali_from", "ali_to", score]].copy()
+    hits.loc[:, "query_name"] = hits.query_name.astype(str)
+    hits = hits.dropna(subset=["clan_id"])
+    hits.loc[:, "idx"] = hits.index
+
+    pairs = hits.merge(hits, on=keys, suffixes=("1", "2"))
+    pairs = pairs.loc[pairs.idx1 < pairs.idx2]
+
+    # ranges overlap if the later start is not after the
+    # earlier end (end of alignment range is inclusive)
+    overlap = (
+        np.minimum(pairs.ali_to1.astype(int), pairs.ali_to2.astype(int)) >=
+        np.maximum(pairs.ali_from1.astype(int), pairs.ali_from2.astype(int))
     )
+    pairs = pairs.loc[overlap]
 
-    # store index value of all entries to discard
-    remove_hits = []
-
-    for (uniprot_ac, clan_name), grp in grouped:
-        # safety check here that we are not grouping hits that are
-        # not in the same clan (missing value) if pandas ever changed
-        # the behaviour of groupby to not iterate through groups
-        # with missing values. Otherwise, we would have to skip grouop.
-        assert clan_name.startswith("CL")
-
-        # go through all pairwise combinations of hits
-        for idx1, hit1 in grp.iterrows():
-            for idx2, hit2 in grp.iterrows():
-                if idx1 < idx2:
-                    if range_overlap(
-                        (int(hit1["ali_from"]), int(hit1["ali_to"]) + 1),
-                        (int(hit2["ali_from"]), int(hit2["ali_to"]) + 1),
-                    ) > 0:
-                        if float(hit1[score]) >= float(hit2[score]):
-                            remove_hits.append(idx2)
-                        else:
-                            remove_hits.append(idx1)
+    # always remove lower-scoring hit of overlapping pair
+    remove_hits = np.where(
+        pairs[score + "1"].astype(float) >= pairs[score + "2"].astype(float),
+        pairs.idx2, pairs.idx1
+    )
 
     return pfam_table.loc[~pfam_table.index.isin(remove_hits)]
 
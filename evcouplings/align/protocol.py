@@ -19,10 +19,13 @@ import pandas as pd
 from evcouplings.align import tools as at
 from evcouplings.align.alignment import (
     detect_format, parse_header, read_fasta,
-    write_fasta, Alignment
+    write_fasta, read_stockholm_focus, read_stockholm_gs, bytes_to_chars,
+    Alignment, COMPRESSION_SUFFIX
 )
 
+from evcouplings.align.index import SequenceIndex
 from evcouplings.couplings.mapping import Segment
+from evcouplings.utils.calculations import entropies
 
 from evcouplings.utils.config import (
     check_required, InvalidParameterError, MissingParameterError,
@@ -140,7 +143,8 @@ def _make_hmmsearch_raw_fasta(alignment_result, prefix):
 
 
 def fetch_sequence(sequence_id, sequence_file,
-                   sequence_download_url, out_file):
+                   sequence_download_url, out_file,
+                   sequence_database=None):
     """
     Fetch sequence either from database based on identifier, or from
     input sequence file.
@@ -159,6 +163,12 @@ def fetch_sequence(sequence_id, sequence_file,
     out_file : str
         Output file in which sequence will be stored, if
         sequence_file is not existing.
+    sequence_database : str, optional (default: None)
+        Local FASTA sequence database from which to retrieve
+        the sequence by identifier if sequence_file is None
+        (using a persistent offset index, see SequenceIndex).
+        If the sequence is not in the database, it will be
+        downloaded from sequence_download_url.
 
     Returns
     -------
@@ -168,7 +178,15 @@ def fetch_sequence(sequence_id, sequence_file,
     tuple (str, str)
         Identifier of sequence as stored in file, and sequence
     """
-    if sequence_file is None:
+    if sequence_file is None and sequence_database is not None:
+        index = SequenceIndex(sequence_database)
+    else:
+        index = None
+
+    if index is not None and sequence_id in index:
+        with open(out_file, "w") as f:
+            write_fasta([index.fetch(sequence_id)], f)
+    elif sequence_file is None:
         get(
             sequence_download_url.format(sequence_id),
             out_file,
@@ -349,6 +367,78 @@ def search_thresholds(use_bitscores, seq_threshold, domain_threshold, seq_len):
     return seq_threshold, domain_threshold
 
 
+# fields in UniProt/UniRef FASTA headers and corresponding
+# descriptions
+HEADER_ANNOTATION_FIELDS = OrderedDict([
+    ("GN", "gene"),
+    ("OS", "organism"),
+    ("PE", "existence_evidence"),
+    ("SV", "sequence_version"),
+    ("n", "num_cluster_members"),
+    ("Tax", "taxon"),
+    ("RepID", "representative_member")
+])
+
+
+def parse_header_annotation(ids, annotations):
+    """
+    Split Uniprot/Uniref sequence annotation lines
+    (header descriptions) into fields.
+
+    Rather than splitting each line separately, all lines are
+    joined and split at field names in a single regular expression
+    pass, and fields are then assigned to sequences with numpy.
+
+    Parameters
+    ----------
+    ids : list of str
+        Sequence identifiers
+    annotations : list of str
+        Annotation line for each sequence (text after identifier,
+        e.g. "Protein n=2 Tax=Escherichia coli RepID=..."), or None
+        if there is no annotation for a sequence
+
+    Returns
+    -------
+    pandas.DataFrame
+        Table containing all annotation (one row per sequence,
+        with columns id, name and the fields in
+        HEADER_ANNOTATION_FIELDS; missing fields are NaN)
+    """
+    fields = list(HEADER_ANNOTATION_FIELDS)
+
+    # mark start of each annotation line like a field, so
+    # the text before the first field becomes the name
+    separator = "\x00"
+    regex = re.compile(r"\s({})=".format("|".join([separator] + fields)))
+
+    annotated = np.array(
+        [i for i, anno in enumerate(annotations) if anno is not None],
+        dtype=int
+    )
+
+    pieces = re.split(regex, "".join(
+        " {}={}".format(separator, anno)
+        for anno in annotations if anno is not None
+    ))
+
+    # pieces alternate between field names and values
+    field_index = {f: i for i, f in enumerate([separator] + fields)}
+    keys = np.array(list(map(field_index.get, pieces[1::2])), dtype=int)
+    values = np.array(pieces[2::2], dtype=object)
+    rows = annotated[np.cumsum(keys == 0) - 1]
+
+    # assign values to sequences (if a field occurs more
+    # than once in a line, the last occurrence is used)
+    table = OrderedDict([("id", list(ids))])
+    for i, field in enumerate(["name"] + fields):
+        column = np.full(len(ids), np.nan, dtype=object)
+        column[rows[keys == i]] = values[keys == i]
+        table[field] = column
+
+    return pd.DataFrame(table)
+
+
 def extract_header_annotation(alignment, from_annotation=True):
     """
     Extract Uniprot/Uniref sequence annotation from Stockholm file
@@ -370,66 +460,51 @@ def extract_header_annotation(alignment, from_annotation=True):
         (one row per sequence in alignment,
         in order of occurrence)
     """
-    columns = [
-        ("GN", "gene"),
-        ("OS", "organism"),
-        ("PE", "existence_evidence"),
-        ("SV", "sequence_version"),
-        ("n", "num_cluster_members"),
-        ("Tax", "taxon"),
-        ("RepID", "representative_member")
-    ]
+    if from_annotation:
+        ids = list(alignment.ids)
+        # query level by level to avoid creating new keys
+        # in DefaultOrderedDict
+        gs = alignment.annotation.get("GS", {})
+        annotations = [
+            gs[id_].get("DE") if id_ in gs else None
+            for id_ in ids
+        ]
+    else:
+        ids = []
+        annotations = []
+        for id_ in alignment.ids:
+            split = id_.split(maxsplit=1)
+            ids.append(split[0] if len(split) == 2 else id_)
+            annotations.append(split[1] if len(split) == 2 else None)
 
-    col_to_descr = OrderedDict(columns)
-    regex = re.compile("\s({})=".format(
-        "|".join(col_to_descr.keys()))
-    )
+    return parse_header_annotation(ids, annotations)
 
-    # collect rows for dataframe in here
-    res = []
 
-    for i, id_ in enumerate(alignment.ids):
-        # annotation line for current sequence
-        seq_id = None
-        anno = None
-
-        # look for annotation either in separate
-        # annotation line or in full sequence ID line
-        if from_annotation:
-            seq_id = id_
-            # query level by level to avoid creating new keys
-            # in DefaultOrderedDict
-            if ("GS" in alignment.annotation and
-                    id_ in alignment.annotation["GS"] and
-                    "DE" in alignment.annotation["GS"][id_]):
-                anno = alignment.annotation["GS"][id_]["DE"]
-        else:
-            split = id_.split(maxsplit=1)
-            if len(split) == 2:
-                seq_id, anno = split
-            else:
-                seq_id = id_
-                anno = None
-
-        # extract info from line if we got one
-        if anno is not None:
-            # do split on known field names o keep things
-            # simpler than a gigantic full regex to match
-            # (some fields are allowed to be missing)
-            pairs = re.split(regex, anno)
-            pairs = ["id", seq_id, "name"] + pairs
-
-            # create feature-value map
-            feat_map = dict(zip(pairs[::2], pairs[1::2]))
-            res.append(feat_map)
-        else:
-            res.append({"id": seq_id})
+def extract_stockholm_annotation(fileobj):
+    """
+    Extract Uniprot/Uniref sequence annotation directly
+    from a Stockholm file (as output by jackhmmer), without
+    reading the alignment itself.
+
+    Parameters
+    ----------
+    fileobj : file-like object
+        Stockholm alignment file (may be compressed,
+        see decompress)
 
-    df = pd.DataFrame(res)
-    return df.loc[:, ["id", "name"] + list(col_to_descr.keys())]
+    Returns
+    -------
+    pandas.DataFrame
+        Table containing all annotation (one row per
+        sequence in alignment, in order of occurrence;
+        same as extract_header_annotation)
+    """
+    ids, annotations = read_stockholm_gs(fileobj, feature="DE")
+    return parse_header_annotation(ids, annotations)
 
 
-def describe_seq_identities(alignment, target_seq_index=0):
+def describe_seq_identities(alignment, target_seq_index=0,
+                            ignore_gaps=False, profile=None):
     """
     Calculate sequence identities of any sequence
     to target sequence and create result dataframe.
@@ -439,6 +514,15 @@ def describe_seq_identities(alignment, target_seq_index=0):
     alignment : Alignment
         Alignment for which description statistics
         will be calculated
+    target_seq_index : int, optional (default: 0)
+        Index of target sequence in alignment
+    ignore_gaps : bool, optional (default: False)
+        Do not count gap positions of the target
+        sequence as identities
+    profile : AlignmentProfile, optional (default: None)
+        Use identities from precomputed alignment profile
+        (see Alignment.profile) instead of calculating them
+        (only if ignore_gaps is False)
 
     Returns
     -------
@@ -447,16 +531,20 @@ def describe_seq_identities(alignment, target_seq_index=0):
         for each sequence in alignment (in order of
         occurrence)
     """
-    id_to_query = alignment.identities_to(
-        alignment[target_seq_index]
-    )
+    if profile is not None and not ignore_gaps:
+        id_to_query = profile.identities
+    else:
+        id_to_query = alignment.identities_to_many(
+            [alignment[target_seq_index]], ignore_gaps=ignore_gaps
+        )[:, 0]
 
     return pd.DataFrame(
         {"id": alignment.ids, "identity_to_query": id_to_query}
     )
 
 
-def describe_frequencies(alignment, first_index, target_seq_index=None):
+def describe_frequencies(alignment, first_index, target_seq_index=None,
+                         profile=None):
     """
     Get parameters of alignment such as gaps, coverage,
     conservation and summarize.
@@ -471,6 +559,9 @@ def describe_frequencies(alignment, first_index, target_seq_index=None):
     target_seq_index : int, optional (default: None)
         If given, will add the symbol in the target sequence
         into a separate column of the output table
+    profile : AlignmentProfile, optional (default: None)
+        Use frequencies from precomputed alignment profile
+        (see Alignment.profile) instead of calculating them
 
     Returns
     -------
@@ -478,8 +569,12 @@ def describe_frequencies(alignment, first_index, target_seq_index=None):
         Table detailing conservation and symbol frequencies
         for all positions in the alignment
     """
-    fi = alignment.frequencies
-    conservation = alignment.conservation()
+    if profile is not None:
+        fi = profile.frequencies
+        conservation = entropies(fi, normalize=True)
+    else:
+        fi = alignment.frequencies
+        conservation = alignment.conservation()
 
     fi_cols = {c: fi[:, i] for c, i in alignment.alphabet_map.items()}
     if target_seq_index is not None:
@@ -501,7 +596,8 @@ def describe_frequencies(alignment, first_index, target_seq_index=None):
     return info
 
 
-def describe_coverage(alignment, prefix, first_index, minimum_column_coverage):
+def describe_coverage(alignment, prefix, first_index, minimum_column_coverage,
+                      profile=None):
     """
     Produce "classical" buildali coverage statistics, i.e.
     number of sequences, how many residues have too many gaps, etc.
@@ -525,6 +621,10 @@ def describe_coverage(alignment, prefix, first_index, minimum_column_coverage):
 
             ``int`` values given to this function instead of a float will be divided by 100 to create the corresponding
             floating point representation. This parameter is 1.0 - maximum fraction of gaps per column.
+    profile : AlignmentProfile, optional (default: None)
+        Use frequencies and number of distinct sequences from
+        precomputed alignment profile (see Alignment.profile)
+        instead of calculating them
 
     Returns
     -------
@@ -538,7 +638,17 @@ def describe_coverage(alignment, prefix, first_index, minimum_column_coverage):
         minimum_column_coverage = [minimum_column_coverage]
 
     pos = np.arange(first_index, first_index + alignment.L)
-    f_gap = alignment.frequencies[:, alignment.alphabet_map[alignment._match_gap]]
+    if profile is not None:
+        fi = profile.frequencies
+        num_unique = profile.num_unique
+    else:
+        fi = alignment.frequencies
+        num_unique = len(alignment.unique_sequences().index)
+
+    f_gap = fi[:, alignment.alphabet_map[alignment._match_gap]]
+
+    # ratio of all sequences to distinct sequences
+    dedup_ratio = alignment.N / num_unique if num_unique > 0 else np.nan
 
     for threshold in minimum_column_coverage:
         if isinstance(threshold, int):
@@ -567,7 +677,8 @@ def describe_coverage(alignment, prefix, first_index, minimum_column_coverage):
         res.append(
             (prefix, threshold, alignment.N, alignment.L,
              num_cov, num_lc, perc_cov, first, last,
-             last - first + 1, num_lc_cov, NO_MEFF)
+             last - first + 1, num_lc_cov, NO_MEFF,
+             num_unique, dedup_ratio)
         )
 
     df = pd.DataFrame(
@@ -575,7 +686,7 @@ def describe_coverage(alignment, prefix, first_index, minimum_column_coverage):
             "prefix", "minimum_column_coverage", "num_seqs",
             "seqlen", "num_cov", "num_lc", "perc_cov",
             "1st_uc", "last_uc", "len_cov",
-            "num_lc_cov", "N_eff",
+            "num_lc_cov", "N_eff", "num_unique_seqs", "dedup_ratio",
         ]
     )
     return df
@@ -647,19 +758,6 @@ def existing(**kwargs):
                 )
             )
 
-    with open(input_alignment) as f:
-        ali_raw = Alignment.from_file(f, format)
-
-    # save annotation in sequence headers (species etc.)
-    annotation_file = None
-    if kwargs["extract_annotation"]:
-        annotation_file = prefix + "_annotation.csv"
-        from_anno_line = (format == "stockholm")
-        annotation = extract_header_annotation(
-            ali_raw, from_annotation=from_anno_line
-        )
-        annotation.to_csv(annotation_file, index=False)
-
     # Target sequence of alignment
     sequence_id = kwargs["sequence_id"]
 
@@ -668,33 +766,70 @@ def existing(**kwargs):
             "Parameter sequence_id must be defined"
         )
 
-    # First, find focus sequence in alignment
-    focus_index = None
-    for i, id_ in enumerate(ali_raw.ids):
-        if id_.startswith(sequence_id):
-            focus_index = i
-            break
+    if format == "stockholm":
+        # read focus columns of alignment in one streaming pass,
+        # without loading the full raw alignment (focus sequence
+        # is first sequence with identifier starting with sequence_id)
+        with open(input_alignment) as f:
+            try:
+                focus = read_stockholm_focus(
+                    f, focus_id=sequence_id, prefix=True
+                )
+            except ValueError as e:
+                raise InvalidParameterError(
+                    "Target sequence {} could not be found in alignment"
+                    .format(sequence_id)
+                ) from e
 
-    # if we didn't find it, cannot continue
-    if focus_index is None:
-        raise InvalidParameterError(
-            "Target sequence {} could not be found in alignment"
-            .format(sequence_id)
+        focus_ali = Alignment(bytes_to_chars(focus.matrix), focus.ids)
+        focus_index = focus.focus_index
+    else:
+        with open(input_alignment) as f:
+            ali_raw = Alignment.from_file(f, format)
+
+        # First, find focus sequence in alignment
+        focus_index = None
+        for i, id_ in enumerate(ali_raw.ids):
+            if id_.startswith(sequence_id):
+                focus_index = i
+                break
+
+        # if we didn't find it, cannot continue
+        if focus_index is None:
+            raise InvalidParameterError(
+                "Target sequence {} could not be found in alignment"
+                .format(sequence_id)
+            )
+
+        # identify what columns (non-gap) to keep for focus
+        focus_seq = ali_raw[focus_index]
+        focus_cols = np.array(
+            [c not in [ali_raw._match_gap, ali_raw._insert_gap] for c in focus_seq]
         )
 
-    # identify what columns (non-gap) to keep for focus
-    focus_seq = ali_raw[focus_index]
-    focus_cols = np.array(
-        [c not in [ali_raw._match_gap, ali_raw._insert_gap] for c in focus_seq]
-    )
+        # extract focus alignment
+        focus_ali = ali_raw.select(columns=focus_cols, view=True)
+
+    # save annotation in sequence headers (species etc.); for
+    # Stockholm files, read annotation lines directly from file
+    annotation_file = None
+    if kwargs["extract_annotation"]:
+        annotation_file = prefix + "_annotation.csv"
+        if format == "stockholm":
+            with open(input_alignment) as f:
+                annotation = extract_stockholm_annotation(f)
+        else:
+            annotation = extract_header_annotation(
+                ali_raw, from_annotation=False
+            )
+
+        annotation.to_csv(annotation_file, index=False)
 
-    # extract focus alignment
-    focus_ali = ali_raw.select(columns=focus_cols)
     focus_seq_nogap = "".join(focus_ali[focus_index])
 
     # determine region of sequence. If first_index is given,
     # use that in any case, otherwise try to autodetect
-    full_focus_header = ali_raw.ids[focus_index]
+    full_focus_header = focus_ali.ids[focus_index]
     focus_id = full_focus_header.split()[0]
 
     # try to extract region from sequence header
@@ -808,7 +943,38 @@ def modify_alignment(focus_ali, target_seq_index, target_seq_id, region_start, *
 
     create_prefix_folders(prefix)
 
-    focus_fasta_file = prefix + "_raw_focus.fasta"
+    # compress intermediate alignment files that are only
+    # read by us again (i.e. not if passed to hhfilter)
+    compression = kwargs.get("compression", None)
+    if compression is not None and compression not in COMPRESSION_SUFFIX:
+        raise InvalidParameterError(
+            "Invalid compression format: {}, valid options are: {}".format(
+                compression, ", ".join(COMPRESSION_SUFFIX)
+            )
+        )
+
+    # filter redundant sequences using hhfilter, or in-process
+    # without writing and reading alignment files
+    seqid_filter_method = kwargs.get("seqid_filter_method", None) or "hhfilter"
+    if seqid_filter_method not in ["hhfilter", "native"]:
+        raise InvalidParameterError(
+            "Invalid seqid_filter_method: {}, valid options "
+            "are: hhfilter, native".format(seqid_filter_method)
+        )
+
+    use_hhfilter = (
+        kwargs["seqid_filter"] is not None and
+        seqid_filter_method == "hhfilter"
+    )
+
+    if compression is not None and not use_hhfilter:
+        focus_compression = compression
+        focus_fasta_file = (
+            prefix + "_raw_focus.fasta" + COMPRESSION_SUFFIX[compression]
+        )
+    else:
+        focus_compression = None
+        focus_fasta_file = prefix + "_raw_focus.fasta"
 
     outcfg = {
         "alignment_file": prefix + ".a2m",
@@ -827,13 +993,13 @@ def modify_alignment(focus_ali, target_seq_index, target_seq_id, region_start, *
         indices[0] = target_seq_index
         indices[target_seq_index] = 0
         target_seq_index = 0
-        focus_ali = focus_ali.select(sequences=indices)
+        focus_ali = focus_ali.select(sequences=indices, view=True)
 
     with open(focus_fasta_file, "w") as f:
-        focus_ali.write(f, "fasta")
+        focus_ali.write(f, "fasta", compression=focus_compression)
 
     # apply pairwise identity filter (using hhfilter)
-    if kwargs["seqid_filter"] is not None:
+    if use_hhfilter:
         filtered_file = prefix + "_filtered.a3m"
 
         at.run_hhfilter(
@@ -847,8 +1013,17 @@ def modify_alignment(focus_ali, target_seq_index, target_seq_id, region_start, *
 
         # final FASTA alignment before applying A2M format modifications
         filtered_fasta_file = prefix + "_raw_focus_filtered.fasta"
+        if compression is not None:
+            filtered_fasta_file += COMPRESSION_SUFFIX[compression]
+
         with open(filtered_fasta_file, "w") as f:
-            focus_ali.write(f, "fasta")
+            focus_ali.write(f, "fasta", compression=compression)
+    elif kwargs["seqid_filter"] is not None:
+        # same column definition as for hhfilter above
+        focus_ali = focus_ali.filter_identity(
+            kwargs["seqid_filter"] / 100, columns="first",
+            num_threads=kwargs.get("cpu", None)
+        )
 
     ali = focus_ali
 
@@ -860,8 +1035,15 @@ def modify_alignment(focus_ali, target_seq_index, target_seq_id, region_start, *
         if isinstance(min_cov, int):
             min_cov /= 100
 
-        keep_seqs = (1 - ali.count("-", axis="seq")) >= min_cov
-        ali = ali.select(sequences=keep_seqs)
+    # compute coverage filter, identities, frequencies and
+    # gaps in a single pass over the alignment
+    profile = ali.profile(
+        target_seq_index=target_seq_index,
+        minimum_sequence_coverage=min_cov
+    )
+
+    if min_cov is not None:
+        ali = ali.select(sequences=profile.sequences, view=True)
 
     # Calculate frequencies, conservation and identity to query
     # on final alignment (except for lowercase modification)
@@ -869,19 +1051,21 @@ def modify_alignment(focus_ali, target_seq_index, target_seq_id, region_start, *
     # if it is not the first sequence in the file! To be sure that
     # nothing goes wrong, target_seq_index should always be 0.
     describe_seq_identities(
-        ali, target_seq_index=target_seq_index
+        ali, target_seq_index=target_seq_index, profile=profile
     ).to_csv(
         outcfg["identities_file"], float_format="%.3f", index=False
     )
 
     describe_frequencies(
-        ali, region_start, target_seq_index=target_seq_index
+        ali, region_start, target_seq_index=target_seq_index,
+        profile=profile
     ).to_csv(
         outcfg["frequencies_file"], float_format="%.3f", index=False
     )
 
     coverage_stats = describe_coverage(
-        ali, prefix, region_start, kwargs["minimum_column_coverage"]
+        ali, prefix, region_start, kwargs["minimum_column_coverage"],
+        profile=profile
     )
 
     # keep list of uppercase sequence positions in alignment
@@ -893,7 +1077,7 @@ def modify_alignment(focus_ali, target_seq_index, target_seq_id, region_start, *
         if isinstance(min_col_cov, int):
             min_col_cov /= 100
 
-        lc_cols = ali.count(ali._match_gap, axis="pos") > 1 - min_col_cov
+        lc_cols = profile.gaps > 1 - min_col_cov
         ali = ali.lowercase_columns(lc_cols)
 
         # if we remove columns, we have to update list of positions
@@ -904,6 +1088,8 @@ def modify_alignment(focus_ali, target_seq_index, target_seq_id, region_start, *
     # compute effective number of sequences
     # (this is intended for cases where coupling stage is
     # not run, but this number is wanted nonetheless)
+    n_eff_error = None
+    n_eff_sweep = None
     if kwargs["compute_num_effective_seqs"]:
         # make sure we only compute N_eff on the columns
         # that would be used for model inference, dispose
@@ -911,16 +1097,51 @@ def modify_alignment(focus_ali, target_seq_index, target_seq_id, region_start, *
         if lc_cols is None:
             cut_ali = ali
         else:
-            cut_ali = ali.select(columns=~lc_cols)
+            cut_ali = ali.select(columns=~lc_cols, view=True)
+
+        weighting_method = kwargs.get("weighting_method", None) or "exact"
+
+        # additional identity thresholds for which N_eff will be
+        # reported; compare sequences only once for all thresholds
+        theta_sweep = kwargs.get("theta_sweep", None) or []
+        if theta_sweep and weighting_method == "exact":
+            cut_ali.compute_identity_histogram(
+                min(list(theta_sweep) + [kwargs["theta"]]),
+                num_threads=kwargs.get("cpu", None)
+            )
 
         # compute sequence weights
-        cut_ali.set_weights(kwargs["theta"])
+        # (use as many threads as alignment search, if given)
+        cut_ali.set_weights(
+            kwargs["theta"], num_threads=kwargs.get("cpu", None),
+            method=weighting_method,
+            recall=kwargs.get("weighting_recall", None) or 0.95
+        )
 
         # N_eff := sum of all sequence weights
         n_eff = float(cut_ali.weights.sum())
 
+        # estimated relative error of approximate weights
+        if cut_ali.weights_error is not None:
+            n_eff_error = cut_ali.weights_error.neff_relative_error
+
         # patch into coverage statistics (N_eff column)
         coverage_stats.loc[:, "N_eff"] = n_eff
+
+        # N_eff for other thresholds (one column per threshold)
+        if theta_sweep:
+            n_eff_sweep = {
+                float(theta): float(n)
+                for theta, n in zip(
+                    theta_sweep,
+                    cut_ali.num_effective_sequences(
+                        theta_sweep, num_threads=kwargs.get("cpu", None)
+                    )
+                )
+            }
+
+            for theta, n in n_eff_sweep.items():
+                coverage_stats.loc[:, "N_eff_{}".format(theta)] = n
     else:
         n_eff = None
 
@@ -941,6 +1162,12 @@ def modify_alignment(focus_ali, target_seq_index, target_seq_id, region_start, *
         }
     )
 
+    if n_eff_error is not None:
+        outcfg["effective_sequences_error"] = n_eff_error
+
+    if n_eff_sweep is not None:
+        outcfg["effective_sequences_sweep"] = n_eff_sweep
+
     # create segment in outcfg
     outcfg["segments"] = [
         Segment(
@@ -951,6 +1178,26 @@ def modify_alignment(focus_ali, target_seq_index, target_seq_id, region_start, *
     with open(outcfg["alignment_file"], "w") as f:
         ali.write(f, "fasta")
 
+    # store binary version of alignment next to it, so
+    # downstream stages do not have to parse it again
+    if kwargs.get("alignment_cache", False):
+        if lc_cols is None:
+            focus_cols = None
+        else:
+            focus_cols = ~lc_cols
+
+        # only store exact weights
+        if n_eff is not None and cut_ali.weights_error is None:
+            num_cluster_members = {
+                kwargs["theta"]: cut_ali.num_cluster_members
+            }
+        else:
+            num_cluster_members = None
+
+        ali.write_cache(
+            outcfg["alignment_file"], focus_cols, num_cluster_members
+        )
+
     return outcfg, ali
 
 
@@ -1005,11 +1252,19 @@ def jackhmmer_search(**kwargs):
     full_sequence_file = prefix + "_full.fa"
 
     # make sure search sequence is defined and load it
+    # optionally look up sequence in local sequence database
+    # before trying to download it
+    if kwargs.get("fetch_sequence_from_database", False):
+        sequence_database = kwargs[kwargs["database"]]
+    else:
+        sequence_database = None
+
     full_seq_file, (full_seq_id, full_seq) = fetch_sequence(
         kwargs["sequence_id"],
         kwargs["sequence_file"],
         kwargs["sequence_download_url"],
-        full_sequence_file
+        full_sequence_file,
+        sequence_database
     )
 
     # cut sequence to target region and save in sequence_file
@@ -1186,7 +1441,7 @@ def hmmbuild_and_search(**kwargs):
         )
 
         # extract focus alignment
-        focus_ali = ali_raw.select(columns=focus_cols)
+        focus_ali = ali_raw.select(columns=focus_cols, view=True)
         focus_seq_nogap = "".join(focus_ali[focus_index])
 
         # determine region of sequence. If first_index is given,
@@ -1233,7 +1488,7 @@ def hmmbuild_and_search(**kwargs):
             indices[0] = focus_index
             indices[focus_index] = 0
             focus_index = 0
-            focus_ali = focus_ali.select(sequences=indices)
+            focus_ali = focus_ali.select(sequences=indices, view=True)
 
         # write the raw focus alignment for hmmbuild
         focus_fasta_file = prefix + "_raw_focus_input.fasta"
@@ -1427,28 +1682,26 @@ def standard(**kwargs):
     region_start = segment.region_start
     region_end = segment.region_end
 
-    # read in stockholm format (with full annotation)
+    # read focus columns of alignment from Stockholm file
+    # (with sequence annotation) in one streaming pass,
+    # without loading the full raw alignment
     with open(stockholm_file) as a:
-        ali_raw = Alignment.from_file(a, "stockholm")
+        focus = read_stockholm_focus(
+            a, read_annotation=kwargs["extract_annotation"]
+        )
 
-    # and store as FASTA file first (disabled for now
-    # since equivalent information easily be obtained
-    # from Stockholm file
-    """
-    ali_raw_fasta_file = prefix + "_raw.fasta"
-    with open(ali_raw_fasta_file, "w") as f:
-        ali_raw.write(f, "fasta")
-    """
+    focus_ali = Alignment(bytes_to_chars(focus.matrix), focus.ids)
 
     # save annotation in sequence headers (species etc.)
     if kwargs["extract_annotation"]:
         annotation_file = prefix + "_annotation.csv"
-        annotation = extract_header_annotation(ali_raw)
+        focus_ali.annotation["GS"] = focus.gs
+        annotation = extract_header_annotation(focus_ali)
         annotation.to_csv(annotation_file, index=False)
 
-    # center alignment around focus/search sequence
-    focus_cols = np.array([c != "-" for c in ali_raw[0]])
-    focus_ali = ali_raw.select(columns=focus_cols)
+        # annotation is not used downstream, so do not
+        # carry it through alignment modifications
+        focus_ali.annotation = {}
 
     target_seq_index = 0
     mod_outcfg, ali = modify_alignment(
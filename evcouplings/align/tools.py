@@ -7,10 +7,13 @@ Authors:
   Chan Kang - run_hmmbuild, run_hmmsearch
 """
 
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+import os
+
+import numpy as np
 import pandas as pd
 from evcouplings.utils.system import (
-    run, create_prefix_folders, verify_resources, temp
+    run, create_prefix_folders, verify_resources
 )
 from evcouplings.utils.config import check_required
 
@@ -508,7 +511,170 @@ def run_hmmscan(query, database, prefix,
     return result
 
 
-def _read_hmmer_table(filename, column_names):
+# column types of HMMER tables: names are stored as categoricals,
+# scores and coordinates as numeric columns, free-text descriptions
+# (last column, may contain whitespace) as strings
+_HMMER_NAME = "category"
+_HMMER_TEXT = "object"
+
+HMMER_TBL_COLUMNS = OrderedDict([
+    ("target_name", _HMMER_NAME),
+    ("target_accession", _HMMER_NAME),
+    ("query_name", _HMMER_NAME),
+    ("query_accession", _HMMER_NAME),
+    ("full_Evalue", np.float64),
+    ("full_score", np.float64),
+    ("full_bias", np.float64),
+    ("best_domain_Evalue", np.float64),
+    ("best_domain_score", np.float64),
+    ("best_domain_bias", np.float64),
+    ("domain_exp", np.float64),
+    ("domain_reg", np.int64),
+    ("domain_clu", np.int64),
+    ("domain_ov", np.int64),
+    ("domain_env", np.int64),
+    ("domain_dom", np.int64),
+    ("domain_rep", np.int64),
+    ("domain_inc", np.int64),
+    ("description", _HMMER_TEXT),
+])
+
+HMMER_DOMTBL_COLUMNS = OrderedDict([
+    ("target_name", _HMMER_NAME),
+    ("target_accession", _HMMER_NAME),
+    ("target_len", np.int64),
+    ("query_name", _HMMER_NAME),
+    ("query_accession", _HMMER_NAME),
+    ("query_len", np.int64),
+    ("full_Evalue", np.float64),
+    ("full_score", np.float64),
+    ("full_bias", np.float64),
+    ("hit_number", np.int64),
+    ("total_hit_number", np.int64),
+    ("domain_c_Evalue", np.float64),
+    ("domain_i_Evalue", np.float64),
+    ("domain_score", np.float64),
+    ("domain_bias", np.float64),
+    ("hmm_from", np.int64),
+    ("hmm_to", np.int64),
+    ("ali_from", np.int64),
+    ("ali_to", np.int64),
+    ("env_from", np.int64),
+    ("env_to", np.int64),
+    ("acc", np.float64),
+    ("description", _HMMER_TEXT),
+])
+
+# suffix of binary cache stored next to HMMER table
+HMMER_TABLE_CACHE_SUFFIX = ".cache.pkl"
+
+# version of cache format, caches with a different
+# version will be ignored
+HMMER_TABLE_CACHE_VERSION = 1
+
+
+def _hmmer_table_metadata(filename, columns):
+    """
+    Properties of HMMER table file used to check
+    if binary cache is still valid
+    """
+    stat = os.stat(filename)
+    return {
+        "version": HMMER_TABLE_CACHE_VERSION,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "columns": list(columns),
+    }
+
+
+def _read_hmmer_table_cache(filename, columns):
+    """
+    Load parsed HMMER table from binary cache, if it
+    exists and matches the current table file
+
+    Returns
+    -------
+    pd.DataFrame
+        Parsed table, or None if no valid cache exists
+    """
+    cache_file = filename + HMMER_TABLE_CACHE_SUFFIX
+    if not os.path.isfile(cache_file):
+        return None
+
+    try:
+        cache = pd.read_pickle(cache_file)
+    except Exception:
+        return None
+
+    if (not isinstance(cache, dict) or
+            cache.get("metadata") != _hmmer_table_metadata(filename, columns)):
+        return None
+
+    return cache["table"]
+
+
+def _write_hmmer_table_cache(filename, columns, table):
+    """
+    Store parsed HMMER table next to table file. If cache
+    cannot be written (e.g. read-only file system), table
+    will only be kept in memory.
+    """
+    try:
+        pd.to_pickle(
+            {
+                "metadata": _hmmer_table_metadata(filename, columns),
+                "table": table,
+            },
+            filename + HMMER_TABLE_CACHE_SUFFIX
+        )
+    except OSError:
+        pass
+
+
+def _typed_hmmer_table(columns, values):
+    """
+    Create DataFrame with typed columns from
+    lists of column values (strings)
+    """
+    table = OrderedDict()
+    for (name, dtype), column in zip(columns.items(), values):
+        if dtype == _HMMER_NAME:
+            table[name] = pd.Categorical(column)
+        elif dtype == _HMMER_TEXT:
+            table[name] = np.array(column, dtype=object)
+        else:
+            table[name] = np.array(column, dtype=dtype)
+
+    return pd.DataFrame(table)
+
+
+def _split_hmmer_table(filename, columns):
+    """
+    Parse HMMER table by splitting each line separately
+    (slower fallback for _read_hmmer_table)
+    """
+    num_columns = len(columns)
+
+    with open(filename) as f:
+        rows = [
+            line.rstrip().split(maxsplit=num_columns - 1)
+            for line in f if not line.startswith("#") and line.strip()
+        ]
+
+    # pad incomplete lines (e.g. without description)
+    rows = [
+        r + [None] * (num_columns - len(r)) for r in rows
+    ]
+
+    if len(rows) > 0:
+        values = list(zip(*rows))
+    else:
+        values = [()] * num_columns
+
+    return _typed_hmmer_table(columns, values)
+
+
+def _read_hmmer_table(filename, columns, use_cache=False):
     """
     Parse a HMMER file in (dom)tbl format into
     a pandas DataFrame.
@@ -517,44 +683,85 @@ def _read_hmmer_table(filename, column_names):
     whitespace with pandas because of last column
     that contains whitespace both in header and rows)
 
+    All columns except for the free-text description
+    are parsed by the pandas C tokenizer directly into
+    their respective types, descriptions are extracted
+    in a separate pass over the file.
+
     Parameters
     ----------
     filename : str
         Path of (dom)tbl file
-    column_names : list of str
-        Columns in the respective format
-        (different for tbl and domtbl)
+    columns : OrderedDict
+        Columns in the respective format (different
+        for tbl and domtbl), mapping from column name
+        to type ("category", "object" or numpy dtype)
+    use_cache : bool, optional (default: False)
+        Store parsed table in binary cache next to
+        table file (file name plus HMMER_TABLE_CACHE_SUFFIX),
+        and load table from the cache in subsequent
+        calls if the table file did not change
 
     Returns
     -------
     pd.DataFrame
         DataFrame with parsed (dom)tbl
     """
-    res = []
-    num_splits = len(column_names) - 1
+    if use_cache:
+        table = _read_hmmer_table_cache(filename, columns)
+        if table is not None:
+            return table
+
+    # all columns before the description contain no whitespace
+    num_fixed = len(columns) - 1
+    fixed_columns = list(columns)[:num_fixed]
+    description_column = list(columns)[-1]
 
     with open(filename) as f:
+        descriptions = []
         for line in f:
-            if line.startswith("#"):
+            if line.startswith("#") or not line.strip():
                 continue
 
-            fields = line.rstrip().split(maxsplit=num_splits)
-            res.append(fields)
+            fields = line.split(maxsplit=num_fixed)
+            if len(fields) > num_fixed:
+                descriptions.append(fields[-1].rstrip())
+            else:
+                descriptions.append(None)
+
+    try:
+        # parse names as strings first, conversion to
+        # categoricals is faster outside of parser
+        table = pd.read_csv(
+            filename, sep=r"\s+", header=None, comment="#",
+            names=fixed_columns, usecols=range(num_fixed),
+            dtype={
+                name: (object if dtype == _HMMER_NAME else dtype)
+                for name, dtype in columns.items()
+                if name != description_column
+            }
+        )
+    except ValueError:
+        table = None
+
+    # comment characters inside of lines or truncated
+    # lines cannot be handled by tokenizer
+    if table is None or len(table) != len(descriptions):
+        table = _split_hmmer_table(filename, columns)
+    else:
+        for name in fixed_columns:
+            if columns[name] == _HMMER_NAME:
+                table[name] = pd.Categorical(table[name])
+
+        table[description_column] = np.array(descriptions, dtype=object)
 
-    # at the moment, all fields in dataframe are strings, even
-    # if numeric. To convert to numbers, cheap trick is to store
-    # to csv file and let pandas guess the types, rather than
-    # going through convert_objects (deprecated) or to_numeric
-    # (more effort)
-    tempfile = temp()
-    pd.DataFrame(
-        res, columns=column_names
-    ).to_csv(tempfile, index=False)
+    if use_cache:
+        _write_hmmer_table_cache(filename, columns, table)
 
-    return pd.read_csv(tempfile)
+    return table
 
 
-def read_hmmer_tbl(filename):
+def read_hmmer_tbl(filename, use_cache=False):
     """
     Read a HMMER tbl file into DataFrame.
 
@@ -562,28 +769,20 @@ def read_hmmer_tbl(filename):
     ----------
     filename : str
         Path of tbl file
+    use_cache : bool, optional (default: False)
+        Store/load parsed table in binary cache
+        next to tbl file (see _read_hmmer_table)
 
     Returns
     -------
     pd.DataFrame
-        DataFrame with parsed tbl
+        DataFrame with parsed tbl (column types
+        as defined in HMMER_TBL_COLUMNS)
     """
-    column_names = [
-        "target_name", "target_accession",
-        "query_name", "query_accession",
-        "full_Evalue", "full_score", "full_bias",
-        "best_domain_Evalue", "best_domain_score",
-        "best_domain_bias",
-        "domain_exp", "domain_reg", "domain_clu",
-        "domain_ov", "domain_env", "domain_dom",
-        "domain_rep", "domain_inc",
-        "description"
-    ]
+    return _read_hmmer_table(filename, HMMER_TBL_COLUMNS, use_cache)
 
-    return _read_hmmer_table(filename, column_names)
 
-
-def read_hmmer_domtbl(filename):
+def read_hmmer_domtbl(filename, use_cache=False):
     """
     Read a HMMER domtbl file into DataFrame.
 
@@ -591,26 +790,17 @@ def read_hmmer_domtbl(filename):
     ----------
     filename : str
         Path of domtbl file
+    use_cache : bool, optional (default: False)
+        Store/load parsed table in binary cache
+        next to domtbl file (see _read_hmmer_table)
 
     Returns
     -------
     pd.DataFrame
-        DataFrame with parsed domtbl
+        DataFrame with parsed domtbl (column types
+        as defined in HMMER_DOMTBL_COLUMNS)
     """
-    column_names = [
-        "target_name", "target_accession", "target_len",
-        "query_name", "query_accession", "query_len",
-        "full_Evalue", "full_score", "full_bias",
-        "hit_number", "total_hit_number",
-        "domain_c_Evalue", "domain_i_Evalue",
-        "domain_score", "domain_bias",
-        "hmm_from", "hmm_to",
-        "ali_from", "ali_to",
-        "env_from", "env_to",
-        "acc", "description"
-    ]
-
-    return _read_hmmer_table(filename, column_names)
+    return _read_hmmer_table(filename, HMMER_DOMTBL_COLUMNS, use_cache)
 
 
 def run_hhfilter(input_file, output_file, threshold=95,
@@ -23,13 +23,14 @@ import requests
 import numpy as np
 
 from evcouplings.align.alignment import (
-    Alignment, read_fasta, parse_header
+    Alignment, parse_header
 )
 
 from evcouplings.align.protocol import (
 	jackhmmer_search, hmmbuild_and_search, _make_hmmsearch_raw_fasta
 )
 
+from evcouplings.align.index import SequenceIndex
 from evcouplings.align.tools import read_hmmer_domtbl
 from evcouplings.compare.mapping import alignment_index_mapping, map_indices
 from evcouplings.utils.system import (
@@ -178,10 +179,10 @@ def find_homologs(**kwargs):
             ali.write(f)
 
     # read hmmer hittable and simplify
-    hits = read_hmmer_domtbl(ar["hittable_file"])
+    hits = read_hmmer_domtbl(ar["hittable_file"], use_cache=True)
 
-    hits.loc[:, "uniprot_ac"] = hits.loc[:, "target_name"].map(lambda x: x.split("|")[1])
-    hits.loc[:, "uniprot_id"] = hits.loc[:, "target_name"].map(lambda x: x.split("|")[2])
+    hits.loc[:, "uniprot_ac"] = hits.loc[:, "target_name"].astype(str).map(lambda x: x.split("|")[1])
+    hits.loc[:, "uniprot_id"] = hits.loc[:, "target_name"].astype(str).map(lambda x: x.split("|")[2])
 
     hits = hits.rename(
         columns={
@@ -198,7 +199,7 @@ def find_homologs(**kwargs):
     hits.loc[:, "alignment_end"] = pd.to_numeric(hits.alignment_end).astype(int)
 
     hits.loc[:, "alignment_id"] = (
-        hits.target_name + "/" +
+        hits.target_name.astype(str) + "/" +
         hits.alignment_start.astype(str) + "-" +
         hits.alignment_end.astype(str)
     )
@@ -375,13 +376,11 @@ class SIFTS:
         Add Uniprot ID column to SIFTS table based on
         AC to ID mapping extracted from sequence database
         """
-        # iterate through headers in sequence file and store
-        # AC to ID mapping
-        ac_to_id = {}
-        with open(self.sequence_file) as f:
-            for seq_id, _ in read_fasta(f):
-                _, ac, id_ = seq_id.split(" ")[0].split("|")
-                ac_to_id[ac] = id_
+        # get AC to ID mapping from offset index of sequence
+        # file (headers are only read when creating the index)
+        ac_to_id = SequenceIndex(self.sequence_file).mapping(
+            "accession", "name"
+        )
 
         # add column to dataframe
         self.table.loc[:, "uniprot_id"] = self.table.loc[:, "uniprot_ac"].map(ac_to_id)
@@ -67,8 +67,8 @@ def write_concatenated_alignment(id_pairing, alignment_1, alignment_2,
 
     # load the monomer alignments
     with open(alignment_1) as f1, open(alignment_2) as f2:
-        ali_1 = Alignment.from_file(f1)
-        ali_2 = Alignment.from_file(f2)
+        ali_1 = Alignment.from_file(f1, use_cache=True)
+        ali_2 = Alignment.from_file(f2, use_cache=True)
 
     ali_1 = ali_1.apply(func=_unfilter,columns=np.array(range(ali_1.matrix.shape[1])))
     ali_2 = ali_2.apply(func=_unfilter,columns=np.array(range(ali_2.matrix.shape[1])))
@@ -168,15 +168,9 @@ def filter_best_reciprocal(alignment, paralogs, most_similar_in_species, allowed
     # where entry i,j is percent identity of paralog i to sequence j
     # note the identity here will be different than for the unfiltered alignment
 
-    # initialize the matrix
-    identity_mat = np.zeros((len(paralogs), len(ali.ids)), dtype=float)
-
-    for idx, paralog_id in enumerate(paralogs.id):
-        # calculate the % identity of every seq in the alignment to current paralog
-        identities = ali.identities_to(ali[ali.id_to_index[paralog_id]])
-
-        # save the results
-        identity_mat[idx, :] = identities
+    identity_mat = ali.identities_to_many(
+        [ali[ali.id_to_index[paralog_id]] for paralog_id in paralogs.id]
+    ).T
 
     indices_to_keep = []
     # for every sequence in the alignment that is the most similar to the query
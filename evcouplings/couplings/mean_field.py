@@ -10,8 +10,11 @@ Authors:
 import numpy as np
 import numba
 
-from evcouplings.align import parse_header
+from evcouplings.align import parse_header, PairFrequencies
 from evcouplings.couplings import CouplingsModel
+from evcouplings.couplings.model import (
+    ECS_BLOCK_SIZE, _pair_view, _triangle_blocks
+)
 
 
 @numba.jit(nopython=True)
@@ -105,7 +108,7 @@ class MeanFieldDCA(object):
 
         # extract focus alignment
         focus_ali = self._raw_alignment.select(
-            columns=focus_cols
+            columns=focus_cols, view=True
         )
 
         # extract index list of the target sequence
@@ -124,9 +127,15 @@ class MeanFieldDCA(object):
 
         # remove invalid sequences
         self.alignment = focus_ali.select(
-            sequences=valid_sequences
+            sequences=valid_sequences, view=True
         )
 
+        # compute pair frequencies the same way
+        # as specified for input alignment
+        self.alignment.pair_frequency_engine = alignment.pair_frequency_engine
+        self.alignment.pair_frequency_dtype = alignment.pair_frequency_dtype
+        self.alignment.pair_frequency_file = alignment.pair_frequency_file
+
         # reset pre-calculated sequence weigths
         # and frequencies of the alignment
         self._reset()
@@ -155,10 +164,19 @@ class MeanFieldDCA(object):
         self.covariance_matrix = None
         self.covariance_matrix_inv = None
 
-    def fit(self, theta=0.8, pseudo_count=0.5):
+    def fit(self, theta=0.8, pseudo_count=0.5, num_threads=None,
+            weighting_method="exact", weighting_recall=0.95):
         """
         Run mean field direct couplings analysis.
 
+        .. note::
+
+            To fit models for several values of theta, call
+            self.alignment.compute_identity_histogram(min_theta)
+            first, so that sequences are only compared once
+            for all thetas >= min_theta (only used if
+            weighting_method is "exact").
+
         Parameters
         ----------
         theta : float, optional (default: 0.8)
@@ -168,6 +186,14 @@ class MeanFieldDCA(object):
         pseudo_count : float, optional (default: 0.5)
             Applied to frequency counts to regularize
             in the case of insufficient data availability.
+        num_threads : int, optional (default: None)
+            Number of threads used for sequence weight
+            calculation (if None, use all available threads)
+        weighting_method : {"exact", "lsh"}, optional (default: "exact")
+            Compute sequence weights exactly or approximately
+            (see Alignment.set_weights)
+        weighting_recall : float, optional (default: 0.95)
+            Recall of approximate sequence weighting
 
         Returns
         -------
@@ -179,7 +205,10 @@ class MeanFieldDCA(object):
 
         # compute sequence weights
         # using the given theta
-        self.alignment.set_weights(identity_threshold=theta)
+        self.alignment.set_weights(
+            identity_threshold=theta, num_threads=num_threads,
+            method=weighting_method, recall=weighting_recall
+        )
 
         # compute column frequencies regularized by a pseudo-count
         # (this implicitly calculates the raw frequencies as well)
@@ -262,11 +291,26 @@ class MeanFieldDCA(object):
 
         Returns
         -------
-        np.array
+        np.array or PairFrequencies
             Matrix of size L x L x num_symbols x num_symbols
             containing relative pairwise frequencies of all
-            symbols regularized by a pseudo-count.
+            symbols regularized by a pseudo-count (of the
+            same type as alignment.pair_frequencies).
         """
+        pair_frequencies = self.alignment.pair_frequencies
+
+        # triangular storage: only pairs i < j are stored
+        # (pseudo-count is applied on access rather than copying
+        # the storage), and the frequencies of identical positions
+        # (i, i) follow from regularized single-site frequencies
+        if isinstance(pair_frequencies, PairFrequencies):
+            self.regularized_pair_frequencies = pair_frequencies.transform(
+                1. - pseudo_count,
+                pseudo_count / float(self.alignment.num_symbols ** 2),
+                self.regularize_frequencies(pseudo_count=pseudo_count)
+            )
+            return self.regularized_pair_frequencies
+
         # add a pseudo-count to the frequencies
         self.regularized_pair_frequencies = (
             (1. - pseudo_count) * self.alignment.pair_frequencies +
@@ -300,10 +344,17 @@ class MeanFieldDCA(object):
         np.array
             Reference to attribute self.convariance_matrix
         """
-        self.covariance_matrix = compute_covariance_matrix(
-            self.regularized_frequencies,
-            self.regularized_pair_frequencies
-        )
+        if isinstance(self.regularized_pair_frequencies, PairFrequencies):
+            self.covariance_matrix = compute_covariance_matrix_tiled(
+                self.regularized_frequencies,
+                self.regularized_pair_frequencies
+            )
+        else:
+            self.covariance_matrix = compute_covariance_matrix(
+                self.regularized_frequencies,
+                self.regularized_pair_frequencies
+            )
+
         return self.covariance_matrix
 
     def reshape_invC_to_4d(self):
@@ -447,6 +498,22 @@ class MeanFieldCouplingsModel(CouplingsModel):
 
         self._reset_precomputed()
 
+    @property
+    def f_ij(self):
+        """
+        Pair frequencies (L x L x num_symbols x num_symbols)
+
+        Like alignment.pair_frequencies, blocks (i, i) contain
+        the single-site frequencies f_i[i] on their diagonal
+        (models read from a model file have zeros there, since
+        only blocks of position pairs i < j are stored).
+        """
+        return _pair_view(self._f_ij_blocks, self.L, diagonal=self.f_i)
+
+    @f_ij.setter
+    def f_ij(self, f_ij):
+        CouplingsModel.f_ij.fset(self, f_ij)
+
     def _reset_precomputed(self):
         """
         Delete precomputed values (e.g. mutation matrices)
@@ -457,7 +524,7 @@ class MeanFieldCouplingsModel(CouplingsModel):
         super(MeanFieldCouplingsModel, self)._reset_precomputed()
         self._di_scores = None
 
-    def _calculate_ecs(self):
+    def _calculate_ecs(self, block_size=ECS_BLOCK_SIZE):
         """
         Calculates FN and CN scores as defined in
         Ekeberg et al., Phys Rev E, 2013,
@@ -470,6 +537,12 @@ class MeanFieldCouplingsModel(CouplingsModel):
         additionally calculated and added to the resulting
         data frame.
 
+        Parameters
+        ----------
+        block_size : int, optional (default: ECS_BLOCK_SIZE)
+            Number of position pairs for which FN, CN and MI
+            scores are computed at once (limits memory usage)
+
         Returns
         -------
         pd.DataFrame
@@ -478,21 +551,17 @@ class MeanFieldCouplingsModel(CouplingsModel):
         """
         # calculates FN, CN as well as MI scores
         # and stores in ECs data frame
-        super(MeanFieldCouplingsModel, self)._calculate_ecs()
+        super(MeanFieldCouplingsModel, self)._calculate_ecs(block_size)
 
         # calculate DI scores
-        self._di_scores = direct_information(
-            self.J_ij, self.regularized_f_i
+        self._di_scores = _direct_information(
+            self._J_ij_blocks, self.regularized_f_i
         )
 
-        # add DI scores to EC data frame
-        di = []
-        for i in range(self.L - 1):
-            for j in range(i + 1, self.L):
-                di.append(self._di_scores[i, j])
-
-        self._ecs.sort_values(by=["i", "j"], inplace=True)
-        self._ecs["di"] = di
+        # add DI scores to EC data frame (rows of data
+        # frame are indexed by pairs i < j in row-major order)
+        self._ecs.sort_index(inplace=True)
+        self._ecs["di"] = self._di_scores[np.triu_indices(self.L, k=1)]
 
         return self._ecs.sort_values(
             by="di", ascending=False
@@ -600,17 +669,57 @@ def tilde_fields(J_ij, f_i, f_j):
     return h_tilde_i, h_tilde_j
 
 
-@numba.jit(nopython=True)
 def direct_information(J_ij, f_i):
     """
     Calculate direct information.
 
+    Parameters
+    ----------
+    J_ij : np.array or PairFrequencies
+        Matrix of size L x L x num_symbols x num_symbols
+        containing coupling strengths (e.g. CouplingsModel.J_ij).
+    f_i : np.array
+        Matrix of size L x num_symbols
+        containing column frequencies.
+
+    Returns
+    -------
+    np.array
+        Matrix of size L x L
+        containing direct information.
+
+    Raises
+    ------
+    ValueError
+        If J_ij is not a four-dimensional matrix
+    """
+    if len(J_ij.shape) != 4:
+        raise ValueError(
+            "J_ij must be a matrix of size L x L x num_symbols x "
+            "num_symbols, got shape {}".format(J_ij.shape)
+        )
+
+    # kernel requires couplings and frequencies of same precision
+    blocks = np.asarray(
+        _triangle_blocks(J_ij, f_i.shape[0]), dtype=f_i.dtype
+    )
+
+    return _direct_information(blocks, f_i)
+
+
+@numba.jit(nopython=True)
+def _direct_information(J_ij, f_i):
+    """
+    Calculate direct information from couplings
+    stored as blocks of position pairs i < j.
+
     Parameters
     ----------
     J_ij : np.array
-        Matrix of size num_symbols x num_symbols
-        containing all coupling strengths of
-        position pair (i, j).
+        Matrix of size L * (L - 1) / 2 x num_symbols
+        x num_symbols containing coupling strengths
+        of all position pairs i < j (triangular storage,
+        see evcouplings.couplings.model).
     f_i : np.array
         Matrix of size L x num_symbols
         containing column frequencies.
@@ -624,11 +733,14 @@ def direct_information(J_ij, f_i):
     L, num_symbols = f_i.shape
 
     di = np.zeros((L, L))
+    # pairs i < j are visited in storage order
+    k = 0
     for i in range(L):
         for j in range(i + 1, L):
             # extract couplings relevant to
             # position pair (i, j)
-            J = np.exp(-J_ij[i, j])
+            J = np.exp(-J_ij[k])
+            k += 1
 
             # compute two-site model
             h_tilde_i, h_tilde_j = tilde_fields(J, f_i[i], f_i[j])
@@ -701,6 +813,86 @@ def compute_covariance_matrix(f_i, f_ij):
     return covariance_matrix
 
 
+def compute_covariance_matrix_tiled(f_i, f_ij):
+    """
+    Compute the covariance matrix from pair frequencies in
+    triangular storage, one tile of the tile grid of the
+    pair frequencies at a time (so that out-of-core pair
+    frequencies are read from disk tile by tile).
+
+    Parameters
+    ----------
+    f_i : np.array
+        Matrix of size L x num_symbols
+        containing column frequencies.
+    f_ij : PairFrequencies
+        Pair frequencies (pairs (i, i) must be
+        consistent with f_i)
+
+    Returns
+    -------
+    np.array
+        Matrix of size L x (num_symbols-1) x
+        L x (num_symbols-1) containing
+        covariance values.
+    """
+    L, num_symbols = f_i.shape
+
+    covariance_matrix = np.zeros((
+        L * (num_symbols - 1),
+        L * (num_symbols - 1)
+    ))
+
+    for start_i, end_i, start_j, end_j in f_ij.tiles():
+        _fill_covariance_tile(
+            covariance_matrix, f_i,
+            f_ij.tile(start_i, end_i, start_j, end_j),
+            start_i, start_j
+        )
+
+    return covariance_matrix
+
+
+@numba.jit(nopython=True)
+def _fill_covariance_tile(covariance_matrix, f_i, f_ij_tile, start_i, start_j):
+    """
+    Fill covariance values of one tile of position pairs
+    (and of the symmetric tile) into the covariance matrix.
+
+    Parameters
+    ----------
+    covariance_matrix : np.array
+        Covariance matrix that will be modified in place
+    f_i : np.array
+        Matrix of size L x num_symbols
+        containing column frequencies.
+    f_ij_tile : np.array
+        Matrix of size L_i x L_j x num_symbols x num_symbols
+        containing pair frequencies of the tile
+    start_i : int
+        First position of first block of tile
+    start_j : int
+        First position of second block of tile
+    """
+    L_i, L_j, num_symbols, _ = f_ij_tile.shape
+
+    for k in range(L_i):
+        i = start_i + k
+        for l in range(L_j):
+            j = start_j + l
+            for alpha in range(num_symbols - 1):
+                for beta in range(num_symbols - 1):
+                    c = f_ij_tile[k, l, alpha, beta] - f_i[i, alpha] * f_i[j, beta]
+                    covariance_matrix[
+                        _flatten_index(i, alpha, num_symbols),
+                        _flatten_index(j, beta, num_symbols),
+                    ] = c
+                    covariance_matrix[
+                        _flatten_index(j, beta, num_symbols),
+                        _flatten_index(i, alpha, num_symbols),
+                    ] = c
+
+
 @numba.jit(nopython=True)
 def reshape_invC_to_4d(inv_cov_matrix, L, num_symbols):
     """
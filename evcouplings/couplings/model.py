@@ -7,13 +7,16 @@ Authors:
   Thomas A. Hopf
 """
 
-from collections import Iterable
+from collections import Iterable, namedtuple
 from copy import deepcopy
+import os
 
 from numba import jit
 import numpy as np
 import pandas as pd
 
+from evcouplings.align.alignment import PairFrequencies
+
 # Constants
 
 _SLICE = np.s_[:]
@@ -27,8 +30,63 @@ NUM_COMPONENTS = len(HAMILTONIAN_COMPONENTS)
 # regularized with pseudocounts during mean-field inference)
 LAMBDA_H_FALLBACK = 0.01
 
+# number of position pairs for which EC scores are computed
+# at once (bounds memory use for gauge-transformed couplings
+# and mutual information terms)
+ECS_BLOCK_SIZE = 1000
+
+# parameter blocks of model that can be read selectively from
+# model files (see components parameter of CouplingsModel),
+# and member variables they are stored in
+MODEL_COMPONENTS = ["weights", "f_i", "h_i", "f_ij", "J_ij"]
+_COMPONENT_MEMBERS = {
+    "weights": "weights",
+    "f_i": "f_i",
+    "h_i": "h_i",
+    "f_ij": "_f_ij_blocks",
+    "J_ij": "_J_ij_blocks",
+}
+
+# version of native model file format ("npy", a sequence of
+# arrays in .npy format that can be memory-mapped), and alignment
+# of arrays in file in bytes
+MODEL_NPY_VERSION = 1
+_NPY_ALIGNMENT = 64
+
+# location of a parameter block in model file, used to read
+# the block on first access
+_FileComponent = namedtuple(
+    "_FileComponent", ["filename", "mtime_ns", "offset", "dtype", "shape"]
+)
+
 # Methods for fast calculations (moved outside of class for numba jit)
 
+# Pair parameters (J_ij, f_ij) are stored as blocks of size num_symbols
+# x num_symbols only for pairs of positions i < j, in row-major order of
+# the upper triangle of the L x L position matrix (same order as in plmc
+# model files, see evcouplings.align.alignment.triangle_index). Entries
+# for pairs i > j are given by the transposed block of (j, i).
+
+
+@jit(nopython=True)
+def _pair_index(i, j, L):
+    """
+    Index of block of position pair i < j in triangular storage
+    """
+    return i * (2 * L - i - 1) // 2 + j - i - 1
+
+
+@jit(nopython=True)
+def _coupling(J_ij, L, i, j, A_i, A_j):
+    """
+    Coupling J_ij(A_i, A_j) of any position pair i != j
+    from triangular storage (in double precision)
+    """
+    if i < j:
+        return np.float64(J_ij[_pair_index(i, j, L), A_i, A_j])
+    else:
+        return np.float64(J_ij[_pair_index(j, i, L), A_j, A_i])
+
 
 @jit(nopython=True)
 def _hamiltonians(sequences, J_ij, h_i):
@@ -41,7 +99,8 @@ def _hamiltonians(sequences, J_ij, h_i):
     sequences : np.array
         Sequence matrix for which Hamiltonians will be computed
     J_ij: np.array
-        L x L x num_symbols x num_symbols J_ij pair coupling parameter matrix
+        L * (L - 1) / 2 x num_symbols x num_symbols J_ij pair coupling
+        parameters of position pairs i < j (triangular storage)
     h_i: np.array
         L x num_symbols h_i fields parameter matrix
 
@@ -58,10 +117,13 @@ def _hamiltonians(sequences, J_ij, h_i):
         A = sequences[s]
         hi_sum = 0.0
         Jij_sum = 0.0
+        # pairs i < j are visited in storage order
+        k = 0
         for i in range(L):
             hi_sum += h_i[i, A[i]]
             for j in range(i + 1, L):
-                Jij_sum += J_ij[i, j, A[i], A[j]]
+                Jij_sum += J_ij[k, A[i], A[j]]
+                k += 1
 
         H[s] = [Jij_sum + hi_sum, Jij_sum, hi_sum]
 
@@ -82,7 +144,8 @@ def _single_mutant_hamiltonians(target_seq, J_ij, h_i):
     target_seq : np.array(int)
         Target sequence for which mutant energy differences will be calculated
     J_ij: np.array
-        L x L x num_symbols x num_symbols J_ij pair coupling parameter matrix
+        L * (L - 1) / 2 x num_symbols x num_symbols J_ij pair coupling
+        parameters of position pairs i < j (triangular storage)
     h_i: np.array
         L x num_symbols h_i fields parameter matrix
 
@@ -108,8 +171,8 @@ def _single_mutant_hamiltonians(target_seq, J_ij, h_i):
             for j in range(L):
                 if i != j:
                     delta_Jij += (
-                        J_ij[i, j, A_i, target_seq[j]] -
-                        J_ij[i, j, target_seq[i], target_seq[j]]
+                        _coupling(J_ij, L, i, j, A_i, target_seq[j]) -
+                        _coupling(J_ij, L, i, j, target_seq[i], target_seq[j])
                     )
 
             H[i, A_i] = [delta_Jij + delta_hi, delta_Jij, delta_hi]
@@ -130,7 +193,8 @@ def _delta_hamiltonian(pos, subs, target_seq, J_ij, h_i):
         Target sequence for which mutant energy differences will be calculated
         relative to
     J_ij: np.array
-        L x L x num_symbols x num_symbols J_ij pair coupling parameter matrix
+        L * (L - 1) / 2 x num_symbols x num_symbols J_ij pair coupling
+        parameters of position pairs i < j (triangular storage)
     h_i: np.array
         L x num_symbols h_i fields parameter matrix
 
@@ -158,8 +222,8 @@ def _delta_hamiltonian(pos, subs, target_seq, J_ij, h_i):
         for j in range(L):
             if i != j:
                 delta_Jij += (
-                    J_ij[i, j, A_i, target_seq[j]] -
-                    J_ij[i, j, target_seq[i], target_seq[j]]
+                    _coupling(J_ij, L, i, j, A_i, target_seq[j]) -
+                    _coupling(J_ij, L, i, j, target_seq[i], target_seq[j])
                 )
 
         # correct couplings between substituted positions:
@@ -170,14 +234,14 @@ def _delta_hamiltonian(pos, subs, target_seq, J_ij, h_i):
             j = pos[n]
             A_j = subs[n]
             # remove forward and backward coupling delta
-            delta_Jij -= J_ij[i, j, A_i, target_seq[j]]
-            delta_Jij -= J_ij[i, j, target_seq[i], A_j]
-            delta_Jij += J_ij[i, j, target_seq[i], target_seq[j]]
+            delta_Jij -= _coupling(J_ij, L, i, j, A_i, target_seq[j])
+            delta_Jij -= _coupling(J_ij, L, i, j, target_seq[i], A_j)
+            delta_Jij += _coupling(J_ij, L, i, j, target_seq[i], target_seq[j])
             # the following line cancels out with line further down:
             # delta_Jij += J_ij[i, j, target_seq[i], target_seq[j]]
 
             # now add coupling delta once in correct background
-            delta_Jij += J_ij[i, j, A_i, A_j]
+            delta_Jij += _coupling(J_ij, L, i, j, A_i, A_j)
             # following line cancels out with line above:
             # delta_Jij -= J_ij[i, j, target_seq[i], target_seq[j]]
 
@@ -185,69 +249,360 @@ def _delta_hamiltonian(pos, subs, target_seq, J_ij, h_i):
 
 
 @jit(nopython=True)
+def _zero_sum_gauge_kernel(J_ij, J_ij_0):
+    """
+    Transform couplings into zero-sum gauge
+    (see _zero_sum_gauge)
+
+    Parameters
+    ----------
+    J_ij : np.array
+        Couplings of position pairs i < j (triangular storage)
+    J_ij_0 : np.array
+        Matrix of same size as J_ij that transformed couplings
+        will be written to (can be J_ij itself)
+    """
+    num_pairs, num_symbols, num_symbols2 = J_ij.shape
+    assert num_symbols == num_symbols2
+
+    # go through all pairs of positions
+    for k in range(num_pairs):
+        # averages are always computed in double precision
+        ij_mat = J_ij[k].astype(np.float64)
+
+        # calculate matrix, row and column averages
+        avg_ab = np.mean(ij_mat)
+
+        # can't use axis argument of np.mean in numba,
+        # so have to calculate rows/cols manually
+        avg_a = np.zeros(num_symbols)
+        avg_b = np.zeros(num_symbols)
+        ij_mat_T = ij_mat.T
+
+        for l in range(num_symbols):
+            avg_a[l] = np.mean(ij_mat[l])
+            avg_b[l] = np.mean(ij_mat_T[l])
+
+        # subtract correction terms from each entry
+        for a in range(num_symbols):
+            for b in range(num_symbols):
+                J_ij_0[k, a, b] = (
+                    ij_mat[a, b] - avg_a[a] - avg_b[b] + avg_ab
+                )
+
+
 def _zero_sum_gauge(J_ij, inplace=False):
     """
-    Transform coupling matrix into zero-sum gauge
+    Transform couplings into zero-sum gauge
     (i.e., row and column sums of each ij submatrix are 0)
 
     Parameters
     ----------
     J_ij : np.array
-        Coupling matrix of size L x L x num_symbols x num_symbols
-        that should be transformed into zero-sum gauge
+        Couplings of size L * (L - 1) / 2 x num_symbols x num_symbols
+        of position pairs i < j (triangular storage) that should
+        be transformed into zero-sum gauge
     inplace : bool, optional (default: False)
         Modify original matrix (True), or return transformed
-        matrix in a new matrix
+        matrix in a new matrix (double precision)
 
     Returns
     -------
     J_ij_0 : np.array
         J_ij transformed into zero-sum gauge
     """
-    L, L2, num_symbols, num_symbols2 = J_ij.shape
-    assert L == L2 and num_symbols == num_symbols2
-
     if inplace:
         J_ij_0 = J_ij
     else:
-        J_ij_0 = np.zeros((L, L, num_symbols, num_symbols))
-
-    # go through all pairs of positions
-    for i in range(L - 1):
-        for j in range(i + 1, L):
-            ij_mat = J_ij[i, j]
-
-            # calculate matrix, row and column averages
-            avg_ab = np.mean(ij_mat)
-
-            # can't use axis argument of np.mean in numba,
-            # so have to calculate rows/cols manually
-            avg_a = np.zeros(num_symbols)
-            avg_b = np.zeros(num_symbols)
-            ij_mat_T = ij_mat.T
-
-            for k in range(num_symbols):
-                avg_a[k] = np.mean(ij_mat[k])
-                avg_b[k] = np.mean(ij_mat_T[k])
-
-            # subtract correction terms from each entry
-            for a in range(num_symbols):
-                for b in range(num_symbols):
-                    J_ij_0[i, j, a, b] = (
-                        ij_mat[a, b] - avg_a[a] - avg_b[b] + avg_ab
-                    )
-                    J_ij_0[j, i, b, a] = J_ij_0[i, j, a, b]
+        J_ij_0 = np.zeros(J_ij.shape)
 
+    _zero_sum_gauge_kernel(J_ij, J_ij_0)
     return J_ij_0
 
 
+def _skip_file_component(fileobj, precision, shape):
+    """
+    Record location of a parameter block in model file
+    and move file position behind it without reading
+    the block (see _read_file_component)
+
+    Parameters
+    ----------
+    fileobj : file-like object
+        Binary model file, positioned at start of block
+    precision : {"float32", "float64"}
+        Precision of values in file
+    shape : tuple(int)
+        Shape of parameter block
+
+    Returns
+    -------
+    _FileComponent
+        Location of block in file
+    """
+    component = _FileComponent(
+        fileobj.name, os.fstat(fileobj.fileno()).st_mtime_ns,
+        fileobj.tell(), precision, tuple(int(x) for x in shape)
+    )
+
+    fileobj.seek(
+        int(np.prod(component.shape)) * np.dtype(precision).itemsize,
+        os.SEEK_CUR
+    )
+
+    return component
+
+
+def _read_file_component(component):
+    """
+    Read parameter block from model file
+
+    Parameters
+    ----------
+    component : _FileComponent
+        Location of block in file (see _skip_file_component)
+
+    Returns
+    -------
+    np.array
+        Parameter block (in file precision)
+
+    Raises
+    ------
+    ValueError
+        If file was modified after model was created, or
+        if file ends before the block was read
+    """
+    if os.stat(component.filename).st_mtime_ns != component.mtime_ns:
+        raise ValueError(
+            "Model file modified after model was loaded, cannot read "
+            "remaining parameters: {}".format(component.filename)
+        )
+
+    count = int(np.prod(component.shape))
+    with open(component.filename, "rb") as f:
+        f.seek(component.offset)
+        values = np.fromfile(f, dtype=component.dtype, count=count)
+
+    if len(values) != count:
+        raise ValueError(
+            "Model file truncated: expected {} values, found {}".format(
+                count, len(values)
+            )
+        )
+
+    return values.reshape(component.shape)
+
+
+def _map_file_component(component, mmap_mode):
+    """
+    Memory-map parameter block from model file, so that
+    processes using the same file share one copy of it
+    in the page cache
+
+    Parameters
+    ----------
+    component : _FileComponent
+        Location of block in file
+    mmap_mode : {"r", "c", "r+"}
+        Mode in which file is mapped (see np.memmap)
+
+    Returns
+    -------
+    np.array
+        Memory-mapped parameter block
+    """
+    # empty arrays cannot be mapped
+    if int(np.prod(component.shape)) == 0:
+        return np.zeros(component.shape, dtype=component.dtype)
+
+    return np.asarray(
+        np.memmap(
+            component.filename, dtype=component.dtype, mode=mmap_mode,
+            offset=component.offset, shape=component.shape
+        )
+    )
+
+
+def _seek_npy_array(fileobj):
+    """
+    Move file position to start of next array in
+    native model file (arrays start at multiples of
+    _NPY_ALIGNMENT bytes)
+    """
+    offset = fileobj.tell()
+    fileobj.seek(-offset % _NPY_ALIGNMENT, os.SEEK_CUR)
+
+
+def _write_npy_array(fileobj, array):
+    """
+    Write array to native model file in .npy format,
+    padding file to start of array with zeros
+    """
+    offset = fileobj.tell()
+    fileobj.write(b"\0" * (-offset % _NPY_ALIGNMENT))
+    np.save(fileobj, array, allow_pickle=False)
+
+
+def _read_npy_array(fileobj):
+    """
+    Read next array from native model file
+    """
+    _seek_npy_array(fileobj)
+    return np.lib.format.read_array(fileobj, allow_pickle=False)
+
+
+def _skip_npy_array(fileobj):
+    """
+    Record location of next array in native model file
+    and move file position behind it without reading it
+    (see _read_file_component and _map_file_component)
+
+    Parameters
+    ----------
+    fileobj : file-like object
+        Binary model file
+
+    Returns
+    -------
+    _FileComponent
+        Location of array in file
+
+    Raises
+    ------
+    ValueError
+        If file does not contain a valid array header
+    """
+    _seek_npy_array(fileobj)
+
+    if np.lib.format.read_magic(fileobj) == (1, 0):
+        read_header = np.lib.format.read_array_header_1_0
+    else:
+        read_header = np.lib.format.read_array_header_2_0
+
+    shape, fortran_order, dtype = read_header(fileobj)
+    if fortran_order:
+        raise ValueError(
+            "Arrays in model file must be in C order: {}".format(
+                fileobj.name
+            )
+        )
+
+    component = _FileComponent(
+        fileobj.name, os.fstat(fileobj.fileno()).st_mtime_ns,
+        fileobj.tell(), dtype, shape
+    )
+
+    fileobj.seek(int(np.prod(shape)) * dtype.itemsize, os.SEEK_CUR)
+
+    return component
+
+
+def _plmc_v1_pair_dtype(precision, num_symbols):
+    """
+    Record of one position pair in plmc_v1 model files
+    (pair indices, followed by f_ij and J_ij blocks)
+    """
+    return np.dtype([
+        ("i", "int32"),
+        ("j", "int32"),
+        ("f_ij", precision, (num_symbols, num_symbols)),
+        ("J_ij", precision, (num_symbols, num_symbols)),
+    ])
+
+
+def _pair_view(blocks, L, diagonal=None):
+    """
+    View on blocks of position pairs i < j that can be indexed
+    like the full symmetric L x L x num_symbols x num_symbols
+    matrix (with block (i, j) at [i, j], transpose of block (i, j)
+    at [j, i] and diagonal matrices on the diagonal), without
+    creating it
+
+    Parameters
+    ----------
+    blocks : np.array
+        Matrix of size L * (L - 1) / 2 x num_symbols x num_symbols
+        (in row-major order of the upper triangle)
+    L : int
+        Length of model
+    diagonal : np.array, optional (default: None)
+        Matrix of size L x num_symbols, row i gives the diagonal
+        of block (i, i) (e.g. single-site frequencies for pair
+        frequencies). If None, blocks (i, i) are zero.
+
+    Returns
+    -------
+    PairFrequencies
+        View on blocks (np.asarray() creates full matrix)
+    """
+    if diagonal is None:
+        diagonal = np.zeros((L, blocks.shape[1]), dtype=blocks.dtype)
+
+    return PairFrequencies(blocks, diagonal)
+
+
+def _triangle_blocks(matrix, L):
+    """
+    Extract blocks of position pairs i < j from
+    L x L x num_symbols x num_symbols matrix (inverse
+    of _pair_view)
+
+    Parameters
+    ----------
+    matrix : np.array or PairFrequencies
+        Pair matrix
+    L : int
+        Length of model
+
+    Returns
+    -------
+    np.array
+        Matrix of size L * (L - 1) / 2 x num_symbols x num_symbols
+    """
+    if (isinstance(matrix, PairFrequencies) and
+            matrix.scale == 1.0 and matrix.offset == 0.0):
+        return matrix.blocks
+
+    # go row by row so pair matrices that are not
+    # stored densely are never fully expanded
+    return np.concatenate([
+        np.asarray(matrix[i, i + 1:]) for i in range(L - 1)
+    ])
+
+
+def _sequence_distance(index_i, index_j):
+    """
+    Sequence distance between two model positions
+
+    Parameters
+    ----------
+    index_i : int or object
+        Sequence index of first position
+    index_j : int or object
+        Sequence index of second position
+
+    Returns
+    -------
+    float
+        Absolute difference of indices, or np.nan
+        if indices are not numeric (e.g. segment tuples)
+    """
+    try:
+        return abs(index_i - index_j)
+    except TypeError:
+        return np.nan
+
+
 class CouplingsModel:
     """
     Class to store parameters of pairwise undirected graphical model of sequences
     and compute evolutionary couplings, sequence statistical energies, etc.
     """
 
-    def __init__(self, filename, precision="float32", file_format="plmc_v2", **kwargs):
+    def __init__(self, filename, precision="float32", file_format="plmc_v2",
+                 storage_precision=None, components=None, mmap_mode=None,
+                 **kwargs):
         """
         Initializes the object with raw values read from binary .Jij file
 
@@ -260,29 +615,80 @@ class CouplingsModel:
         precision : {"float32", "float64"}, default: "float32"
             Sets if input file has single (float32) or double precision (float64)
         }
-        file_format : {"plmc_v2", "plmc_v1"}, default: "plmc_v2"
-            File format of parameter file.
+        file_format : {"plmc_v2", "plmc_v1", "npy"}, default: "plmc_v2"
+            File format of parameter file. "npy" is the native format
+            written by to_file() (arrays in .npy format that can
+            be memory-mapped, see mmap_mode).
 
             Note: The use of "plmc_v1" is discouraged and only for backwards
             compatibility as this format lacks crucial information about
             parameters used by this class. Users are responsible for supplying
             the missing values (e.g. regularization strength, alphabet or M_eff)
             manually via the respective member variables/properties.
-        """
+        storage_precision : {"float32", "float64"}, optional (default: None)
+            Precision in which pair parameters (J_ij, f_ij) are stored in
+            memory. If None, keep precision of input file.
+        components : list of str, optional (default: None)
+            Parameter blocks that are read from the file immediately
+            (subset of MODEL_COMPONENTS). All other blocks are only read
+            when first accessed, so the file must not be modified
+            while the model is in use. If None, read all blocks.
+            Only has an effect for "plmc_v2" and "npy" files (plmc_v1
+            files are always read completely).
+        mmap_mode : {"r", "c", "r+"}, optional (default: None)
+            Memory-map parameter blocks from file instead of reading them
+            (see np.memmap), so that all processes using the model share
+            one copy of the parameters in memory. Only available for
+            "npy" files, overrides components (except for pair
+            parameters if storage_precision differs from file).
+        """
+        if components is None:
+            components = MODEL_COMPONENTS
+
+        invalid = [c for c in components if c not in MODEL_COMPONENTS]
+        if len(invalid) > 0:
+            raise ValueError(
+                "Invalid model components: {}, valid options are: {}".format(
+                    ", ".join(invalid), ", ".join(MODEL_COMPONENTS)
+                )
+            )
+
+        self._storage_precision = storage_precision
+        self._file_components = {}
+
+        if mmap_mode is not None and file_format != "npy":
+            raise ValueError(
+                "Memory-mapping only available for npy file format"
+            )
+
         if file_format == "plmc_v2":
             self.__read_plmc_v2(filename, precision)
         elif file_format == "plmc_v1":
             self.__read_plmc_v1(
                 filename, precision, kwargs.get("alphabet", None)
             )
+        elif file_format == "npy":
+            self.__read_npy(filename, mmap_mode)
         else:
             raise ValueError(
                 "Illegal file format {}, valid options are:"
-                "plmc_v2, plmc_v1".format(
+                "plmc_v2, plmc_v1, npy".format(
                     file_format
                 )
             )
 
+        for member in ("_f_ij_blocks", "_J_ij_blocks"):
+            if storage_precision is not None and member in self.__dict__:
+                setattr(
+                    self, member,
+                    self.__dict__[member].astype(storage_precision)
+                )
+
+        # read requested parameter blocks that were
+        # skipped by file reader (see __getattr__)
+        for component in components:
+            getattr(self, _COMPONENT_MEMBERS[component])
+
         self.alphabet_map = {s: i for i, s in enumerate(self.alphabet)}
 
         # in non-gap mode, focus sequence is still coded with a gap character,
@@ -310,6 +716,32 @@ class CouplingsModel:
         self._mi_scores_apc = None
         self._ecs = None
 
+    def __getattr__(self, name):
+        """
+        Read parameter blocks that were not loaded when
+        creating the model on first access (see components
+        parameter of constructor)
+        """
+        # only called if regular attribute lookup fails; go through
+        # __dict__ to stay safe while object is being copied/unpickled
+        file_components = self.__dict__.get("_file_components", {})
+        if name not in file_components:
+            raise AttributeError(
+                "'{}' object has no attribute '{}'".format(
+                    type(self).__name__, name
+                )
+            )
+
+        values = _read_file_component(file_components[name])
+        if (name in ("_f_ij_blocks", "_J_ij_blocks") and
+                self._storage_precision is not None):
+            values = values.astype(self._storage_precision)
+
+        setattr(self, name, values)
+        del file_components[name]
+
+        return values
+
     def __read_plmc_v2(self, filename, precision):
         """
         Read updated Jij file format from plmc.
@@ -321,6 +753,10 @@ class CouplingsModel:
         precision : {"float32", "float64"}
             Sets if input file has single or double precision
 
+        Raises
+        ------
+        ValueError
+            If file ends before all parameters were read
         """
         with open(filename, "rb") as f:
             # model length, number of symbols, valid/invalid sequences
@@ -351,9 +787,13 @@ class CouplingsModel:
                 f, "S1", self.num_symbols
             ).astype("U1")
 
+            # Parameter blocks are not read here, only their locations
+            # in the file are recorded; blocks are then read in bulk
+            # on first access (see __getattr__)
+
             # weights of individual sequences (after clustering)
-            self.weights = np.fromfile(
-                f, precision, self.N_valid + self.N_invalid
+            self._file_components["weights"] = _skip_file_component(
+                f, precision, (self.N_valid + self.N_invalid,)
             )
 
             # target sequence and index mapping, again ensure unicode
@@ -361,41 +801,29 @@ class CouplingsModel:
             self.index_list = np.fromfile(f, "int32", self.L)
 
             # single site frequencies f_i and fields h_i
-            self.f_i, = np.fromfile(
-                f, dtype=(precision, (self.L, self.num_symbols)), count=1
-            )
-
-            self.h_i, = np.fromfile(
-                f, dtype=(precision, (self.L, self.num_symbols)), count=1
-            )
-
-            # pair frequencies f_ij and pair couplings J_ij / J_ij
-            self.f_ij = np.zeros(
-                (self.L, self.L, self.num_symbols, self.num_symbols)
-            )
+            for member in ["f_i", "h_i"]:
+                self._file_components[member] = _skip_file_component(
+                    f, precision, (self.L, self.num_symbols)
+                )
 
-            self.J_ij = np.zeros(
-                (self.L, self.L, self.num_symbols, self.num_symbols)
-            )
+            # pair frequencies f_ij and pair couplings J_ij, stored as
+            # consecutive num_symbols x num_symbols blocks for all pairs
+            # i < j, which are kept in this triangular form (see f_ij
+            # and J_ij properties)
+            num_pairs = self.L * (self.L - 1) // 2
+            for member in ["_f_ij_blocks", "_J_ij_blocks"]:
+                self._file_components[member] = _skip_file_component(
+                    f, precision, (num_pairs, self.num_symbols, self.num_symbols)
+                )
 
-            # TODO: could read triangle matrix from file in one block
-            # like in read_params.m, which would result in faster reading
-            # but also 50% higher memory usage... for now save memory
-            for i in range(self.L - 1):
-                for j in range(i + 1, self.L):
-                    self.f_ij[i, j], = np.fromfile(
-                        f, dtype=(precision, (self.num_symbols, self.num_symbols)),
-                        count=1
+            # make sure all blocks can be read later on
+            file_size = os.fstat(f.fileno()).st_size
+            if f.tell() > file_size:
+                raise ValueError(
+                    "Model file truncated: expected {} bytes, found {}".format(
+                        f.tell(), file_size
                     )
-                    self.f_ij[j, i] = self.f_ij[i, j].T
-
-            for i in range(self.L - 1):
-                for j in range(i + 1, self.L):
-                    self.J_ij[i, j], = np.fromfile(
-                        f, dtype=(precision, (self.num_symbols, self.num_symbols)),
-                        count=1
-                    )
-                    self.J_ij[j, i] = self.J_ij[i, j].T
+                )
 
     def __read_plmc_v1(self, filename, precision, alphabet=None):
         """
@@ -479,36 +907,140 @@ class CouplingsModel:
                 f, dtype=(precision, (self.L, self.num_symbols)), count=1
             )
 
-            # pair frequencies f_ij and pair couplings J_ij / J_ij
-            self.f_ij = np.zeros(
-                (self.L, self.L, self.num_symbols, self.num_symbols)
+            # pair frequencies f_ij and pair couplings J_ij, stored
+            # together with pair indices as one record for each
+            # pair i < j (read in bulk)
+            num_pairs = self.L * (self.L - 1) // 2
+            pairs = np.fromfile(
+                f, dtype=_plmc_v1_pair_dtype(precision, self.num_symbols),
+                count=num_pairs
             )
 
-            self.J_ij = np.zeros(
-                (self.L, self.L, self.num_symbols, self.num_symbols)
-            )
+            if len(pairs) != num_pairs:
+                raise ValueError(
+                    "Model file truncated: expected {} pairs, found {}".format(
+                        num_pairs, len(pairs)
+                    )
+                )
 
-            for i in range(self.L - 1):
-                for j in range(i + 1, self.L):
-                    file_i, file_j = np.fromfile(f, "int32", 2)
+            i, j = np.triu_indices(self.L, k=1)
+            inconsistent = (pairs["i"] != i + 1) | (pairs["j"] != j + 1)
+            if inconsistent.any():
+                k = np.argmax(inconsistent)
+                raise ValueError(
+                    "Error: column pair indices inconsistent. "
+                    "Expected: {} {}; File: {} {}".format(
+                        i[k] + 1, j[k] + 1, pairs["i"][k], pairs["j"][k]
+                    )
+                )
 
-                    if i + 1 != file_i or j + 1 != file_j:
-                        raise ValueError(
-                            "Error: column pair indices inconsistent. "
-                            "Expected: {} {}; File: {} {}".format(i + 1, j + 1, file_i, file_j)
-                        )
+            self._f_ij_blocks = np.ascontiguousarray(pairs["f_ij"])
+            self._J_ij_blocks = np.ascontiguousarray(pairs["J_ij"])
+
+    def __read_npy(self, filename, mmap_mode=None):
+        """
+        Read native model file format (see to_file).
+
+        Parameters
+        ----------
+        filename : str
+            Binary model file
+        mmap_mode : {"r", "c", "r+"}, optional (default: None)
+            Memory-map parameter blocks instead of
+            reading them (see np.memmap)
+
+        Raises
+        ------
+        ValueError
+            If file has an invalid format version or
+            ends before all parameters were read
+        """
+        with open(filename, "rb") as f:
+            try:
+                # format version, model length, number of symbols,
+                # valid/invalid sequences and iterations (-1 if undefined)
+                version, self.L, self.num_symbols, N_valid, N_invalid, num_iter = (
+                    _read_npy_array(f).tolist()
+                )
+            except ValueError:
+                raise ValueError(
+                    "Not a valid model file: {}".format(filename)
+                )
 
-                    self.f_ij[i, j], = np.fromfile(
-                        f, dtype=(precision, (self.num_symbols, self.num_symbols)),
-                        count=1
+            if version != MODEL_NPY_VERSION:
+                raise ValueError(
+                    "Unsupported model file version {}, expected {}".format(
+                        version, MODEL_NPY_VERSION
                     )
-                    self.f_ij[j, i] = self.f_ij[i, j].T
+                )
 
-                    self.J_ij[i, j], = np.fromfile(
-                        f, dtype=(precision, (self.num_symbols, self.num_symbols)),
-                        count=1
+            self.N_valid, self.N_invalid, self.num_iter = [
+                None if x < 0 else x for x in (N_valid, N_invalid, num_iter)
+            ]
+
+            # theta, regularization weights, and effective number
+            # of samples (NaN if undefined)
+            self.theta, self.lambda_h, self.lambda_J, self.lambda_group, self.N_eff = [
+                None if np.isnan(x) else x for x in _read_npy_array(f)
+            ]
+
+            # alphabet, target sequence and index mapping
+            self.alphabet = _read_npy_array(f)
+            self._target_seq = _read_npy_array(f)
+            self.index_list = _read_npy_array(f)
+
+            # parameter blocks, which are either memory-mapped or
+            # read on first access (see __getattr__); pair parameters
+            # are stored as blocks for pairs i < j like in plmc files
+            for member in ["weights", "f_i", "h_i", "_f_ij_blocks", "_J_ij_blocks"]:
+                component = _skip_npy_array(f)
+                if member == "weights" and self.N_valid is None:
+                    self.weights = None
+                elif mmap_mode is not None:
+                    setattr(
+                        self, member, _map_file_component(component, mmap_mode)
+                    )
+                else:
+                    self._file_components[member] = component
+
+            # make sure all blocks can be read later on
+            file_size = os.fstat(f.fileno()).st_size
+            if f.tell() > file_size:
+                raise ValueError(
+                    "Model file truncated: expected {} bytes, found {}".format(
+                        f.tell(), file_size
                     )
-                    self.J_ij[j, i] = self.J_ij[i, j].T
+                )
+
+    @property
+    def f_ij(self):
+        """
+        Pair frequencies (L x L x num_symbols x num_symbols)
+
+        Only blocks of position pairs i < j are stored, the returned
+        view can be indexed like the full symmetric matrix (see
+        _pair_view; np.asarray() creates the full matrix).
+        """
+        return _pair_view(self._f_ij_blocks, self.L)
+
+    @f_ij.setter
+    def f_ij(self, f_ij):
+        self._f_ij_blocks = _triangle_blocks(f_ij, self.L)
+
+    @property
+    def J_ij(self):
+        """
+        Pair couplings (L x L x num_symbols x num_symbols)
+
+        Only blocks of position pairs i < j are stored, the returned
+        view can be indexed like the full symmetric matrix (see
+        _pair_view; np.asarray() creates the full matrix).
+        """
+        return _pair_view(self._J_ij_blocks, self.L)
+
+    @J_ij.setter
+    def J_ij(self, J_ij):
+        self._J_ij_blocks = _triangle_blocks(J_ij, self.L)
 
     @property
     def target_seq(self):
@@ -640,7 +1172,7 @@ class CouplingsModel:
         if isinstance(sequences, list):
             sequences = self.convert_sequences(sequences)
 
-        return _hamiltonians(sequences, self.J_ij, self.h_i)
+        return _hamiltonians(sequences, self._J_ij_blocks, self.h_i)
 
     @property
     def single_mut_mat_full(self):
@@ -653,7 +1185,7 @@ class CouplingsModel:
         """
         if self._single_mut_mat_full is None:
             self._single_mut_mat_full = _single_mutant_hamiltonians(
-                self.target_seq_mapped, self.J_ij, self.h_i
+                self.target_seq_mapped, self._J_ij_blocks, self.h_i
             )
 
         return self._single_mut_mat_full
@@ -708,7 +1240,7 @@ class CouplingsModel:
                 )
             )
 
-        return _delta_hamiltonian(pos, subs, self.target_seq_mapped, self.J_ij, self.h_i)
+        return _delta_hamiltonian(pos, subs, self.target_seq_mapped, self._J_ij_blocks, self.h_i)
 
     @property
     def double_mut_mat(self):
@@ -724,17 +1256,21 @@ class CouplingsModel:
             )
 
             seq = self.target_seq_mapped
+            # pairs i < j are visited in storage order
+            k = 0
             for i in range(self.L - 1):
                 for j in range(i + 1, self.L):
+                    J_ij = self._J_ij_blocks[k].astype(np.float64)
+                    k += 1
                     self._double_mut_mat[i, j] = (
                         np.tile(self.single_mut_mat[i], (self.num_symbols, 1)).T +
                         np.tile(self.single_mut_mat[j], (self.num_symbols, 1)) +
-                        self.J_ij[i, j] -
-                        np.tile(self.J_ij[i, j, :, seq[j]], (self.num_symbols, 1)).T -
-                        np.tile(self.J_ij[i, j, seq[i], :], (self.num_symbols, 1)) +
+                        J_ij -
+                        np.tile(J_ij[:, seq[j]], (self.num_symbols, 1)).T -
+                        np.tile(J_ij[seq[i], :], (self.num_symbols, 1)) +
                         # we are only interested in difference to WT, so normalize
                         # for second couplings subtraction with last term
-                        self.J_ij[i, j, seq[i], seq[j]])
+                        J_ij[seq[i], seq[j]])
 
                     self._double_mut_mat[j, i] = self._double_mut_mat[i, j].T
 
@@ -773,57 +1309,86 @@ class CouplingsModel:
 
         return corrected_matrix
 
-    def _calculate_ecs(self):
+    def _calculate_ecs(self, block_size=ECS_BLOCK_SIZE):
         """
         Calculates FN and CN scores as defined in Ekeberg et al., Phys Rev E, 2013,
         as well as MI scores.
+
+        Parameters
+        ----------
+        block_size : int, optional (default: ECS_BLOCK_SIZE)
+            Number of position pairs for which scores are
+            computed at once (limits memory usage)
         """
         # calculate Frobenius norm for each pair of sites (i, j)
         # also calculate mutual information
         self._fn_scores = np.zeros((self.L, self.L))
         self._mi_scores_raw = np.zeros((self.L, self.L))
 
-        # transform couplings into zero-sum gauge
-        J_ij_0 = _zero_sum_gauge(self.J_ij)
+        # pairs i < j in storage order of blocks
+        i, j = np.triu_indices(self.L, k=1)
+        fn = np.zeros(len(i))
+        mi = np.zeros(len(i))
+
+        for start in range(0, len(i), block_size):
+            block = np.s_[start:start + block_size]
+
+            # transform couplings into zero-sum gauge
+            # and compute Frobenius norms (with BLAS dot products
+            # over flattened blocks, like np.linalg.norm)
+            J_ij_0 = _zero_sum_gauge(
+                self._J_ij_blocks[block]
+            ).reshape(-1, self.num_symbols ** 2)
+            fn[block] = np.sqrt(
+                np.einsum("kn,kn->k", J_ij_0, J_ij_0, optimize=True)
+            )
 
-        for i in range(self.L - 1):
-            for j in range(i + 1, self.L):
-                self._fn_scores[i, j] = np.linalg.norm(J_ij_0[i, j], "fro")
-                self._fn_scores[j, i] = self._fn_scores[i, j]
+            # mutual information, only over state pairs with p > 0
+            p = self._f_ij_blocks[block].astype(np.float64)
+            m = self.f_i[i[block], :, np.newaxis] * self.f_i[j[block], np.newaxis, :]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                mi[block] = np.sum(
+                    np.where(p > 0, p * np.log(p / m), 0), axis=(1, 2)
+                )
 
-                # mutual information
-                p = self.f_ij[i, j]
-                m = np.dot(self.f_i[i, np.newaxis].T, self.f_i[j, np.newaxis])
-                self._mi_scores_raw[i, j] = np.sum(p[p > 0] * np.log(p[p > 0] / m[p > 0]))
-                self._mi_scores_raw[j, i] = self._mi_scores_raw[i, j]
+        self._fn_scores[i, j] = self._fn_scores[j, i] = fn
+        self._mi_scores_raw[i, j] = self._mi_scores_raw[j, i] = mi
 
         # apply Average Product Correction (Dunn et al., Bioinformatics, 2008)
         # subtract APC and blank diagonal entries
         self._cn_scores = self.apc(self._fn_scores)
         self._mi_scores_apc = self.apc(self._mi_scores_raw)
 
-        # create internal dataframe representation
-        ecs = []
-        for i in range(self.L - 1):
-            for j in range(i + 1, self.L):
-                # if we have custom indeces, cannot compute sequence distance
-                # easily, unless we use segment information
-                try:
-                    seqdist = abs(self.index_list[i] - self.index_list[j])
-                except TypeError:
-                    seqdist = np.nan
-
-                ecs.append((
-                    self.index_list[i], self.target_seq[i],
-                    self.index_list[j], self.target_seq[j],
-                    seqdist,
-                    self._mi_scores_raw[i, j], self._mi_scores_apc[i, j],
-                    self._fn_scores[i, j], self._cn_scores[i, j]
-                ))
-
-        self._ecs = pd.DataFrame(
-            ecs, columns=["i", "A_i", "j", "A_j", "seqdist", "mi_raw", "mi_apc", "fn", "cn"]
-        ).sort_values(by="cn", ascending=False)
+        # create internal dataframe representation; if we have custom
+        # indeces, cannot compute sequence distance easily, unless we
+        # use segment information
+        index_list = self.index_list
+        if not (isinstance(index_list, np.ndarray) and
+                np.issubdtype(index_list.dtype, np.integer)):
+            # plain lists or (segment, position) tuples, e.g. after
+            # patching model with SegmentIndexMapper; object array
+            # keeps tuples as single elements
+            index_list = np.empty(self.L, dtype=object)
+            index_list[:] = list(self.index_list)
+
+            seqdist = np.array([
+                _sequence_distance(a, b)
+                for a, b in zip(index_list[i], index_list[j])
+            ], dtype=np.float64)
+        else:
+            seqdist = np.abs(index_list[i] - index_list[j])
+
+        self._ecs = pd.DataFrame({
+            "i": index_list[i],
+            "A_i": self.target_seq[i],
+            "j": index_list[j],
+            "A_j": self.target_seq[j],
+            "seqdist": seqdist,
+            "mi_raw": mi,
+            "mi_apc": self._mi_scores_apc[i, j],
+            "fn": fn,
+            "cn": self._cn_scores[i, j],
+        }).sort_values(by="cn", ascending=False)
 
     @property
     def cn_scores(self):
@@ -928,7 +1493,7 @@ class CouplingsModel:
 
         c0 = deepcopy(self)
         c0.h_i = h_i
-        c0.J_ij.fill(0)
+        c0._J_ij_blocks = np.zeros_like(self._J_ij_blocks)
         c0._reset_precomputed()
         return c0
 
@@ -1213,7 +1778,17 @@ class CouplingsModel:
         ----------
         out_file: str
             A string specifying the path to a file
+        precision : {"float32", "float64"}, default: "float32"
+            Precision of model parameters in file
+        file_format : {"plmc_v1", "plmc_v2", "npy"}, default: "plmc_v1"
+            File format. "npy" is a sequence of arrays in .npy format
+            that can be memory-mapped when loading the model (see
+            mmap_mode parameter of constructor).
         """
+        if file_format.lower() == "npy":
+            self.__write_npy(out_file, precision)
+            return
+
         new = file_format.lower() == "plmc_v2"
         with open(out_file, "wb") as f:
             np.array([self.L, self.num_symbols], dtype="int32").tofile(f)
@@ -1239,17 +1814,98 @@ class CouplingsModel:
             self.f_i.astype(precision).tofile(f)
             self.h_i.astype(precision).tofile(f)
 
+            f_ij_blocks, J_ij_blocks = self._f_ij_blocks, self._J_ij_blocks
+
             if not new:
-                for i in range(self.L - 1):
-                    for j in range(i + 1, self.L):
-                        np.array([i + 1, j + 1], dtype="int32").tofile(f)
-                        self.f_ij[i, j].astype(precision).tofile(f)
-                        self.J_ij[i, j].astype(precision).tofile(f)
+                pairs = np.zeros(
+                    len(f_ij_blocks),
+                    dtype=_plmc_v1_pair_dtype(precision, self.num_symbols)
+                )
+                i, j = np.triu_indices(self.L, k=1)
+                pairs["i"] = i + 1
+                pairs["j"] = j + 1
+                pairs["f_ij"] = f_ij_blocks
+                pairs["J_ij"] = J_ij_blocks
+                pairs.tofile(f)
             else:
-                for i in range(self.L - 1):
-                    for j in range(i + 1, self.L):
-                        self.f_ij[i, j].astype(precision).tofile(f)
+                f_ij_blocks.astype(precision).tofile(f)
+                J_ij_blocks.astype(precision).tofile(f)
+
+    def __write_npy(self, out_file, precision="float32"):
+        """
+        Write model in native file format (arrays in .npy format,
+        each starting at a multiple of _NPY_ALIGNMENT bytes)
 
-                for i in range(self.L - 1):
-                    for j in range(i + 1, self.L):
-                        self.J_ij[i, j].astype(precision).tofile(f)
+        Parameters
+        ----------
+        out_file : str
+            Path of output file
+        precision : {"float32", "float64"}, default: "float32"
+            Precision of model parameters in file
+        """
+        def _undefined(value, fill):
+            return fill if value is None else value
+
+        with open(out_file, "wb") as f:
+            _write_npy_array(f, np.array([
+                MODEL_NPY_VERSION, self.L, self.num_symbols,
+                _undefined(self.N_valid, -1),
+                _undefined(self.N_invalid, -1),
+                _undefined(self.num_iter, -1),
+            ], dtype=np.int64))
+
+            _write_npy_array(f, np.array([
+                _undefined(x, np.nan) for x in (
+                    self.theta, self.lambda_h, self.lambda_J,
+                    self.lambda_group, self.N_eff
+                )
+            ], dtype=np.float64))
+
+            _write_npy_array(f, np.asarray(self.alphabet, dtype="U1"))
+            _write_npy_array(f, np.asarray(self.target_seq, dtype="U1"))
+            _write_npy_array(f, np.asarray(self.index_list, dtype="int32"))
+
+            if self.weights is None:
+                weights = np.zeros(0, dtype=precision)
+            else:
+                weights = self.weights
+
+            for values in [
+                weights, self.f_i, self.h_i,
+                self._f_ij_blocks, self._J_ij_blocks
+            ]:
+                _write_npy_array(
+                    f, np.ascontiguousarray(values, dtype=precision)
+                )
+
+
+def convert_model_file(in_file, out_file, in_format="plmc_v2",
+                       out_format="npy", precision="float32", **kwargs):
+    """
+    Convert model file between file formats (e.g. from plmc
+    output to native format that can be memory-mapped)
+
+    Parameters
+    ----------
+    in_file : str
+        Path of input model file
+    out_file : str
+        Path of output model file
+    in_format : {"plmc_v2", "plmc_v1", "npy"}, default: "plmc_v2"
+        File format of input file
+    out_format : {"npy", "plmc_v2", "plmc_v1"}, default: "npy"
+        File format of output file
+    precision : {"float32", "float64"}, default: "float32"
+        Precision of model parameters in input and output file
+    **kwargs
+        Additional parameters for reading input file
+        (e.g. alphabet for plmc_v1 files, see CouplingsModel)
+    """
+    # parameter blocks are only read from input file
+    # one after the other while writing output file
+    model = CouplingsModel(
+        in_file, precision=precision, file_format=in_format,
+        components=[], **kwargs
+    )
+
+    model.to_file(out_file, precision=precision, file_format=out_format)
@@ -14,7 +14,7 @@ import numpy as np
 from evcouplings.couplings import tools as ct
 from evcouplings.couplings import pairs, mapping
 from evcouplings.couplings.mean_field import MeanFieldDCA
-from evcouplings.couplings.model import CouplingsModel
+from evcouplings.couplings.model import CouplingsModel, convert_model_file
 from evcouplings.visualize.parameters import evzoom_json
 from evcouplings.visualize.pairs import (
     ec_lines_pymol_script, enrichment_pymol_script
@@ -69,6 +69,7 @@ def infer_plmc(**kwargs):
 
         raw_ec_file
         model_file
+        model_npy_file (only if model_npy is set)
         num_sites
         num_sequences
         effective_sequences
@@ -239,6 +240,11 @@ def infer_plmc(**kwargs):
         "region_start": plmc_result["region_start"],
     })
 
+    # store copy of model that can be memory-mapped
+    if kwargs.get("model_npy", False) and outcfg["model_file"] is not None:
+        outcfg["model_npy_file"] = prefix + ".model.npy"
+        convert_model_file(outcfg["model_file"], outcfg["model_npy_file"])
+
     # read and sort ECs
     ecs = pairs.read_raw_ec_file(outcfg["raw_ec_file"])
 
@@ -275,6 +281,7 @@ def standard(**kwargs):
 
         raw_ec_file
         model_file
+        model_npy_file (only if model_npy is set)
         num_sites
         num_sequences
         effective_sequences
@@ -295,7 +302,10 @@ def standard(**kwargs):
 
     # infer ECs and load them
     outcfg, ecs, segments = infer_plmc(**kwargs)
-    model = CouplingsModel(outcfg["model_file"])
+
+    # parameter blocks are only read from model file if
+    # needed for postprocessing (e.g. EVzoom output)
+    model = CouplingsModel(outcfg["model_file"], components=[])
 
     # add mixture model probability
     ecs = pairs.add_mixture_probability(ecs)
@@ -386,6 +396,7 @@ def complex(**kwargs):
 
         raw_ec_file
         model_file
+        model_npy_file (only if model_npy is set)
         num_sites
         num_sequences
         effective_sequences
@@ -407,7 +418,10 @@ def complex(**kwargs):
 
     # infer ECs and load them
     outcfg, ecs, segments = infer_plmc(**kwargs)
-    model = CouplingsModel(outcfg["model_file"])
+
+    # parameter blocks are only read from model file if
+    # needed for postprocessing (e.g. EVzoom output)
+    model = CouplingsModel(outcfg["model_file"], components=[])
 
     # following computations are mostly specific to complex pipeline
 
@@ -504,9 +518,14 @@ def mean_field(**kwargs):
 
         * raw_ec_file
         * model_file
+        * model_npy_file (only if model_npy is set)
         * num_sites
         * num_sequences
         * effective_sequences
+        * effective_sequences_error (only for approximate
+          sequence weighting)
+        * pair_frequencies_file (only if pair frequencies
+          are stored out of core)
 
         * focus_mode (passed through)
         * focus_sequence (passed through)
@@ -580,16 +599,36 @@ def mean_field(**kwargs):
     with open(alignment_file) as f:
         input_alignment = Alignment.from_file(
             f, alphabet=alphabet,
-            format="fasta"
+            format="fasta", use_cache=True
         )
 
+    # select how pair frequencies are computed and stored
+    # (BLAS-based engine with triangular storage saves memory
+    # for long alignments, in particular in single precision)
+    input_alignment.pair_frequency_engine = (
+        kwargs.get("pair_frequency_engine", None) or "loop"
+    )
+    input_alignment.pair_frequency_dtype = np.dtype(
+        kwargs.get("pair_frequency_dtype", None) or "float64"
+    )
+
+    # store pair frequencies in memory-mapped file
+    # on disk for very long alignments
+    if kwargs.get("pair_frequencies_out_of_core", False):
+        input_alignment.pair_frequency_engine = "blas"
+        input_alignment.pair_frequency_file = prefix + "_pair_frequencies.npy"
+        outcfg["pair_frequencies_file"] = input_alignment.pair_frequency_file
+
     # init mean field direct coupling analysis
     mf_dca = MeanFieldDCA(input_alignment)
 
     # run mean field approximation
     model = mf_dca.fit(
         theta=kwargs["theta"],
-        pseudo_count=kwargs["pseudo_count"]
+        pseudo_count=kwargs["pseudo_count"],
+        num_threads=kwargs.get("cpu", None),
+        weighting_method=kwargs.get("weighting_method", None) or "exact",
+        weighting_recall=kwargs.get("weighting_recall", None) or 0.95,
     )
 
     # write ECs to file
@@ -604,6 +643,14 @@ def mean_field(**kwargs):
             file_format="plmc_v2"
         )
 
+        # store copy of model that can be memory-mapped
+        if kwargs.get("model_npy", False):
+            outcfg["model_npy_file"] = prefix + ".model.npy"
+            model.to_file(
+                outcfg["model_npy_file"],
+                file_format="npy"
+            )
+
     # store useful information about model in outcfg
     outcfg.update({
         "num_sites": model.L,
@@ -612,6 +659,11 @@ def mean_field(**kwargs):
         "region_start": int(model.index_list[0]),
     })
 
+    # estimated error of approximate sequence weights
+    weights_error = mf_dca.alignment.weights_error
+    if weights_error is not None:
+        outcfg["effective_sequences_error"] = weights_error.neff_relative_error
+
     # read and sort ECs
     ecs = pd.read_csv(
         outcfg["raw_ec_file"], sep=" ",
@@ -19,7 +19,7 @@ from evcouplings.utils.config import (
     check_required, InvalidParameterError
 )
 from evcouplings.utils.system import (
-    create_prefix_folders, verify_resources
+    create_prefix_folders, valid_file, verify_resources
 )
 
 
@@ -67,8 +67,18 @@ def standard(**kwargs):
     # make sure output directory exists
     create_prefix_folders(prefix)
 
-    # load couplings object, and create independent model
-    c = CouplingsModel(kwargs["model_file"])
+    # load couplings object (only parameters needed for mutation
+    # effect prediction), and create independent model; memory-map
+    # parameters if couplings stage stored model in npy format
+    components = ["f_i", "h_i", "J_ij"]
+    if valid_file(kwargs.get("model_npy_file", None)):
+        c = CouplingsModel(
+            kwargs["model_npy_file"], file_format="npy",
+            mmap_mode="r", components=components
+        )
+    else:
+        c = CouplingsModel(kwargs["model_file"], components=components)
+
     c0 = c.to_independent_model()
 
     for model, type_ in [(c, "Epistatic"), (c0, "Independent")]:
@@ -34,6 +34,36 @@ def entropy(X, normalize=False):
         return H
 
 
+def entropies(X, normalize=False):
+    """
+    Calculate entropy of each distribution
+    in a matrix (same as applying entropy
+    to each row)
+
+    Parameters
+    ----------
+    X : np.array
+        Matrix with one distribution per row
+    normalize:
+        Rescale entropy to range from 0 ("variable", "flat")
+        to 1 ("conserved")
+
+    Returns
+    -------
+    np.array
+        Entropy of each row of X
+    """
+    X_log_X = np.zeros(X.shape)
+    nonzero = X > 0
+    X_log_X[nonzero] = X[nonzero] * np.log(X[nonzero])
+    H = -np.sum(X_log_X, axis=1)
+
+    if normalize:
+        return 1 - (H / np.log(X.shape[1]))
+    else:
+        return H
+
+
 def entropy_vector(model, normalize=True):
     """
     Compute vector of positional entropies for
@@ -56,12 +86,7 @@ def entropy_vector(model, normalize=True):
         Vector of length model.L containing
         entropy for each position
     """
-    cons = np.apply_along_axis(
-        lambda x: entropy(x, normalize=normalize),
-        axis=1, arr=model.fi()
-    )
-
-    return cons
+    return entropies(model.fi(), normalize=normalize)
 
 def entropy_map(model, normalize=True):
     """
@@ -0,0 +1,188 @@
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+
+import numpy as np
+
+from evcouplings.align.alignment import Alignment, read_alignment_cache
+
+SEQUENCES = [
+    ("seq1", "ACDEFGHIKL"),
+    ("seq2", "ACDEFGHIKM"),
+    ("seq3", "ACDQFGHIKM"),
+    ("seq4", "WCDEYGHIRL"),
+    ("seq5", "-CDEFGH-KL"),
+]
+
+# columns used for model inference
+FOCUS_COLUMNS = np.array([1, 2, 4, 5, 6, 8])
+
+# deliberately wrong cluster sizes, so that we can tell if
+# weights are taken from the cache or recomputed
+CACHED_MEMBERS = np.array([7.0, 7.0, 7.0, 7.0, 7.0])
+
+
+class TestAlignmentCache(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tempdir.name, "ali.a2m")
+        self.ali = Alignment.from_dict(dict(SEQUENCES))
+
+        self.write_alignment(self.ali)
+        self.ali.write_cache(
+            self.filename, num_cluster_members={0.8: CACHED_MEMBERS}
+        )
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def write_alignment(self, ali):
+        with open(self.filename, "w") as f:
+            ali.write(f, "fasta")
+
+    def read_alignment(self, **kwargs):
+        with open(self.filename) as f:
+            return Alignment.from_file(f, **kwargs)
+
+    def uses_cache(self):
+        ali = self.read_alignment(use_cache=True)
+        ali.set_weights(0.8)
+        return np.array_equal(ali.num_cluster_members, CACHED_MEMBERS)
+
+    def test_read(self):
+        ali = self.read_alignment(use_cache=True)
+        parsed = self.read_alignment()
+        self.assertEqual(list(ali.ids), list(parsed.ids))
+        self.assertTrue(np.array_equal(ali.matrix, parsed.matrix))
+        self.assertTrue(np.array_equal(
+            ali.matrix_mapped, parsed.matrix_mapped
+        ))
+        self.assertTrue(self.uses_cache())
+
+        # compact alignment uses memory-mapped codes
+        ali = self.read_alignment(use_cache=True, compact=True)
+        self.assertTrue(np.array_equal(ali.matrix, self.ali.matrix))
+
+    def test_disabled(self):
+        # cache is only used on request
+        ali = self.read_alignment()
+        ali.set_weights(0.8)
+        self.assertFalse(np.array_equal(
+            ali.num_cluster_members, CACHED_MEMBERS
+        ))
+
+    def test_other_threshold(self):
+        ali = self.read_alignment(use_cache=True)
+        ali.set_weights(0.9)
+        self.assertFalse(np.array_equal(
+            ali.num_cluster_members, CACHED_MEMBERS
+        ))
+
+    def test_lsh(self):
+        # cached weights are exact, so approximate weights
+        # (and their error estimate) are computed from scratch
+        ali = self.read_alignment(use_cache=True)
+        ali.set_weights(0.8, method="lsh", random_state=0)
+        self.assertFalse(np.array_equal(
+            ali.num_cluster_members, CACHED_MEMBERS
+        ))
+        self.assertIsNotNone(ali.weights_error)
+
+    def test_other_alphabet(self):
+        # weights depend on mapping to alphabet
+        ali = self.read_alignment(use_cache=True, alphabet="-ACDEF")
+        ali.set_weights(0.8)
+        self.assertFalse(np.array_equal(
+            ali.num_cluster_members, CACHED_MEMBERS
+        ))
+
+    def test_size_changed(self):
+        ali = Alignment.from_dict(dict(SEQUENCES + [("seq6", "ACDEFGHIKL")]))
+        self.write_alignment(ali)
+
+        self.assertIsNone(read_alignment_cache(self.filename))
+        self.assertFalse(self.uses_cache())
+        self.assertEqual(len(self.read_alignment(use_cache=True)), 6)
+
+    def test_mtime_changed(self):
+        # same content with new modification time is still valid
+        stat = os.stat(self.filename)
+        os.utime(
+            self.filename,
+            ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9)
+        )
+        self.assertIsNotNone(read_alignment_cache(self.filename))
+        self.assertTrue(self.uses_cache())
+
+    def test_content_changed(self):
+        # same size but different content
+        stat = os.stat(self.filename)
+        ali = Alignment.from_dict(
+            dict(SEQUENCES[:-1] + [("seq5", "ACDEFGHIKL")])
+        )
+        self.write_alignment(ali)
+        os.utime(
+            self.filename,
+            ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9)
+        )
+        self.assertEqual(os.stat(self.filename).st_size, stat.st_size)
+
+        self.assertIsNone(read_alignment_cache(self.filename))
+        self.assertFalse(self.uses_cache())
+        self.assertEqual(
+            "".join(self.read_alignment(use_cache=True).matrix[-1]),
+            "ACDEFGHIKL"
+        )
+
+    def test_focus_columns(self):
+        self.ali.write_cache(
+            self.filename, focus_columns=FOCUS_COLUMNS,
+            num_cluster_members={0.8: CACHED_MEMBERS}
+        )
+
+        # weights were computed on focus columns, and
+        # are not valid for the full alignment
+        ali = self.read_alignment(use_cache=True)
+        ali.set_weights(0.8)
+        self.assertFalse(np.array_equal(
+            ali.num_cluster_members, CACHED_MEMBERS
+        ))
+
+        # selecting focus columns carries weights over,
+        # both as index and as boolean mask
+        mask = np.zeros(ali.L, dtype=bool)
+        mask[FOCUS_COLUMNS] = True
+        for columns in [FOCUS_COLUMNS, mask]:
+            focus_ali = self.read_alignment(use_cache=True).select(
+                columns=columns, view=True
+            )
+            focus_ali.set_weights(0.8)
+            self.assertTrue(np.array_equal(
+                focus_ali.num_cluster_members, CACHED_MEMBERS
+            ))
+
+        # other columns or subsets of sequences do not
+        for kwargs in [
+            {"columns": FOCUS_COLUMNS[1:]},
+            {"columns": FOCUS_COLUMNS, "sequences": np.arange(4)},
+        ]:
+            other_ali = self.read_alignment(use_cache=True).select(
+                view=True, **kwargs
+            )
+            other_ali.set_weights(0.8)
+            self.assertFalse(np.all(other_ali.num_cluster_members == 7))
+
+        # selecting all columns and sequences keeps focus columns,
+        # so they are still carried over by a second selection
+        ali = self.read_alignment(use_cache=True).select(view=True)
+        focus_ali = ali.select(columns=FOCUS_COLUMNS, view=True)
+        focus_ali.set_weights(0.8)
+        self.assertTrue(np.array_equal(
+            focus_ali.num_cluster_members, CACHED_MEMBERS
+        ))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import re
+import unittest
+from collections import OrderedDict
+from io import StringIO
+from unittest import TestCase
+
+import pandas as pd
+
+from evcouplings.align.alignment import Alignment
+from evcouplings.align.protocol import (
+    extract_header_annotation, extract_stockholm_annotation,
+    parse_header_annotation
+)
+
+STOCKHOLM = """# STOCKHOLM 1.0
+#=GS UniRef100_A0A000/1-6 DE [subseq from] Protein A n=2 Tax=Escherichia coli TaxID=562 RepID=A0A000_ECOLX
+#=GS UniRef100_B0B000/2-7 DE Protein B n=1 Tax=Bacillus subtilis RepID=B0B000_BACSU
+#=GS UniRef100_C0C000/1-6 DE Protein C fragment
+UniRef100_A0A000/1-6 MKV-LA
+UniRef100_B0B000/2-7 MRV-LS
+UniRef100_C0C000/1-6 MKVQLA
+UniRef100_D0D000/1-6 MKVQLG
+//
+"""
+
+
+def parse_header_annotation_reference(ids, annotations):
+    """
+    Previous line-by-line implementation of header
+    annotation splitting (reference for results)
+    """
+    col_to_descr = OrderedDict([
+        ("GN", "gene"),
+        ("OS", "organism"),
+        ("PE", "existence_evidence"),
+        ("SV", "sequence_version"),
+        ("n", "num_cluster_members"),
+        ("Tax", "taxon"),
+        ("RepID", "representative_member")
+    ])
+    regex = re.compile(r"\s({})=".format("|".join(col_to_descr.keys())))
+
+    res = []
+    for seq_id, anno in zip(ids, annotations):
+        if anno is not None:
+            pairs = ["id", seq_id, "name"] + re.split(regex, anno)
+            res.append(dict(zip(pairs[::2], pairs[1::2])))
+        else:
+            res.append({"id": seq_id})
+
+    return pd.DataFrame(res).reindex(
+        columns=["id", "name"] + list(col_to_descr.keys())
+    )
+
+
+class TestHeaderAnnotation(TestCase):
+
+    def assertFrameEqual(self, a, b):
+        pd.testing.assert_frame_equal(
+            a.astype(object).where(a.notnull(), None),
+            b.astype(object).where(b.notnull(), None),
+        )
+
+    def test_parse_header_annotation(self):
+        ids = ["s1", "s2", "s3", "s4", "s5", "s6"]
+        annotations = [
+            "Protein A n=2 Tax=Escherichia coli RepID=A0A000_ECOLX",
+            None,
+            "",
+            "Protein B n=1 n=3 Tax=Bacillus subtilis",
+            "Uncharacterized protein OS=Homo sapiens GN=ABC1 PE=1 SV=2",
+            "No fields at all",
+        ]
+
+        self.assertFrameEqual(
+            parse_header_annotation(ids, annotations),
+            parse_header_annotation_reference(ids, annotations)
+        )
+
+    def test_no_annotation(self):
+        ids = ["s1", "s2"]
+        self.assertFrameEqual(
+            parse_header_annotation(ids, [None, None]),
+            parse_header_annotation_reference(ids, [None, None])
+        )
+
+    def test_stockholm_annotation(self):
+        with StringIO(STOCKHOLM) as f:
+            streamed = extract_stockholm_annotation(f)
+
+        with StringIO(STOCKHOLM) as f:
+            ali = Alignment.from_file(f, format="stockholm")
+
+        self.assertFrameEqual(streamed, extract_header_annotation(ali))
+        self.assertEqual(
+            streamed["n"].tolist()[:2], ["2", "1"]
+        )
+        self.assertTrue(streamed["n"].iloc[2:].isnull().all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+from io import BytesIO, StringIO
+from unittest import TestCase
+
+import numpy as np
+
+from evcouplings.align.alignment import (
+    Alignment, detect_compression, detect_format, read_fasta
+)
+
+ALIGNMENT = """>seq1/1-8
+MKVLA-GT
+>seq2/3-10
+MKVIA-GS
+>seq3
+MRVLAQGT
+"""
+
+
+class TestCompression(TestCase):
+
+    def setUp(self):
+        with StringIO(ALIGNMENT) as f:
+            self.ali = Alignment.from_file(f)
+
+        self.tempdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def _write(self, compression):
+        filename = os.path.join(
+            self.tempdir.name, "ali_{}.a2m".format(compression)
+        )
+        with open(filename, "wb") as f:
+            self.ali.write(f, compression=compression)
+
+        return filename
+
+    def test_round_trip(self):
+        for compression in ["gzip", "bz2"]:
+            filename = self._write(compression)
+
+            with open(filename) as f:
+                self.assertEqual(detect_compression(f), compression)
+                self.assertEqual(detect_format(f), "fasta")
+                f.seek(0)
+                ali = Alignment.from_file(f)
+
+            self.assertEqual(list(ali.ids), list(self.ali.ids))
+            self.assertTrue(np.array_equal(ali.matrix, self.ali.matrix))
+
+            with open(filename) as f:
+                self.assertEqual(
+                    [seq_id for seq_id, _ in read_fasta(f)],
+                    list(self.ali.ids)
+                )
+
+    def test_uncompressed(self):
+        with BytesIO(ALIGNMENT.encode()) as f:
+            self.assertIsNone(detect_compression(f))
+
+    def test_invalid_compression(self):
+        with self.assertRaises(ValueError):
+            self.ali.write(BytesIO(), compression="zip")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,397 @@
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+
+import numpy as np
+
+from evcouplings.align.alignment import Alignment
+from evcouplings.couplings.mean_field import direct_information, MeanFieldDCA
+from evcouplings.couplings.model import CouplingsModel, convert_model_file
+
+ALPHABET = "-ACDE"
+
+
+def random_model(filename, L=7, N=20, first_index=10, seed=0):
+    """
+    Write random model in plmc_v2 format, and return dense
+    parameters (full L x L x q x q pair matrices) for reference
+    computations
+    """
+    rng = np.random.RandomState(seed)
+    q = len(ALPHABET)
+
+    target_seq = "".join(rng.choice(list(ALPHABET[1:]), L))
+    index_list = np.arange(first_index, first_index + L, dtype="int32")
+    weights = rng.rand(N).astype("float32")
+    f_i = rng.dirichlet(np.ones(q), L).astype("float32")
+    h_i = rng.randn(L, q).astype("float32")
+
+    i, j = np.triu_indices(L, k=1)
+    f_ij_blocks = rng.dirichlet(np.ones(q * q), len(i)).astype("float32")
+    f_ij_blocks = f_ij_blocks.reshape(-1, q, q)
+    # zero entries (excluded from mutual information)
+    f_ij_blocks[::3, 0, :] = 0
+    J_ij_blocks = rng.randn(len(i), q, q).astype("float32")
+
+    with open(filename, "wb") as f:
+        np.array([L, q, N, 0, 50], dtype="int32").tofile(f)
+        np.array([0.8, 0.01, 0.2, 100, 12.5], dtype="float32").tofile(f)
+        np.frombuffer(ALPHABET.encode(), dtype="S1").tofile(f)
+        weights.tofile(f)
+        np.frombuffer(target_seq.encode(), dtype="S1").tofile(f)
+        index_list.tofile(f)
+        f_i.tofile(f)
+        h_i.tofile(f)
+        f_ij_blocks.tofile(f)
+        J_ij_blocks.tofile(f)
+
+    def _dense(blocks):
+        matrix = np.zeros((L, L, q, q))
+        matrix[i, j] = blocks
+        matrix[j, i] = blocks.transpose(0, 2, 1)
+        return matrix
+
+    return {
+        "L": L, "target_seq": target_seq, "index_list": index_list,
+        "weights": weights, "f_i": f_i.astype(np.float64),
+        "h_i": h_i.astype(np.float64),
+        "f_ij": _dense(f_ij_blocks), "J_ij": _dense(J_ij_blocks),
+    }
+
+
+def energy(params, seq):
+    """
+    Dense reference of statistical energy of a sequence
+    (couplings, fields)
+    """
+    A = [ALPHABET.index(c) for c in seq]
+    L = params["L"]
+
+    E_J = sum(
+        params["J_ij"][i, j, A[i], A[j]]
+        for i in range(L) for j in range(i + 1, L)
+    )
+    E_h = sum(params["h_i"][i, A[i]] for i in range(L))
+
+    return np.array([E_J + E_h, E_J, E_h])
+
+
+def mutate(seq, *substitutions):
+    seq = list(seq)
+    for pos, subs in substitutions:
+        seq[pos] = subs
+
+    return "".join(seq)
+
+
+def apc(matrix):
+    L = matrix.shape[0]
+    col_means = matrix.sum(axis=0) / (L - 1)
+    corrected = matrix - np.outer(col_means, col_means) / (
+        matrix.sum() / (L * (L - 1))
+    )
+    corrected[np.diag_indices(L)] = 0
+    return corrected
+
+
+class TestCouplingsModel(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.model_file = self._path("model.plmc_v2")
+        self.params = random_model(self.model_file)
+        self.c = CouplingsModel(self.model_file)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self.tempdir.name, name)
+
+    def test_pair_parameters(self):
+        p = self.params
+        for i, j in [(0, 1), (1, 0), (2, 6), (6, 2), (3, 3)]:
+            pos_i, pos_j = p["index_list"][i], p["index_list"][j]
+            self.assertTrue(np.allclose(self.c.Jij(pos_i, pos_j), p["J_ij"][i, j]))
+            self.assertTrue(np.allclose(self.c.fij(pos_i, pos_j), p["f_ij"][i, j]))
+            self.assertAlmostEqual(
+                float(self.c.Jij(pos_i, pos_j, "A", "E")),
+                p["J_ij"][i, j, 1, 4], places=6
+            )
+
+        self.assertTrue(np.allclose(np.asarray(self.c.J_ij), p["J_ij"]))
+        self.assertTrue(np.allclose(np.asarray(self.c.f_ij), p["f_ij"]))
+        self.assertTrue(np.allclose(self.c.J_ij[4, 1], p["J_ij"][4, 1]))
+        self.assertTrue(np.allclose(self.c.J_ij[:, 2, 0], p["J_ij"][:, 2, 0]))
+
+    def test_hamiltonians(self):
+        rng = np.random.RandomState(1)
+        seqs = [
+            "".join(rng.choice(list(ALPHABET), self.params["L"]))
+            for _ in range(5)
+        ]
+        self.assertTrue(np.allclose(
+            self.c.hamiltonians(seqs),
+            [energy(self.params, s) for s in seqs]
+        ))
+
+    def test_single_mutants(self):
+        p = self.params
+        target = p["target_seq"]
+        E_0 = energy(p, target)
+
+        ref = np.array([
+            [energy(p, mutate(target, (i, a))) - E_0 for a in ALPHABET]
+            for i in range(p["L"])
+        ])
+        self.assertTrue(np.allclose(self.c.single_mut_mat_full, ref))
+
+        subs = [(p["index_list"][1], target[1], "D"), (p["index_list"][5], target[5], "-")]
+        self.assertTrue(np.allclose(
+            self.c.delta_hamiltonian(subs),
+            energy(p, mutate(target, (1, "D"), (5, "-"))) - E_0
+        ))
+
+    def test_double_mutants(self):
+        p = self.params
+        target = p["target_seq"]
+        E_0 = energy(p, target)[0]
+
+        dmm = self.c.double_mut_mat
+        for i, j in [(0, 1), (2, 5), (6, 3)]:
+            ref = np.array([
+                [energy(p, mutate(target, (i, a), (j, b)))[0] - E_0 for b in ALPHABET]
+                for a in ALPHABET
+            ])
+            self.assertTrue(np.allclose(dmm[i, j], ref))
+
+    def test_ecs(self):
+        p = self.params
+        L = p["L"]
+
+        J_0 = (
+            p["J_ij"] - p["J_ij"].mean(axis=2, keepdims=True) -
+            p["J_ij"].mean(axis=3, keepdims=True) +
+            p["J_ij"].mean(axis=(2, 3), keepdims=True)
+        )
+        fn = np.sqrt((J_0 ** 2).sum(axis=(2, 3)))
+
+        m = p["f_i"][:, np.newaxis, :, np.newaxis] * p["f_i"][np.newaxis, :, np.newaxis, :]
+        f_ij = p["f_ij"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mi = np.where(f_ij > 0, f_ij * np.log(f_ij / m), 0).sum(axis=(2, 3))
+        mi[np.diag_indices(L)] = 0
+
+        ecs = self.c.ecs
+        self.assertEqual(len(ecs), L * (L - 1) // 2)
+        self.assertTrue((np.diff(ecs.cn) <= 0).all())
+
+        i = ecs.i.values - p["index_list"][0]
+        j = ecs.j.values - p["index_list"][0]
+        self.assertTrue((i < j).all())
+        self.assertTrue(np.allclose(ecs.fn, fn[i, j]))
+        self.assertTrue(np.allclose(ecs.cn, apc(fn)[i, j]))
+        self.assertTrue(np.allclose(ecs.mi_raw, mi[i, j]))
+        self.assertTrue(np.allclose(ecs.mi_apc, apc(mi)[i, j]))
+        self.assertTrue((ecs.seqdist == j - i).all())
+        self.assertEqual(
+            list(ecs.A_i), [p["target_seq"][k] for k in i]
+        )
+
+        # scores do not depend on block size
+        self.c._calculate_ecs(block_size=2)
+        self.assertTrue(np.array_equal(self.c.ecs.fn.values, ecs.fn.values))
+
+    def test_ecs_custom_index(self):
+        L = self.params["L"]
+        ecs = self.c.ecs
+        pos = {k: n for n, k in enumerate(self.c.index_list)}
+
+        # plain list of sequence indices
+        self.c.index_list = [10 * k for k in range(L)]
+        ecs_list = self.c.ecs
+        self.assertTrue(np.array_equal(ecs_list.cn.values, ecs.cn.values))
+        self.assertEqual(
+            list(ecs_list.i), [10 * pos[k] for k in ecs.i]
+        )
+        self.assertTrue(np.allclose(ecs_list.seqdist, 10 * ecs.seqdist))
+
+        # segment tuples as assigned by SegmentIndexMapper
+        segments = (
+            [("A", k) for k in range(L - 3)] + [("B", k) for k in range(3)]
+        )
+        self.c.index_list = segments
+        ecs_segments = self.c.ecs
+        self.assertTrue(np.array_equal(ecs_segments.cn.values, ecs.cn.values))
+        self.assertEqual(
+            list(ecs_segments.j), [segments[pos[k]] for k in ecs.j]
+        )
+        self.assertTrue(ecs_segments.seqdist.isnull().all())
+
+    def assertModelEqual(self, a, b, weights=True):
+        for attr in ["L", "num_symbols", "index_list", "target_seq", "alphabet"]:
+            self.assertTrue(np.array_equal(getattr(a, attr), getattr(b, attr)))
+
+        params = ["f_i", "h_i", "_f_ij_blocks", "_J_ij_blocks"]
+        if weights:
+            params.append("weights")
+
+        for attr in params:
+            self.assertTrue(np.array_equal(getattr(a, attr), getattr(b, attr)))
+
+    def test_plmc_v2_round_trip(self):
+        self.c.to_file(self._path("out.plmc_v2"), file_format="plmc_v2")
+        c = CouplingsModel(self._path("out.plmc_v2"))
+        self.assertModelEqual(self.c, c)
+        self.assertAlmostEqual(c.N_eff, 12.5)
+
+        with open(self.model_file, "rb") as f1, open(self._path("out.plmc_v2"), "rb") as f2:
+            self.assertEqual(f1.read(), f2.read())
+
+    def test_plmc_v1_round_trip(self):
+        self.c.to_file(self._path("out.plmc_v1"), file_format="plmc_v1")
+        c = CouplingsModel(
+            self._path("out.plmc_v1"), file_format="plmc_v1", alphabet=ALPHABET
+        )
+        self.assertModelEqual(self.c, c, weights=False)
+        self.assertIsNone(c.weights)
+
+        # truncated file
+        with open(self._path("out.plmc_v1"), "rb") as f:
+            data = f.read()
+
+        with open(self._path("truncated.plmc_v1"), "wb") as f:
+            f.write(data[:-4])
+
+        with self.assertRaises(ValueError):
+            CouplingsModel(
+                self._path("truncated.plmc_v1"), file_format="plmc_v1",
+                alphabet=ALPHABET
+            )
+
+    def test_npy_round_trip(self):
+        npy_file = self._path("model.npy")
+        convert_model_file(self.model_file, npy_file)
+
+        for mmap_mode in [None, "r"]:
+            c = CouplingsModel(npy_file, file_format="npy", mmap_mode=mmap_mode)
+            self.assertModelEqual(self.c, c)
+            self.assertAlmostEqual(c.lambda_h, 0.01)
+            self.assertTrue(np.allclose(c.cn_scores, self.c.cn_scores))
+
+        c = CouplingsModel(npy_file, file_format="npy", mmap_mode="r")
+        self.assertFalse(c._J_ij_blocks.flags.writeable)
+
+        # back to plmc_v2 without changes
+        convert_model_file(
+            npy_file, self._path("back.plmc_v2"), in_format="npy",
+            out_format="plmc_v2"
+        )
+        with open(self.model_file, "rb") as f1, open(self._path("back.plmc_v2"), "rb") as f2:
+            self.assertEqual(f1.read(), f2.read())
+
+        with self.assertRaises(ValueError):
+            CouplingsModel(self.model_file, file_format="npy")
+
+        with self.assertRaises(ValueError):
+            CouplingsModel(self.model_file, mmap_mode="r")
+
+    def test_lazy_components(self):
+        c = CouplingsModel(self.model_file, components=["h_i"])
+        self.assertIn("h_i", c.__dict__)
+        self.assertNotIn("_J_ij_blocks", c.__dict__)
+
+        self.assertTrue(np.allclose(c.single_mut_mat_full, self.c.single_mut_mat_full))
+        self.assertIn("_J_ij_blocks", c.__dict__)
+        self.assertModelEqual(self.c, c)
+
+        with self.assertRaises(ValueError):
+            CouplingsModel(self.model_file, components=["J"])
+
+        with self.assertRaises(AttributeError):
+            c.nonexistent_attribute
+
+    def test_stale_file(self):
+        for file_format in ["plmc_v2", "npy"]:
+            model_file = self._path("stale." + file_format)
+            self.c.to_file(model_file, file_format=file_format)
+
+            c = CouplingsModel(model_file, file_format=file_format, components=[])
+            stat = os.stat(model_file)
+            os.utime(model_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+            with self.assertRaises(ValueError):
+                c.J_ij
+
+    def test_truncated_file(self):
+        with open(self.model_file, "rb") as f:
+            data = f.read()
+
+        with open(self._path("truncated.plmc_v2"), "wb") as f:
+            f.write(data[:-4])
+
+        with self.assertRaises(ValueError):
+            CouplingsModel(self._path("truncated.plmc_v2"), components=[])
+
+    def test_independent_model(self):
+        c = CouplingsModel(self.model_file, components=[])
+        c0 = c.to_independent_model()
+        self.assertTrue(np.array_equal(np.asarray(c0.J_ij), np.zeros_like(self.params["J_ij"])))
+        self.assertTrue(np.allclose(
+            c0.single_mut_mat_full,
+            self.c.to_independent_model().single_mut_mat_full
+        ))
+
+
+class TestDirectInformation(TestCase):
+
+    def test_dense_couplings(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            model_file = os.path.join(tempdir, "model.plmc_v2")
+            params = random_model(model_file)
+            c = CouplingsModel(model_file)
+
+        di = direct_information(params["J_ij"], params["f_i"])
+        self.assertEqual(di.shape, (params["L"], params["L"]))
+        self.assertTrue(np.allclose(di, di.T))
+
+        # view on triangular storage gives same result
+        self.assertTrue(np.allclose(direct_information(c.J_ij, params["f_i"]), di))
+
+        with self.assertRaises(ValueError):
+            direct_information(c._J_ij_blocks, params["f_i"])
+
+
+class TestMeanFieldCouplingsModel(TestCase):
+
+    def test_pair_frequencies(self):
+        rng = np.random.RandomState(2)
+        sequences = np.array(list(ALPHABET))[rng.randint(0, 5, (30, 6))]
+        # no gaps in target sequence, so all columns are used
+        sequences[0] = list("ACDEAC")
+
+        for engine in ["loop", "blas"]:
+            # region of target sequence taken from first header
+            ids = ["query/1-6"] + ["seq{}".format(k) for k in range(29)]
+            ali = Alignment(sequences, ids, alphabet=ALPHABET)
+            ali.pair_frequency_engine = engine
+            dca = MeanFieldDCA(ali)
+            model = dca.fit(pseudo_count=0.5)
+
+            # blocks (i, i) contain single-site frequencies
+            # like the alignment pair frequencies
+            f_ij = model.f_ij
+            for i in range(model.L):
+                self.assertTrue(np.allclose(
+                    f_ij[i, i], np.diag(model.f_i[i])
+                ))
+
+            self.assertTrue(np.allclose(
+                np.asarray(f_ij),
+                np.asarray(dca.alignment.pair_frequencies)
+            ))
+
+
+if __name__ == '__main__':
+    unittest.main()
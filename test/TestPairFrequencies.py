@@ -0,0 +1,208 @@
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+
+import numpy as np
+
+from evcouplings.align.alignment import (
+    frequencies, pair_frequencies, pair_frequencies_blas,
+    PairFrequencies, pair_tiles
+)
+from evcouplings.couplings.mean_field import (
+    compute_covariance_matrix, compute_covariance_matrix_tiled
+)
+
+NUM_SYMBOLS = 5
+
+
+def random_alignment(num_seqs=40, length=11, seed=0):
+    """
+    Random mapped alignment matrix and sequence weights
+    """
+    rng = np.random.RandomState(seed)
+    matrix = rng.randint(0, NUM_SYMBOLS, (num_seqs, length))
+    weights = rng.rand(num_seqs) + 0.5
+
+    return matrix, weights
+
+
+class TestPairFrequencies(TestCase):
+
+    def setUp(self):
+        self.matrix, self.weights = random_alignment()
+        self.L = self.matrix.shape[1]
+        self.fi = frequencies(self.matrix, self.weights, NUM_SYMBOLS)
+        self.fij = pair_frequencies(
+            self.matrix, self.weights, NUM_SYMBOLS, self.fi
+        )
+        self.pf = pair_frequencies_blas(
+            self.matrix, self.weights, NUM_SYMBOLS, self.fi, block_size=4
+        )
+
+    def test_dense(self):
+        self.assertEqual(self.pf.shape, self.fij.shape)
+        self.assertEqual(self.pf.ndim, 4)
+        self.assertEqual(len(self.pf), self.L)
+        self.assertTrue(np.allclose(np.asarray(self.pf), self.fij))
+        self.assertEqual(
+            np.asarray(self.pf, dtype=np.float32).dtype, np.float32
+        )
+
+    def test_block_sizes(self):
+        # block sizes that do and do not divide the
+        # length, and a single tile covering all positions
+        for block_size in [1, 3, 4, self.L, 100]:
+            pf = pair_frequencies_blas(
+                self.matrix, self.weights, NUM_SYMBOLS, self.fi,
+                block_size=block_size
+            )
+            self.assertTrue(np.allclose(np.asarray(pf), self.fij))
+
+    def test_tiles(self):
+        # tiles cover each pair of positions i <= j exactly once
+        covered = np.zeros((self.L, self.L), dtype=int)
+        for start_i, end_i, start_j, end_j in pair_tiles(self.L, 4):
+            self.assertLessEqual(start_i, start_j)
+            covered[start_i:end_i, start_j:end_j] += 1
+            self.assertTrue(np.allclose(
+                self.pf.tile(start_i, end_i, start_j, end_j),
+                self.fij[start_i:end_i, start_j:end_j]
+            ))
+
+        self.assertTrue(np.all(covered[np.triu_indices(self.L)] == 1))
+
+    def test_float32(self):
+        pf = pair_frequencies_blas(
+            self.matrix, self.weights, NUM_SYMBOLS, self.fi,
+            dtype=np.float32, block_size=4
+        )
+        self.assertEqual(pf.dtype, np.float32)
+        self.assertEqual(pf[0, 1].dtype, np.float32)
+        self.assertEqual(pf[2, 2].dtype, np.float32)
+        self.assertTrue(np.allclose(np.asarray(pf), self.fij, atol=1e-6))
+
+    def test_file(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            filename = os.path.join(tempdir, "fij.npy")
+            pf = pair_frequencies_blas(
+                self.matrix, self.weights, NUM_SYMBOLS, self.fi,
+                block_size=4, filename=filename
+            )
+            self.assertIsInstance(pf.blocks, np.memmap)
+            self.assertTrue(np.allclose(np.asarray(pf), self.fij))
+
+            # file contains triangular storage of frequencies
+            stored = np.load(filename)
+            self.assertTrue(np.array_equal(stored, pf.blocks))
+            del pf, stored
+
+    def test_indexing(self):
+        L = self.L
+        mask = np.arange(L) % 3 == 0
+
+        keys = [
+            # single pairs above, below and on diagonal
+            (0, 1), (7, 2), (3, 3), (-1, 0), (-2, -2),
+            # single pair with symbol indices
+            (1, 4, 2, 3), (4, 1, 2, 3), (2, 2, 1, 1), (2, 2, 0, 1),
+            (1, 4, slice(1, 3)), (1, 4, [0, 2], [1, 3]),
+            # single position
+            (5,), (-3,),
+            # slices, including mirrored lower triangle and steps
+            (slice(None),), (slice(2, 8),), (slice(None, None, -1),),
+            (slice(8, 2, -2), slice(1, 9, 3)), (3, slice(None)),
+            (slice(None), 3),
+            # integer and boolean arrays, including duplicates
+            (np.array([5, 1, 1, 9]),), (np.array([5, 1]), np.array([0, 5])),
+            (mask,), (mask, slice(1, None)), (~mask, 2), ([0, -1], 4),
+            (np.array([[0, 1], [2, 3]]), np.array([[3, 2], [1, 0]])),
+            (slice(None), slice(None), 0, 1),
+        ]
+
+        for key in keys:
+            self.assertTrue(
+                np.allclose(self.pf[key], self.fij[key]),
+                msg="mismatch for key {}".format(key)
+            )
+            self.assertEqual(
+                np.shape(self.pf[key]), np.shape(self.fij[key]),
+                msg="shape mismatch for key {}".format(key)
+            )
+
+        # integer key without tuple
+        self.assertTrue(np.allclose(self.pf[4], self.fij[4]))
+
+    def test_diagonal(self):
+        for i in range(self.L):
+            self.assertTrue(np.allclose(self.pf[i, i], np.diag(self.fi[i])))
+
+    def test_invalid_index(self):
+        with self.assertRaises(IndexError):
+            self.pf[self.L, 0]
+
+        with self.assertRaises(IndexError):
+            self.pf[[0, self.L]]
+
+        with self.assertRaises(IndexError):
+            self.pf[0, 0, 0, 0, 0]
+
+        with self.assertRaises(ValueError):
+            PairFrequencies(self.pf.blocks[1:], self.fi)
+
+    def test_transform(self):
+        scale, offset = 0.7, 0.01
+        fi_transformed = self.fi * scale + offset
+        transformed = self.pf.transform(scale, offset, fi_transformed)
+
+        # storage is shared, not copied
+        self.assertIs(transformed.blocks, self.pf.blocks)
+
+        expected = self.fij * scale + offset
+        for i in range(self.L):
+            expected[i, i] = np.diag(fi_transformed[i])
+
+        self.assertTrue(np.allclose(np.asarray(transformed), expected))
+        self.assertTrue(np.allclose(transformed[3, 1], expected[3, 1]))
+        self.assertTrue(np.allclose(
+            transformed.tile(0, 4, 4, 8), expected[0:4, 4:8]
+        ))
+
+        # transformations are composed
+        twice = transformed.transform(2.0, 0.5, fi_transformed)
+        expected_twice = (self.fij * scale + offset) * 2.0 + 0.5
+        self.assertTrue(np.allclose(twice[0, 5], expected_twice[0, 5]))
+        self.assertTrue(np.allclose(twice[5, 0], expected_twice[5, 0]))
+
+
+class TestCovarianceMatrix(TestCase):
+
+    def test_tiled(self):
+        matrix, weights = random_alignment()
+        fi = frequencies(matrix, weights, NUM_SYMBOLS)
+        fij = pair_frequencies(matrix, weights, NUM_SYMBOLS, fi)
+        dense = compute_covariance_matrix(fi, fij)
+
+        for block_size in [1, 4, 100]:
+            pf = pair_frequencies_blas(
+                matrix, weights, NUM_SYMBOLS, fi, block_size=block_size
+            )
+            tiled = compute_covariance_matrix_tiled(fi, pf)
+            self.assertTrue(np.allclose(tiled, dense))
+
+            # also with transformed frequencies (as used for pseudo-counts)
+            fi_transformed = fi * 0.9 + 0.02
+            fij_transformed = fij * 0.9 + 0.004
+            for i in range(fi.shape[0]):
+                fij_transformed[i, i] = np.diag(fi_transformed[i])
+
+            self.assertTrue(np.allclose(
+                compute_covariance_matrix_tiled(
+                    fi_transformed, pf.transform(0.9, 0.004, fi_transformed)
+                ),
+                compute_covariance_matrix(fi_transformed, fij_transformed)
+            ))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+from unittest.mock import patch
+
+import numpy as np
+
+from evcouplings.align import index
+from evcouplings.align.index import SequenceIndex, INDEX_SUFFIX
+
+DATABASE = """>sp|P12345|AAA_HUMAN Protein A
+ACDEFGHIKL
+MNPQ
+>tr|Q99999|BBB_MOUSE Protein B
+WWWW
+>UniRef100_P54321 Cluster C
+KLMN
+>plain Sequence D
+;comment
+ACAC
+>plain Duplicate identifier
+GGGG
+"""
+
+
+class TestSequenceIndex(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.database = os.path.join(self.tempdir.name, "db.fasta")
+        self.write_database(DATABASE)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def write_database(self, content):
+        with open(self.database, "w") as f:
+            f.write(content)
+
+    def test_fetch(self):
+        idx = SequenceIndex(self.database)
+        self.assertEqual(len(idx), 5)
+
+        # lookup by id, accession and entry name
+        for key in ["sp|P12345|AAA_HUMAN", "P12345", "AAA_HUMAN"]:
+            self.assertEqual(
+                idx.fetch(key),
+                ("sp|P12345|AAA_HUMAN Protein A", "ACDEFGHIKLMNPQ")
+            )
+
+        self.assertEqual(idx.fetch("P54321")[1], "KLMN")
+        self.assertEqual(
+            idx.header("BBB_MOUSE"), "tr|Q99999|BBB_MOUSE Protein B"
+        )
+
+        # first sequence with identifier, without comment lines
+        self.assertEqual(idx.fetch("plain"), ("plain Sequence D", "ACAC"))
+
+        self.assertIn("Q99999", idx)
+        self.assertNotIn("P00000", idx)
+        with self.assertRaises(KeyError):
+            idx.fetch("P00000")
+
+    def test_mapping(self):
+        idx = SequenceIndex(self.database)
+        self.assertEqual(
+            idx.mapping(),
+            {"P12345": "AAA_HUMAN", "Q99999": "BBB_MOUSE"}
+        )
+
+        with self.assertRaises(ValueError):
+            idx.mapping(from_field="gene")
+
+    def test_chunks(self):
+        # building index from many small chunks gives same table
+        table = SequenceIndex(self.database).table
+        for chunk_size in [1, 2, 5]:
+            with patch.object(index, "INDEX_CHUNK_SIZE", chunk_size):
+                chunked = SequenceIndex(self.database, rebuild=True).table
+
+            self.assertEqual(chunked.dtype, table.dtype)
+            self.assertTrue(np.array_equal(chunked, table))
+
+    def test_empty(self):
+        self.write_database("")
+        idx = SequenceIndex(self.database)
+        self.assertEqual(len(idx), 0)
+        self.assertNotIn("plain", idx)
+
+    def test_stored(self):
+        SequenceIndex(self.database)
+        self.assertTrue(os.path.isfile(self.database + INDEX_SUFFIX))
+
+        # valid index is memory-mapped rather than rebuilt
+        with patch.object(SequenceIndex, "_build") as build:
+            idx = SequenceIndex(self.database)
+            build.assert_not_called()
+
+        self.assertIsInstance(idx.table, np.memmap)
+        self.assertEqual(idx.fetch("P54321")[1], "KLMN")
+
+    def test_size_changed(self):
+        SequenceIndex(self.database)
+        self.write_database(DATABASE + ">new_seq\nPPPP\n")
+
+        idx = SequenceIndex(self.database)
+        self.assertEqual(len(idx), 6)
+        self.assertEqual(idx.fetch("new_seq")[1], "PPPP")
+
+    def test_mtime_changed(self):
+        SequenceIndex(self.database)
+        stat = os.stat(self.database)
+
+        # same size, but different identifier
+        self.write_database(DATABASE.replace("P12345", "P12346"))
+        os.utime(
+            self.database,
+            ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9)
+        )
+        self.assertEqual(os.stat(self.database).st_size, stat.st_size)
+
+        idx = SequenceIndex(self.database)
+        self.assertIn("P12346", idx)
+        self.assertNotIn("P12345", idx)
+
+    def test_compressed(self):
+        with open(self.database, "wb") as f:
+            f.write(b"\x1f\x8b\x08\x00")
+
+        with self.assertRaises(ValueError):
+            SequenceIndex(self.database)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,279 @@
+import unittest
+from unittest import TestCase
+
+import numpy as np
+
+from evcouplings.align.alignment import (
+    Alignment, ALPHABET_PROTEIN, num_cluster_members,
+    num_cluster_members_lsh, estimate_weights_error, identity_filter
+)
+
+
+def random_matrix(num_seqs, length, seed=0):
+    """
+    Random mapped alignment matrix of sequences derived from
+    a common ancestor with varying mutation rates
+    """
+    rng = np.random.RandomState(seed)
+
+    ancestor = rng.randint(0, 21, length)
+    matrix = np.tile(ancestor, (num_seqs, 1))
+    mutated = rng.rand(num_seqs, length) < rng.rand(num_seqs, 1) * 0.5
+    matrix[mutated] = rng.randint(0, 21, mutated.sum())
+
+    return matrix
+
+
+def num_cluster_members_reference(matrix, identity_threshold,
+                                  multiplicity=None):
+    """
+    Dense reference implementation of num_cluster_members
+    """
+    if multiplicity is None:
+        multiplicity = np.ones(matrix.shape[0])
+
+    identities = (matrix[:, np.newaxis, :] == matrix[np.newaxis]).mean(axis=2)
+    return (identities >= identity_threshold).astype(float).dot(multiplicity)
+
+
+def identity_filter_reference(matrix, identity_threshold, gap):
+    """
+    Greedy reference implementation of identity_filter
+    """
+    num_residues = (matrix != gap).sum(axis=1)
+    order = [0] + sorted(
+        range(1, matrix.shape[0]), key=lambda i: -num_residues[i]
+    )
+
+    retained = []
+    for i in order:
+        redundant = False
+        for j in retained:
+            min_residues = min(num_residues[i], num_residues[j])
+            identical = ((matrix[i] == matrix[j]) & (matrix[i] != gap)).sum()
+            if (min_residues > 0 and
+                    identical > identity_threshold * min_residues):
+                redundant = True
+
+        if not redundant:
+            retained.append(i)
+
+    keep = np.zeros(matrix.shape[0], dtype=bool)
+    keep[retained] = True
+    return keep
+
+
+class TestNumClusterMembers(TestCase):
+
+    def setUp(self):
+        self.matrix = random_matrix(300, 50)
+        self.multiplicity = np.random.RandomState(1).randint(1, 4, 300)
+
+    def test_serial(self):
+        self.assertTrue(np.array_equal(
+            num_cluster_members(
+                self.matrix, 0.8, num_threads=1,
+                multiplicity=self.multiplicity
+            ),
+            num_cluster_members_reference(
+                self.matrix, 0.8, self.multiplicity
+            )
+        ))
+
+    def test_parallel(self):
+        serial = num_cluster_members(
+            self.matrix, 0.8, num_threads=1, multiplicity=self.multiplicity
+        )
+
+        # block sizes that do and do not divide number of sequences
+        for block_size in [1, 7, 64, 1000]:
+            parallel = num_cluster_members(
+                self.matrix, 0.8, num_threads=2, block_size=block_size,
+                multiplicity=self.multiplicity
+            )
+            self.assertTrue(np.array_equal(serial, parallel))
+
+
+class TestNumClusterMembersLSH(TestCase):
+
+    def setUp(self):
+        self.matrix = random_matrix(600, 60, seed=3)
+        self.exact = num_cluster_members(self.matrix, 0.8)
+
+    def test_recall(self):
+        for recall in [0.5, 0.8, 0.95]:
+            approx = num_cluster_members_lsh(
+                self.matrix, 0.8, recall=recall, random_state=0
+            )
+
+            # candidate pairs are verified, so cluster
+            # sizes are never overestimated
+            self.assertTrue(np.all(approx <= self.exact))
+            self.assertTrue(np.all(approx >= 1))
+
+            # fraction of pairs within threshold that were found
+            # (excluding each sequence being its own member)
+            found = (approx.sum() - len(approx)) / (
+                self.exact.sum() - len(self.exact)
+            )
+            self.assertGreaterEqual(found, recall)
+
+    def test_seed(self):
+        self.assertTrue(np.array_equal(
+            num_cluster_members_lsh(self.matrix, 0.8, random_state=1),
+            num_cluster_members_lsh(self.matrix, 0.8, random_state=1)
+        ))
+
+    def test_identical_only(self):
+        # threshold of 1 only groups identical sequences,
+        # which are always found
+        matrix = np.vstack([self.matrix, self.matrix[:10]])
+        self.assertTrue(np.array_equal(
+            num_cluster_members_lsh(matrix, 1.0, random_state=0),
+            num_cluster_members(matrix, 1.0)
+        ))
+
+    def test_short_alignment(self):
+        # positions sampled per table are limited by the
+        # number of identical positions at the threshold
+        matrix = random_matrix(100, 10, seed=4)
+        self.assertTrue(np.all(
+            num_cluster_members_lsh(matrix, 0.8, random_state=0) <=
+            num_cluster_members(matrix, 0.8)
+        ))
+
+        with self.assertRaises(ValueError):
+            num_cluster_members_lsh(matrix, 0.8, num_positions=9)
+
+    def test_invalid_recall(self):
+        with self.assertRaises(ValueError):
+            num_cluster_members_lsh(self.matrix, 0.8, recall=1.0)
+
+    def test_weights_error(self):
+        approx = num_cluster_members_lsh(
+            self.matrix, 0.8, recall=0.5, random_state=0
+        )
+
+        # sample of all sequences gives exact error
+        error = estimate_weights_error(
+            self.matrix, 0.8, approx, sample_size=len(approx),
+            random_state=0
+        )
+        approx_weights = 1.0 / approx
+        exact_weights = 1.0 / self.exact
+        rel_error = np.abs(approx_weights - exact_weights) / exact_weights
+
+        self.assertEqual(error.sample_size, len(approx))
+        self.assertAlmostEqual(error.mean_relative_error, rel_error.mean())
+        self.assertAlmostEqual(error.max_relative_error, rel_error.max())
+        self.assertAlmostEqual(
+            error.neff_relative_error,
+            approx_weights.sum() / exact_weights.sum() - 1
+        )
+        self.assertGreater(error.neff_relative_error, 0)
+
+        # exact weights have no error
+        error = estimate_weights_error(
+            self.matrix, 0.8, self.exact, sample_size=100, random_state=0
+        )
+        self.assertEqual(error.sample_size, 100)
+        self.assertEqual(error.max_relative_error, 0)
+
+    def test_set_weights(self):
+        sequences = np.array(list(ALPHABET_PROTEIN))[self.matrix]
+        ali = Alignment(sequences)
+
+        ali.set_weights(0.8, method="lsh", random_state=0)
+        self.assertIsNotNone(ali.weights_error)
+        self.assertEqual(ali.weights_error.sample_size, 500)
+        self.assertTrue(np.all(ali.num_cluster_members <= self.exact))
+
+        ali.set_weights(0.8, method="exact")
+        self.assertIsNone(ali.weights_error)
+        self.assertTrue(np.array_equal(ali.num_cluster_members, self.exact))
+
+
+class TestIdentityFilter(TestCase):
+
+    # hand-built alignment: fragments and near-identical
+    # sequences are removed, and shared gaps do not count
+    # as identical positions
+    SEQUENCES = [
+        ("query", "ACDEFGHIKL"),
+        ("close_to_query", "ACDEFGHIKM"),
+        ("distant", "WYDEFGPQRS"),
+        ("query_fragment", "ACDEF-----"),
+        ("close_to_distant", "WYDEFGPQRT"),
+        ("short_1", "KKKKK-----"),
+        ("short_2", "KKKRR-----"),
+    ]
+
+    def setUp(self):
+        self.ali = Alignment.from_dict(dict(self.SEQUENCES))
+
+    def test_hand_built(self):
+        for num_threads in [1, 2]:
+            filtered = self.ali.filter_identity(
+                0.7, columns="all", num_threads=num_threads
+            )
+            self.assertEqual(
+                list(filtered.ids), ["query", "distant", "short_1", "short_2"]
+            )
+
+        # with higher threshold, only the fragment
+        # (100% identical residues) is removed
+        filtered = self.ali.filter_identity(0.95, columns="all")
+        self.assertEqual(
+            [id_ for id_, _ in self.SEQUENCES if id_ not in filtered.ids],
+            ["query_fragment"]
+        )
+
+    def test_first_columns(self):
+        # column with gap in query is ignored, so that
+        # the short sequences remain below threshold
+        ali = Alignment.from_dict({
+            id_: seq[:5] + ("-" if id_ == "query" else "A") + seq[5:]
+            for id_, seq in self.SEQUENCES
+        })
+
+        filtered = ali.filter_identity(0.65, columns="first")
+        self.assertEqual(filtered.L, 10)
+        self.assertEqual(
+            list(filtered.ids), ["query", "distant", "short_1", "short_2"]
+        )
+
+        filtered = ali.filter_identity(0.65, columns="all")
+        self.assertEqual(filtered.L, 11)
+        self.assertEqual(list(filtered.ids), ["query", "distant", "short_1"])
+
+        with self.assertRaises(ValueError):
+            ali.filter_identity(0.65, columns="none")
+
+    def test_reference(self):
+        matrix = random_matrix(300, 40, seed=5)
+
+        # introduce gaps (symbol 0) of varying length
+        lengths = np.random.RandomState(6).randint(10, 41, 300)
+        matrix[np.arange(40) >= lengths[:, np.newaxis]] = 0
+
+        for threshold in [0.5, 0.8, 0.95]:
+            reference = identity_filter_reference(matrix, threshold, 0)
+            serial = identity_filter(matrix, threshold, gap=0, num_threads=1)
+            self.assertTrue(np.array_equal(serial, reference))
+
+            # block sizes that do and do not divide number of sequences
+            for block_size in [1, 7, 64, 1000]:
+                parallel = identity_filter(
+                    matrix, threshold, gap=0, num_threads=2,
+                    block_size=block_size
+                )
+                self.assertTrue(np.array_equal(parallel, serial))
+
+    def test_empty(self):
+        self.assertEqual(
+            len(identity_filter(np.zeros((0, 10), dtype=int), 0.8)), 0
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+from io import StringIO
+from unittest import TestCase
+
+import numpy as np
+
+from evcouplings.align.alignment import (
+    Alignment, bytes_to_chars, read_stockholm_focus
+)
+from evcouplings.align.protocol import existing
+from evcouplings.utils.config import InvalidParameterError
+
+# alignment split into two blocks, with insert columns (".")
+# and sequences that are listed before the focus sequence
+STOCKHOLM = """# STOCKHOLM 1.0
+#=GS seq2/1-9 DE Protein 2
+#=GS focus/1-8 DE Focus protein
+seq1/1-7   MK.V-L
+focus/1-8  MKaVQL
+seq2/1-9   MKcVQ-
+
+seq1/1-7   a.GT
+focus/1-8  A.GT
+seq2/1-9   A.GT
+//
+"""
+
+
+class TestStockholmFocus(TestCase):
+
+    def reference(self, focus_index):
+        with StringIO(STOCKHOLM) as f:
+            ali = Alignment.from_file(f, format="stockholm")
+
+        focus_cols = np.array(
+            [c not in "-." for c in ali[focus_index]]
+        )
+        return ali.select(columns=focus_cols)
+
+    def test_focus_columns(self):
+        with StringIO(STOCKHOLM) as f:
+            focus = read_stockholm_focus(f, focus_id="focus/1-8")
+
+        ref = self.reference(1)
+        self.assertEqual(focus.focus_index, 1)
+        self.assertEqual(focus.ids, list(ref.ids))
+        self.assertTrue(
+            np.array_equal(bytes_to_chars(focus.matrix), ref.matrix)
+        )
+
+    def test_prefix(self):
+        with StringIO(STOCKHOLM) as f:
+            focus = read_stockholm_focus(
+                f, focus_id="focus", prefix=True, read_annotation=True
+            )
+
+        self.assertEqual(focus.focus_index, 1)
+        self.assertEqual(focus.gs["seq2/1-9"]["DE"], "Protein 2")
+
+        with StringIO(STOCKHOLM) as f:
+            with self.assertRaises(ValueError):
+                read_stockholm_focus(f, focus_id="focus")
+
+    def test_truncated(self):
+        with StringIO(STOCKHOLM.replace("//\n", "")) as f:
+            with self.assertRaises(ValueError):
+                read_stockholm_focus(f)
+
+
+class TestExistingStockholm(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.alignment = os.path.join(self.tempdir.name, "input.sto")
+        with open(self.alignment, "w") as f:
+            f.write(STOCKHOLM)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_missing_target(self):
+        with self.assertRaises(InvalidParameterError):
+            existing(
+                prefix=os.path.join(self.tempdir.name, "out", "test"),
+                input_alignment=self.alignment, sequence_id="missing",
+                first_index=None, extract_annotation=False
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()